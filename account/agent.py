@@ -1,6 +1,6 @@
 from llama_index.core.agent.workflow import FunctionAgent
 
-from account.services import update_user_information, get_user_information
+from account.services import aupdate_user_information, aget_user_information
 from config.llm import github_model
 
 account_agent = FunctionAgent(
@@ -17,5 +17,5 @@ account_agent = FunctionAgent(
         "- Update the user's name and/or email address."
         "- Timezone of retrieved data is UTC, convert them to user timezone"
     ),
-    tools=[update_user_information, get_user_information]
+    tools=[aupdate_user_information, aget_user_information]
 )
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 
+from agent.tools import async_tool
+
 
 def _user_dict(user):
     return {
@@ -53,3 +55,7 @@ def get_user_information(user_id: int) -> dict:
         return _user_dict(user)
     except get_user_model().DoesNotExist:
         return {}
+
+
+aupdate_user_information = async_tool(update_user_information)
+aget_user_information = async_tool(get_user_information)
@@ -1,3 +1,20 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from account.services import get_user_information, update_user_information
+
+
+class ServiceQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='queries@example.com', name='Queries',
+                                                        last_login=timezone.now())
+
+    def test_get_user_information(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_information(self.user.id)['email'], 'queries@example.com')
+
+    def test_update_user_information(self):
+        with self.assertNumQueries(1):
+            update_user_information(self.user.id, {'name': 'Renamed'})
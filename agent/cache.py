@@ -0,0 +1,148 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from openai.types.chat import ChatCompletionMessageToolCall
+from redis.asyncio import Redis
+
+# The user on whose behalf LLM calls are made. Requests carrying tool output are only ever
+# answered from entries cached for the same user.
+cache_scope = ContextVar('llm_cache_scope', default=None)
+
+
+class LRUCacheBackend:
+    """
+    Process local LRU cache.
+    """
+
+    def __init__(self, ttl: int = 300, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCacheBackend:
+    def __init__(self, ttl: int = 300, url: str = None, prefix: str = 'agent:llm:'):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = Redis.from_url(url or settings.REDIS_URL)
+
+    async def get(self, key: str):
+        value = await self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: dict):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+
+class LLMCache:
+    """
+    Cache of chat completions, keyed on the model, the normalized messages and the tool and
+    request parameters.
+
+    Only the final message is cached: its content and tool calls. Tools themselves still run
+    on every turn, so a cached tool call never returns stale data.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def key(self, model: str, messages, kwargs: dict):
+        """
+        Return the cache key of a request, or None if the request must not be cached.
+        """
+        scope = None
+        if any(message.role == MessageRole.TOOL for message in messages):
+            scope = cache_scope.get()
+            if scope is None:
+                return None
+        payload = {
+            'model': model,
+            'scope': scope,
+            'messages': [_normalize(message) for message in messages],
+            'params': {name: value for name, value in kwargs.items() if name != 'stream'},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def get(self, key: str):
+        """
+        Return the cached response of a key, with the 'latency' of the request that cached it, or None.
+        """
+        return await self.backend.get(key)
+
+    async def set(self, key: str, response: ChatResponse, latency: float):
+        await self.backend.set(key, {
+            'content': response.message.content,
+            'tool_calls': [
+                {'id': call.id, 'name': call.function.name, 'arguments': call.function.arguments}
+                for call in response.message.additional_kwargs.get('tool_calls', [])
+            ],
+            'latency': latency,
+        })
+
+
+def _normalize(message: ChatMessage) -> dict:
+    tool_calls = []
+    for call in message.additional_kwargs.get('tool_calls', []) or []:
+        # Messages restored from a stored context hold their tool calls as plain dicts.
+        function = call['function'] if isinstance(call, dict) else call.function.model_dump()
+        tool_calls.append({'name': function['name'], 'arguments': function['arguments']})
+    return {
+        'role': message.role.value,
+        'content': re.sub(r'\s+', ' ', message.content or '').strip(),
+        'tool_calls': tool_calls,
+    }
+
+
+def cached_response(value: dict) -> ChatResponse:
+    """
+    Rebuild the chat response of a cache entry.
+    """
+    additional_kwargs = {}
+    if value['tool_calls']:
+        additional_kwargs['tool_calls'] = [
+            ChatCompletionMessageToolCall(
+                id=call['id'], type='function', function={'name': call['name'], 'arguments': call['arguments']},
+            )
+            for call in value['tool_calls']
+        ]
+    return ChatResponse(
+        message=ChatMessage(role=MessageRole.ASSISTANT, content=value['content'], additional_kwargs=additional_kwargs),
+        delta=value['content'] or '',
+    )
+
+
+@cache
+def get_llm_cache():
+    """
+    Return the configured LLM cache, or None if caching is disabled.
+    """
+    config = settings.AGENT_LLM_CACHE
+    if not config.get('BACKEND'):
+        return None
+    backend = import_string(config['BACKEND'])(ttl=config.get('TTL', 300), **config.get('OPTIONS', {}))
+    return LLMCache(backend)
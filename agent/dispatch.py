@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import cache
+
+from django.conf import settings
+
+from agent import metrics
+from agent.cache import cache_scope
+
+
+class TokenBucket:
+    """
+    Rate limit of `per_minute` units, such as requests or tokens, allowing bursts of a minute's worth.
+
+    `take` waits until the units are available. `charge` takes units once they are known, such as
+    the completion tokens of a response, and may leave the bucket in debt until it refills.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        self._refill()
+        while self.level < amount:
+            await asyncio.sleep((amount - self.level) / self.rate)
+            self._refill()
+        self.level -= amount
+
+    def charge(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class Dispatcher:
+    """
+    Gate of the LLM requests of a process.
+
+    At most `max_concurrency` requests are sent at once, within `requests_per_minute` and
+    `tokens_per_minute` (no limit when 0). Waiting requests are queued per user, the user of
+    agent.cache.cache_scope, and users take turns: a user with many queued requests gets one slot,
+    then every other waiting user gets one, so a busy user cannot starve the others.
+
+    When the endpoint still refuses a request for its rate limit, call `pause` to hold every
+    request of the process until it allows them again.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.in_flight = 0
+        self._queues = OrderedDict()
+        self._paused_until = 0.0
+
+    @property
+    def limits_tokens(self) -> bool:
+        return self.tokens is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """
+        Wait for the turn of the current user and for the rate limits, then hold a slot while the
+        enclosed request runs. `tokens` is the estimated prompt size, for the tokens per minute limit.
+        """
+        started = time.perf_counter()
+        await self._acquire(cache_scope.get())
+        try:
+            await self._wait_for_limits(tokens)
+            metrics.llm_queue_seconds.observe(time.perf_counter() - started)
+            yield
+        finally:
+            self._release()
+
+    def charge(self, tokens: int):
+        """
+        Count the completion tokens of a response against the tokens per minute limit.
+        """
+        if self.tokens is not None and tokens:
+            self.tokens.charge(tokens)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        metrics.llm_throttled.inc()
+
+    async def _acquire(self, user):
+        if self.in_flight < self.max_concurrency and not self._queues:
+            self.in_flight += 1
+            self._update_gauges()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._update_gauges()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as the request was given up.
+                self._release()
+            elif waiter in self._queues.get(user, ()):
+                self._queues[user].remove(waiter)
+                if not self._queues[user]:
+                    del self._queues[user]
+                self._update_gauges()
+            raise
+
+    async def _wait_for_limits(self, tokens):
+        while (paused := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(paused)
+        if self.requests is not None:
+            await self.requests.take(1)
+        if self.tokens is not None and tokens:
+            await self.tokens.take(tokens)
+
+    def _release(self):
+        self.in_flight -= 1
+        while self.in_flight < self.max_concurrency and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.llm_in_flight.set(self.in_flight)
+        metrics.llm_queue_depth.set(self.queue_depth)
+        metrics.llm_queued_users.set(len(self._queues))
+
+
+@cache
+def get_dispatcher() -> Dispatcher:
+    """
+    Return the dispatcher of this process, configured with settings.AGENT_LLM_DISPATCH.
+    """
+    config = settings.AGENT_LLM_DISPATCH
+    return Dispatcher(
+        max_concurrency=config['MAX_CONCURRENCY'],
+        requests_per_minute=config['REQUESTS_PER_MINUTE'],
+        tokens_per_minute=config['TOKENS_PER_MINUTE'],
+    )
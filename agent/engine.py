@@ -1,45 +1,204 @@
 from datetime import datetime
+from typing import Union
 
-from llama_index.core.agent.workflow import FunctionAgent, AgentWorkflow
-from llama_index.tools.yahoo_finance import YahooFinanceToolSpec
+from django.conf import settings
+from llama_index.core.agent.workflow import FunctionAgent, AgentWorkflow, AgentInput, AgentOutput, AgentSetup, \
+    ToolCall, ToolCallResult
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.tools import ToolSelection
+from llama_index.core.workflow import Context, StartEvent, StopEvent, step
 
 from account.agent import account_agent
-from config.llm import github_model
+from agent import router
+from agent.market import get_market_data
+from agent.memory import RollingSummaryMemory
+from agent.tokens import count_message_tokens, count_tool_tokens
+from config.llm import closing_streams, github_model
 from fintrack.agent import finance_agent
 
-tools = YahooFinanceToolSpec().to_tool_list()
-
-root_agent = FunctionAgent(
-    name="RootAgent",
-    description="Useful for routing user queries",
-    llm=github_model,
-    system_prompt=(
-        "You are the root coordinator agent responsible for managing user requests across different domains."
-
-        "You do not handle user data or perform actions directly. Instead, you delegate tasks to specialized agents:"
-        "- Do not send handoff information to the user."
-        "- Always execute the handoff to agent, and provide user with specific results."
-        "- Use the *AccountManagementAgent* to handle tasks related to the user's account, such as viewing or updating profile information, changing passwords, deactivating accounts, or logging out.\n"
-        "- Use the *FinanceManagementAgent* to handle financial tasks, such as creating transactions, retrieving transaction history, searching transactions with keywords, or calculating current balance.\n\n"
-
-        "Your responsibilities:"
-        "- Understand the user's intent and determine whether it concerns account management or finance."
-        "- Route the request to the appropriate specialized agent."
-        "- If a request involves both domains (e.g., 'show my balance and update my email'), call both agents as needed."
-        "- Do not perform direct logic or processing yourself—delegate all action to the relevant agent."
-        "- Ensure user-facing responses are clear, helpful, and contextually accurate based on agent results."
-        "- Provide stock related queries using tools from Yahoo finance."
-
-        "Always respect security and privacy boundaries, and never attempt to access data from another user."
-    ),
-    tools=tools
-)
-
-workflow = AgentWorkflow(
-    agents=[root_agent, account_agent, finance_agent],
-    root_agent=root_agent.name,
-    initial_state={
-        "system_date": datetime.now().date().strftime('%d %B, %Y'),
-        "user_id": None
+
+# Facts of the chat session given to every agent after its system prompt, as (state key, line) pairs.
+# The system date, which changes daily, comes last, so the rest of the prefix stays the same.
+SESSION_FACTS = [
+    ('user_id', '- Authenticated User ID: {}\n'
+                '- Note: The user ID is fixed and must not be altered based on any user query.\n'
+                '- Never show user ID to the user. If there is a change request of user id, use slang.'),
+    ('country', '- Country: {}'),
+    ('timezone', '- Timezone: {}'),
+    ('currency', '- Currency Context: {}'),
+    ('system_date', '- Today: {}'),
+]
+
+
+def system_date() -> str:
+    return datetime.now().date().strftime('%d %B, %Y')
+
+
+def session_state(user_id: int) -> dict:
+    """
+    Return the facts of a user's chat session, to be merged into the state of the workflow context.
+    """
+    return {
+        'user_id': user_id,
+        'country': 'Bangladesh',
+        'timezone': router.TIMEZONE.key,
+        'currency': f'{router.CURRENCY} (Bangladeshi Taka)',
     }
-)
+
+
+def session_prompt(state: dict) -> str:
+    lines = [line.format(state[key]) for key, line in SESSION_FACTS if state.get(key) is not None]
+    return 'Session information:\n' + '\n'.join(lines) if lines else ''
+
+
+class ToolCallWorkflow(AgentWorkflow):
+    """
+    AgentWorkflow handing the tool results of an agent step to the agent in the order of the calls.
+
+    The tool calls of a step run concurrently, up to AGENT_TOOL_WORKERS at a time; the synchronous
+    services behind them share the bounded thread pool of agent.tools. With
+    settings.AGENT_PARALLEL_TOOL_CALLS off, they run one after another, as a baseline for the
+    latency of steps calling several tools.
+
+    The session facts of the state, see session_state, are given to every agent in a system message
+    following its system prompt rather than in the user message. Every request then starts with the
+    agent's system prompt, shared by all users, followed by the session facts and history shared by
+    the requests of a conversation, which the endpoint's prompt prefix cache can reuse. The system date
+    of the state is brought up to date on every run, as contexts are kept between messages.
+    """
+
+    async def _init_context(self, ctx: Context, ev: StartEvent) -> None:
+        await super()._init_context(ctx, ev)
+        state = await ctx.get('state')
+        await ctx.set('state', {**state, 'system_date': system_date()})
+
+    @step
+    async def setup_agent(self, ctx: Context, ev: AgentInput) -> AgentSetup:
+        agent = self.agents[ev.current_agent_name]
+        state = await ctx.get('state', default=None) or {}
+        # The system prompt, the same for every user, comes first, then the facts of this session.
+        system = [ChatMessage(role=MessageRole.SYSTEM, content=content)
+                  for content in (agent.system_prompt, session_prompt(state)) if content]
+        history = ev.input
+        memory = await ctx.get('memory', default=None)
+        if isinstance(memory, RollingSummaryMemory):
+            # Read again with the system messages and tool schemas counted in the memory's token limit.
+            tools = await self.get_tools(ev.current_agent_name, await ctx.get('user_msg_str', default='') or '')
+            history = await memory.aget(reserved_tokens=count_message_tokens(system) + count_tool_tokens(tools))
+        return AgentSetup(input=[*system, *history], current_agent_name=ev.current_agent_name)
+
+    @step
+    async def run_agent_step(self, ctx: Context, ev: AgentSetup) -> AgentOutput:
+        # A step failing or cancelled while streaming gives back its dispatcher slot right away.
+        async with closing_streams():
+            return await super().run_agent_step(ctx, ev)
+
+    @step
+    async def parse_agent_output(self, ctx: Context, ev: AgentOutput) -> Union[StopEvent, ToolCall, None]:
+        if not ev.tool_calls:
+            return await super().parse_agent_output(ctx, ev)
+
+        calls = [ToolCall(tool_name=call.tool_name, tool_kwargs=call.tool_kwargs, tool_id=call.tool_id)
+                 for call in ev.tool_calls]
+        await ctx.set('num_tool_calls', len(calls))
+        await ctx.set('tool_call_order', [call.tool_id for call in calls])
+        if not settings.AGENT_PARALLEL_TOOL_CALLS:
+            # The next call is sent when the result of the previous one arrives.
+            await ctx.set('pending_tool_calls', [call.model_dump() for call in calls[1:]])
+            return calls[0]
+        for call in calls:
+            ctx.send_event(call)
+        return None
+
+    @step(num_workers=settings.AGENT_TOOL_WORKERS)
+    async def call_tool(self, ctx: Context, ev: ToolCall) -> ToolCallResult:
+        return await super().call_tool(ctx, ev)
+
+    @step
+    async def aggregate_tool_results(self, ctx: Context, ev: ToolCallResult) -> Union[AgentInput, StopEvent, None]:
+        pending = await ctx.get('pending_tool_calls', default=[])
+        if pending:
+            await ctx.set('pending_tool_calls', pending[1:])
+            ctx.send_event(ToolCall(**pending[0]))
+
+        num_tool_calls = await ctx.get('num_tool_calls', default=0)
+        results = ctx.collect_events(ev, expected=[ToolCallResult] * num_tool_calls)
+        if not results:
+            return None
+
+        # Results arrive as the calls complete. From here on, as in AgentWorkflow, with the results in
+        # the order of the calls.
+        order = await ctx.get('tool_call_order')
+        results.sort(key=lambda result: order.index(result.tool_id))
+
+        memory = await ctx.get('memory')
+        agent = self.agents[await ctx.get('current_agent_name')]
+        tool_calls = [*await ctx.get('current_tool_calls', default=[]), *results]
+        await ctx.set('current_tool_calls', tool_calls)
+        await agent.handle_tool_call_results(ctx, results, memory)
+
+        # The handoff tool sets the next agent.
+        next_agent_name = await ctx.get('next_agent', default=None)
+        if next_agent_name:
+            await ctx.set('current_agent_name', next_agent_name)
+            await ctx.set('next_agent', None)
+
+        direct = next((result for result in results if result.return_direct), None)
+        if direct:
+            output = AgentOutput(
+                response=ChatMessage(role=MessageRole.ASSISTANT, content=direct.tool_output.content or ''),
+                tool_calls=[ToolSelection(tool_id=call.tool_id, tool_name=call.tool_name, tool_kwargs=call.tool_kwargs)
+                            for call in tool_calls],
+                raw=direct.tool_output.raw_output,
+                current_agent_name=agent.name,
+            )
+            output = await agent.finalize(ctx, output, memory)
+            if direct.tool_name != 'handoff':
+                await ctx.set('current_tool_calls', [])
+                return StopEvent(result=output)
+
+        history = await memory.aget(input=await ctx.get('user_msg_str'))
+        return AgentInput(input=history, current_agent_name=await ctx.get('current_agent_name'))
+
+
+def build_workflow() -> ToolCallWorkflow:
+    """
+    Build the root agent, with the market data tools, and the workflow of the agents.
+
+    Building the agents imports llama-index, the OpenAI client and yfinance; use
+    agent.registry.get_workflow for the shared workflow, built once on first use.
+    """
+    root_agent = FunctionAgent(
+        name="RootAgent",
+        description="Useful for routing user queries",
+        llm=github_model,
+        system_prompt=(
+            "You are the root coordinator agent responsible for managing user requests across different domains."
+
+            "You do not handle user data or perform actions directly. Instead, you delegate tasks to specialized agents:"
+            "- Do not send handoff information to the user."
+            "- Always execute the handoff to agent, and provide user with specific results."
+            "- Use the *AccountManagementAgent* to handle tasks related to the user's account, such as viewing or updating profile information, changing passwords, deactivating accounts, or logging out.\n"
+            "- Use the *FinanceManagementAgent* to handle financial tasks, such as creating transactions, retrieving transaction history, searching transactions with keywords, or calculating current balance.\n\n"
+
+            "Your responsibilities:"
+            "- Understand the user's intent and determine whether it concerns account management or finance."
+            "- Route the request to the appropriate specialized agent."
+            "- If a request involves both domains (e.g., 'show my balance and update my email'), call both agents as needed."
+            "- Do not perform direct logic or processing yourself—delegate all action to the relevant agent."
+            "- Ensure user-facing responses are clear, helpful, and contextually accurate based on agent results."
+            "- Provide stock related queries using tools from Yahoo finance."
+
+            "Always respect security and privacy boundaries, and never attempt to access data from another user."
+        ),
+        tools=get_market_data().to_tool_list(),
+    )
+
+    return ToolCallWorkflow(
+        agents=[root_agent, account_agent, finance_agent],
+        root_agent=root_agent.name,
+        initial_state={
+            "system_date": system_date(),
+            "user_id": None
+        }
+    )
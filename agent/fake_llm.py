@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from agent.tokens import count_tokens
+
+# Every scripted reply ends with this marker, so clients can tell when a streamed reply is complete.
+END_MARKER = '[end of reply]'
+
+FINANCE_AGENT = 'FinanceManagementAgent'
+
+
+class FakeLLMServer:
+    """
+    OpenAI compatible chat completions server streaming scripted replies, to run the agents offline.
+
+    The root agent is answered with a handoff to the finance agent, and the finance agent with a
+    get_current_balance call for the user of the conversation, then with a reply of `reply_words`
+    words ending with END_MARKER. With `parallel_tool_calls`, the finance agent is asked to call
+    get_current_balance, get_transactions and search_transactions in the same step.
+
+    Every response starts after `first_token_latency` seconds and streamed words are `token_latency`
+    seconds apart. Requests without streaming, such as the chat memory summaries, get a short
+    summary. The first `rate_limited` requests are refused with a 429 response, as an endpoint over
+    its rate limit would.
+
+    Token usage is reported for every response, and for streamed ones when asked with stream_options.
+    The prompt prefix cache of the endpoint is emulated: the tools and the longest run of leading
+    messages sent before in the same order, when they reach `prefix_cache_min_tokens` tokens, are
+    reported as cached tokens. The totals are kept in `stats`.
+
+    The server runs on its own thread and event loop, so it does not compete with the event loop of
+    the app under test.
+    """
+
+    def __init__(self, reply_words: int = 40, first_token_latency: float = 0.3, token_latency: float = 0.01,
+                 tool_calls: bool = True, parallel_tool_calls: bool = False, rate_limited: int = 0,
+                 prefix_cache_min_tokens: int = 1024, host: str = '127.0.0.1', port: int = 0):
+        self.reply_words = reply_words
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tool_calls = tool_calls
+        self.parallel_tool_calls = parallel_tool_calls
+        self.rate_limited = rate_limited
+        self.prefix_cache_min_tokens = prefix_cache_min_tokens
+        self.host = host
+        self.port = port
+        self.stats = Counter()
+        self._prefixes = set()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/v1'
+
+    def start(self):
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name='fake-llm', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def script(self, body):
+        """
+        Return the tool calls, as (name, arguments) pairs, or the reply text to answer a request with.
+        """
+        messages = body['messages']
+        tools = {tool['function']['name'] for tool in body.get('tools', [])}
+        last_user = max(i for i, message in enumerate(messages) if message['role'] == 'user')
+        called = {call['function']['name']
+                  for message in messages[last_user:] for call in message.get('tool_calls') or []}
+        if self.tool_calls:
+            if 'handoff' in tools and 'get_current_balance' not in tools and 'handoff' not in called:
+                return [('handoff', {'to_agent': FINANCE_AGENT, 'reason': 'Finance question.'})], None
+            if 'get_current_balance' in tools and 'get_current_balance' not in called:
+                user_id = re.findall(r'User ID: (\d+)', ' '.join(str(message.get('content')) for message in messages))
+                user_id = int(user_id[-1]) if user_id else 1
+                calls = [('get_current_balance', {'user_id': user_id})]
+                if self.parallel_tool_calls:
+                    calls += [('get_transactions', {'user_id': user_id, 'transaction_type': 'expense', 'limit': 20}),
+                              ('search_transactions', {'user_id': user_id, 'search_text': 'rickshaw'})]
+                return calls, None
+
+        words = ['Here', 'is', 'what', 'I', 'found:'] + ['lorem'] * max(self.reply_words - 5, 0)
+        return None, ' '.join(words) + ' ' + END_MARKER
+
+    def usage(self, body, completion_tokens):
+        """
+        Return the token usage of a request, with the prompt tokens its prompt prefix cache would serve.
+        """
+        parts = [body.get('tools', [])] + body['messages']
+        prompt_tokens, cached_tokens = 0, 0
+        prefix = hashlib.sha256(body['model'].encode())
+        for part in parts:
+            encoded = json.dumps(part, sort_keys=True)
+            prompt_tokens += count_tokens(encoded)
+            prefix.update(encoded.encode())
+            key = prefix.hexdigest()
+            if key in self._prefixes and prompt_tokens >= self.prefix_cache_min_tokens:
+                cached_tokens = prompt_tokens
+            self._prefixes.add(key)
+        self.stats['prompt_tokens'] += prompt_tokens
+        self.stats['cached_tokens'] += cached_tokens
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens}}
+
+    async def chat_completions(self, request):
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            return await self._chat_completions(request)
+        finally:
+            self.stats['in_flight'] -= 1
+
+    async def _chat_completions(self, request):
+        body = await request.json()
+        self.stats['requests'] += 1
+        if self.stats['requests'] <= self.rate_limited:
+            return web.json_response({'error': {'message': 'Rate limit reached.', 'type': 'rate_limit_exceeded'}},
+                                     status=429, headers={'Retry-After': '1'})
+        await asyncio.sleep(self.first_token_latency)
+
+        base = {'id': f'chatcmpl-{self.stats["requests"]}', 'created': int(time.time()), 'model': body['model']}
+        if not body.get('stream'):
+            summary = f'Summary of {len(body["messages"])} messages.'
+            return web.json_response({
+                **base,
+                'object': 'chat.completion',
+                'choices': [{
+                    'index': 0,
+                    'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': summary},
+                }],
+                'usage': self.usage(body, count_tokens(summary)),
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+
+        async def send(delta, finish_reason=None):
+            chunk = {**base, 'object': 'chat.completion.chunk',
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            await response.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+
+        tool_calls, reply = self.script(body)
+        completion_tokens = count_tokens(json.dumps(tool_calls) if tool_calls is not None else reply)
+        if tool_calls is not None:
+            # One chunk per tool call, as OpenAI streams them.
+            for index, (name, arguments) in enumerate(tool_calls):
+                self.stats['tool_calls'] += 1
+                await send({'role': 'assistant', 'tool_calls': [{
+                    'index': index, 'id': f'call_{self.stats["tool_calls"]}', 'type': 'function',
+                    'function': {'name': name, 'arguments': json.dumps(arguments)},
+                }]})
+            await send({}, 'tool_calls')
+        else:
+            self.stats['replies'] += 1
+            for i, word in enumerate(reply.split(' ')):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                    await send({'content': ' ' + word})
+                else:
+                    await send({'role': 'assistant', 'content': word})
+            await send({}, 'stop')
+
+        usage = self.usage(body, completion_tokens)
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage}
+            await response.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+        await response.write(b'data: [DONE]\n\n')
+        return response
@@ -0,0 +1,40 @@
+import os
+import re
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+
+Import = namedtuple('Import', ['module', 'self_seconds', 'seconds', 'depth'])
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+STARTUP = 'import django; django.setup(); import config.asgi, config.urls'
+
+
+def profile_imports(code: str = STARTUP, **env) -> list:
+    """
+    Run `code` in a new interpreter with `python -X importtime` and return its imports, heaviest first.
+
+    `seconds` includes the imports a module makes itself; `depth` is 0 for the modules `code` imports.
+    Extra environment variables are given as keyword arguments.
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings', **env},
+    )
+    if process.returncode:
+        raise RuntimeError(f'Importing failed:\n{process.stderr}')
+    imports = [
+        Import(module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2)
+        for self_us, cumulative_us, indent, module in LINE.findall(process.stderr)
+    ]
+    return sorted(imports, key=lambda entry: entry.seconds, reverse=True)
+
+
+def report(imports: list, top: int = 15) -> str:
+    total = sum(entry.seconds for entry in imports if entry.depth == 0)
+    lines = [f'{total:.2f}s importing {len(imports)} modules; heaviest:']
+    lines += [f'{entry.seconds:>7.3f}s {entry.self_seconds:>7.3f}s self  {entry.module}' for entry in imports[:top]]
+    return '\n'.join(lines)
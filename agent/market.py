@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from llama_index.core.tools import FunctionTool
+
+from agent.tools import tool_span
+
+executor = ThreadPoolExecutor(max_workers=settings.AGENT_MARKET_DATA['WORKERS'], thread_name_prefix='market-data')
+
+
+class MarketDataCache:
+    """
+    Cache in front of the market data tools of a tool spec.
+
+    Results are kept per tool and ticker for the TTL of the tool, concurrent requests for the same
+    tool and ticker share a single upstream fetch, and fetches run on a thread pool so the blocking
+    HTTP calls of yfinance never hold up the event loop. Failed fetches are not cached. At most
+    `max_entries` results are kept, the least recently used being dropped first.
+    """
+
+    def __init__(self, spec, ttls: dict, default_ttl: int = 60, max_entries: int = 1000):
+        self.spec = spec
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    async def get(self, name: str, ticker: str) -> str:
+        key = (name, ticker.strip().upper())
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.stats['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        future = self._pending.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        self.stats['fetches'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, getattr(self.spec, name), key[1])
+        self._pending[key] = future
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            del self._pending[key]
+        self._entries[key] = (value, time.monotonic() + self.ttls.get(name, self.default_ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def to_tool_list(self):
+        """
+        Return the tools of the spec, answered through the cache.
+        """
+        return [FunctionTool.from_defaults(async_fn=self._tool(name)) for name in self.spec.spec_functions]
+
+    def _tool(self, name):
+        @functools.wraps(getattr(self.spec, name))
+        async def tool(ticker: str) -> str:
+            with tool_span(name) as traced:
+                value = await self.get(name, ticker)
+                traced.set(ticker=ticker, result_bytes=len(str(value)))
+            return value
+
+        return tool
+
+
+class FakeYahooFinanceToolSpec:
+    """
+    Offline stand in for YahooFinanceToolSpec, with a fixed latency and a count of upstream calls.
+
+    Set it as settings.AGENT_MARKET_DATA['UPSTREAM'] to run the agents and the market data cache
+    without network access.
+    """
+
+    spec_functions = [
+        'balance_sheet',
+        'income_statement',
+        'cash_flow',
+        'stock_basic_info',
+        'stock_analyst_recommendations',
+        'stock_news',
+    ]
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.calls = Counter()
+
+    def _fetch(self, name, ticker):
+        self.calls[name, ticker] += 1
+        time.sleep(self.latency)
+        return f'{name} of {ticker}: sample data'
+
+    def balance_sheet(self, ticker: str) -> str:
+        """
+        Return the balance sheet of the stock.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('balance_sheet', ticker)
+
+    def income_statement(self, ticker: str) -> str:
+        """
+        Return the income statement of the stock.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('income_statement', ticker)
+
+    def cash_flow(self, ticker: str) -> str:
+        """
+        Return the cash flow of the stock.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('cash_flow', ticker)
+
+    def stock_basic_info(self, ticker: str) -> str:
+        """
+        Return the basic info of the stock. Ex: price, description, name.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('stock_basic_info', ticker)
+
+    def stock_analyst_recommendations(self, ticker: str) -> str:
+        """
+        Get the analyst recommendations for a stock.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('stock_analyst_recommendations', ticker)
+
+    def stock_news(self, ticker: str) -> str:
+        """
+        Get the most recent news titles of a stock.
+
+        Args:
+          ticker (str): the stock ticker to be given to yfinance
+
+        """
+        return self._fetch('stock_news', ticker)
+
+
+@functools.cache
+def get_market_data() -> MarketDataCache:
+    config = settings.AGENT_MARKET_DATA
+    return MarketDataCache(import_string(config['UPSTREAM'])(), config['TTL'], config.get('DEFAULT_TTL', 60),
+                           config.get('MAX_ENTRIES', 1000))
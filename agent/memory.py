@@ -0,0 +1,211 @@
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.bridge.pydantic import Field, SerializeAsAny, field_serializer
+from llama_index.core.llms.llm import LLM
+from llama_index.core.memory.types import DEFAULT_CHAT_STORE_KEY, BaseMemory
+from llama_index.core.storage.chat_store import BaseChatStore, SimpleChatStore
+from llama_index.core.storage.chat_store.loading import load_chat_store
+
+from agent.tokens import count_message_tokens, count_tokens
+from config.llm import github_model
+
+SUMMARIZE_PROMPT = (
+    "You maintain the running summary of a conversation between a user and a personal finance assistant. "
+    "Update the summary with the new messages. Keep every fact that may be needed later, such as amounts, "
+    "dates, transaction IDs, names and decisions, and drop greetings and repetition. "
+    "Reply with the updated summary only."
+)
+
+SUMMARY_PREFIX = 'Summary of the earlier conversation:\n'
+
+# Appended to tool output cut to fit the prompt in the token limit.
+TRUNCATED = '\n[output cut to fit the prompt]'
+
+# Number of turns whose prompt token counts are kept for inspection.
+PROMPT_TOKEN_HISTORY = 50
+
+
+class RollingSummaryMemory(BaseMemory):
+    """
+    Chat memory that keeps the last turns verbatim and a running summary of everything before them.
+
+    A turn is a user message and every message after it, up to the next user message. On every read,
+    turns older than the last `keep_turns` are folded into the summary with the LLM, and older turns are
+    folded in as well until the whole prompt fits in `token_limit` tokens: the summary, the remaining
+    turns and the `reserved_tokens` of the read, which the workflow sets to the tokens of the agent's
+    system messages and tool schemas. The current turn is kept, but when it does not fit on its own,
+    its tool outputs are cut, longest first. The ceiling therefore holds unless the summary and the
+    user and assistant messages of the current turn exceed it on their own.
+
+    The prompt token count of every read, with the reserved tokens, is recorded in `prompt_tokens`,
+    one entry per turn holding the largest prompt of that turn, so the ceiling can be checked.
+    """
+
+    keep_turns: int = 6
+    token_limit: int = 3000
+    summary: str = ''
+    prompt_tokens: List[int] = Field(default_factory=list)
+    llm: Optional[SerializeAsAny[LLM]] = Field(default=None, exclude=True)
+    chat_store: SerializeAsAny[BaseChatStore] = Field(default_factory=SimpleChatStore)
+    chat_store_key: str = Field(default=DEFAULT_CHAT_STORE_KEY)
+
+    @field_serializer('chat_store')
+    def serialize_chat_store(self, chat_store: BaseChatStore) -> dict:
+        res = chat_store.model_dump()
+        res.update({'class_name': chat_store.class_name()})
+        return res
+
+    @classmethod
+    def class_name(cls) -> str:
+        return 'RollingSummaryMemory'
+
+    @classmethod
+    def from_defaults(cls, llm: Optional[LLM] = None, **kwargs: Any) -> 'RollingSummaryMemory':
+        kwargs.setdefault('keep_turns', settings.AGENT_MEMORY['KEEP_TURNS'])
+        kwargs.setdefault('token_limit', settings.AGENT_MEMORY['TOKEN_LIMIT'])
+        return cls(llm=llm, **kwargs)
+
+    def to_dict(self, **kwargs: Any) -> dict:
+        return self.model_dump()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **kwargs: Any) -> 'RollingSummaryMemory':
+        data = {**data, 'chat_store': load_chat_store(data['chat_store'])}
+        data.pop('class_name', None)
+        return cls(**data, **kwargs)
+
+    @property
+    def last_prompt_tokens(self) -> int:
+        return self.prompt_tokens[-1] if self.prompt_tokens else 0
+
+    def get_all(self) -> List[ChatMessage]:
+        return self.chat_store.get_messages(self.chat_store_key)
+
+    def put(self, message: ChatMessage) -> None:
+        self.chat_store.add_message(self.chat_store_key, message)
+        if message.role == MessageRole.USER:
+            self.prompt_tokens = [*self.prompt_tokens, 0][-PROMPT_TOKEN_HISTORY:]
+
+    async def aput(self, message: ChatMessage) -> None:
+        self.put(message)
+
+    async def aput_messages(self, messages: List[ChatMessage]) -> None:
+        self.put_messages(messages)
+
+    def set(self, messages: List[ChatMessage]) -> None:
+        self.chat_store.set_messages(self.chat_store_key, messages)
+
+    async def aset(self, messages: List[ChatMessage]) -> None:
+        self.set(messages)
+
+    def reset(self) -> None:
+        self.chat_store.delete_messages(self.chat_store_key)
+        self.summary = ''
+
+    async def areset(self) -> None:
+        self.reset()
+
+    async def aget_all(self) -> List[ChatMessage]:
+        return self.get_all()
+
+    def get(self, input: Optional[str] = None, reserved_tokens: int = 0, **kwargs: Any) -> List[ChatMessage]:
+        turns = self._split_turns(self.get_all())
+        while True:
+            old, turns = self._select_old_turns(turns, self.token_limit - reserved_tokens)
+            if not old:
+                break
+            self.summary = self._get_llm().chat(self._summarize_prompt(old)).message.content
+            self.set([message for turn in turns for message in turn])
+        return self._build(turns, reserved_tokens)
+
+    async def aget(self, input: Optional[str] = None, reserved_tokens: int = 0, **kwargs: Any) -> List[ChatMessage]:
+        turns = self._split_turns(self.get_all())
+        while True:
+            old, turns = self._select_old_turns(turns, self.token_limit - reserved_tokens)
+            if not old:
+                break
+            self.summary = (await self._get_llm().achat(self._summarize_prompt(old))).message.content
+            self.set([message for turn in turns for message in turn])
+        return self._build(turns, reserved_tokens)
+
+    def _get_llm(self) -> LLM:
+        # The LLM is not serialized with the memory, so restored memories use the default one.
+        return self.llm or github_model
+
+    @staticmethod
+    def _split_turns(messages: List[ChatMessage]) -> List[List[ChatMessage]]:
+        turns = []
+        for message in messages:
+            if message.role == MessageRole.USER or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _select_old_turns(self, turns, limit: int):
+        """
+        Split off the oldest turns that have to be folded into the summary for the rest to fit in `limit` tokens.
+        """
+        split = max(len(turns) - self.keep_turns, 0)
+        while split < len(turns) - 1 and self._count(turns[split:]) > limit:
+            split += 1
+        return turns[:split], turns[split:]
+
+    def _count(self, turns) -> int:
+        return count_message_tokens(self._build_messages(turns))
+
+    def _build_messages(self, turns) -> List[ChatMessage]:
+        messages = [message for turn in turns for message in turn]
+        if self.summary:
+            messages.insert(0, ChatMessage(role=MessageRole.SYSTEM, content=SUMMARY_PREFIX + self.summary))
+        return messages
+
+    def _build(self, turns, reserved_tokens: int = 0) -> List[ChatMessage]:
+        messages = self._fit(self._build_messages(turns), self.token_limit - reserved_tokens)
+        if self.prompt_tokens:
+            tokens = count_message_tokens(messages) + reserved_tokens
+            self.prompt_tokens = [*self.prompt_tokens[:-1], max(self.prompt_tokens[-1], tokens)]
+        return messages
+
+    @staticmethod
+    def _fit(messages: List[ChatMessage], limit: int) -> List[ChatMessage]:
+        """
+        Cut the tool outputs among the messages, longest first, until the messages fit in `limit` tokens.
+
+        Only the returned copies are cut; the stored messages are kept whole.
+        """
+        messages = list(messages)
+        excess = count_message_tokens(messages) - limit
+        cut = set()
+        while excess > 0:
+            candidates = [i for i, message in enumerate(messages)
+                          if message.role == MessageRole.TOOL and message.content and i not in cut]
+            if not candidates:
+                break
+            index = max(candidates, key=lambda i: len(messages[i].content))
+            content = messages[index].content.removesuffix(TRUNCATED)
+            tokens = count_tokens(content)
+            keep = max(tokens - excess - count_tokens(TRUNCATED), 0)
+            message = messages[index].model_copy(deep=True)
+            message.content = content[:len(content) * keep // tokens] + TRUNCATED
+            messages[index] = message
+            if not keep:
+                cut.add(index)
+            excess = count_message_tokens(messages) - limit
+        return messages
+
+    def _summarize_prompt(self, turns) -> List[ChatMessage]:
+        transcript = []
+        for message in (message for turn in turns for message in turn):
+            if message.content:
+                transcript.append(f'{message.role.value}: {message.content}')
+            for call in message.additional_kwargs.get('tool_calls', []) or []:
+                transcript.append(f'{message.role.value}: called {call!s}')
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=SUMMARIZE_PROMPT),
+            ChatMessage(
+                role=MessageRole.USER,
+                content=f'Current summary:\n{self.summary or "(empty)"}\n\nNew messages:\n' + '\n'.join(transcript),
+            ),
+        ]
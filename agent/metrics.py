@@ -0,0 +1,156 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Seconds, from a cached tool call to a slow LLM turn.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    """
+    A metric of this process, rendered in the Prometheus text format by `render`.
+
+    Label values are given as keyword arguments, and must be given for every label name of the metric.
+    """
+    type = None
+
+    def __init__(self, name: str, description: str, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def collect(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}']
+        return lines + list(self.collect())
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labels, key)} {value:g}'
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._values = defaultdict(float)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labels, key)} {value:g}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._sums = defaultdict(float)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._counts[key][bisect_left(self.buckets, value)] += 1
+            self._sums[key] += value
+
+    def collect(self):
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+        for key, bucket_counts in sorted(counts.items()):
+            total = 0
+            for bound, count in zip((*self.buckets, '+Inf'), bucket_counts):
+                total += count
+                labels = _labels((*self.labels, 'le'), (*key, f'{bound:g}' if bound != '+Inf' else bound))
+                yield f'{self.name}_bucket{labels} {total}'
+            yield f'{self.name}_sum{_labels(self.labels, key)} {sums[key]:g}'
+            yield f'{self.name}_count{_labels(self.labels, key)} {total}'
+
+
+def render() -> str:
+    """
+    Return every metric in the Prometheus text exposition format.
+    """
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
+
+
+turns = Counter('agent_turns_total', 'Chat turns, by route.', ['route'])
+turn_seconds = Histogram('agent_turn_seconds', 'Duration of chat turns.', ['route'])
+first_byte_seconds = Histogram('agent_first_byte_seconds', 'Time to the first reply text of chat turns.', ['route'])
+turn_errors = Counter('agent_turn_errors_total', 'Chat turns that failed.', ['error'])
+
+llm_requests = Counter('agent_llm_requests_total', 'LLM requests, by model and whether the cache answered.',
+                       ['model', 'cached'])
+llm_seconds = Histogram('agent_llm_seconds', 'Duration of LLM requests, to the last streamed token.', ['model'])
+llm_prompt_tokens = Counter('agent_llm_prompt_tokens_total', 'Prompt tokens sent to the LLM.', ['model'])
+llm_cached_prompt_tokens = Counter('agent_llm_cached_prompt_tokens_total',
+                                   'Prompt tokens the LLM endpoint served from its prompt prefix cache.', ['model'])
+llm_completion_tokens = Counter('agent_llm_completion_tokens_total', 'Completion tokens received from the LLM.',
+                                ['model'])
+llm_cache_hits = Counter('agent_llm_cache_hits_total', 'LLM requests answered from the response cache.', ['model'])
+llm_cache_misses = Counter('agent_llm_cache_misses_total',
+                           'Cacheable LLM requests the response cache could not answer.', ['model'])
+llm_cache_saved_seconds = Counter('agent_llm_cache_saved_seconds_total',
+                                  'Latency of the original requests of the responses the cache answered with.',
+                                  ['model'])
+llm_in_flight = Gauge('agent_llm_in_flight', 'LLM requests being sent or streamed.')
+llm_queue_depth = Gauge('agent_llm_queue_depth', 'LLM requests waiting for their turn.')
+llm_queued_users = Gauge('agent_llm_queued_users', 'Users with LLM requests waiting for their turn.')
+llm_queue_seconds = Histogram('agent_llm_queue_seconds', 'Time LLM requests waited for their turn and the rate limits.')
+llm_throttled = Counter('agent_llm_throttled_total', 'LLM requests refused by the endpoint for its rate limit.')
+
+tool_calls = Counter('agent_tool_calls_total', 'Agent tool calls, by tool and outcome.', ['tool', 'status'])
+tool_seconds = Histogram('agent_tool_seconds', 'Duration of agent tool calls, queueing included.', ['tool'])
+tool_queries = Counter('agent_tool_db_queries_total', 'Database queries run by agent tools.', ['tool'])
+tool_result_bytes = Counter('agent_tool_result_bytes_total', 'Size of the agent tool results sent to the LLM.',
+                            ['tool'])
+
+handoffs = Counter('agent_handoffs_total', 'Handoffs between agents.', ['from_agent', 'to_agent'])
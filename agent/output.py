@@ -0,0 +1,110 @@
+from datetime import datetime, date, timezone as dt_timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from agent.tokens import count_tokens
+
+SEPARATOR = '|'
+
+# Tokens kept free for the "more available" line when rows are cut off.
+FOOTER_TOKENS = 40
+
+
+def render_value(value, max_chars: int = None) -> str:
+    """
+    Render a cell of a compact table: datetimes to the minute in UTC, no 'None', no separators or line breaks.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f'{value:.3g}'
+    text = ' '.join(str(value).replace(SEPARATOR, '/').split())
+    max_chars = max_chars or settings.AGENT_TOOL_OUTPUT['MAX_CELL_CHARS']
+    if len(text) > max_chars:
+        text = text[:max_chars - 1] + '…'
+    return text
+
+
+def _fit_line(row: Dict, fields: Sequence[str], max_tokens: int) -> str:
+    """
+    Render a row in at most `max_tokens` tokens, halving the length of its cells until it fits.
+    """
+    max_chars = settings.AGENT_TOOL_OUTPUT['MAX_CELL_CHARS']
+    while True:
+        line = SEPARATOR.join(render_value(row.get(field), max_chars) for field in fields)
+        if max_chars == 1 or count_tokens(line) <= max_tokens:
+            return line
+        max_chars = max(1, max_chars // 2)
+
+
+def render_table(
+        rows: Sequence[Dict],
+        fields: Sequence[str],
+        max_tokens: Optional[int] = None,
+        has_more: bool = False,
+        next_page: Optional[Callable[[int], str]] = None,
+        empty: str = 'No results.',
+) -> str:
+    """
+    Render tool results as a compact table for the LLM: the header once, then one line per row.
+
+    Rows are added while the table fits in `max_tokens` tokens, AGENT_TOOL_OUTPUT['MAX_TOKENS'] by
+    default. The first row is always shown, with its cells shortened if it does not fit. When rows are
+    cut off, or `has_more` says there are rows past these, a last line tells the LLM how many rows are
+    shown and, from `next_page(shown)`, how to fetch the rest.
+
+    Args:
+        rows: The rows, as dictionaries holding at least the given fields.
+        fields: The columns to render, in order.
+        max_tokens: The token budget of the whole table.
+        has_more: Whether there are rows past the given ones.
+        next_page: Returns the hint to fetch the rows after the first `shown` ones, e.g. a cursor.
+        empty: The text returned when there are no rows.
+
+    Returns:
+        str: The table.
+    """
+    if not rows:
+        return empty
+
+    max_tokens = max_tokens or settings.AGENT_TOOL_OUTPUT['MAX_TOKENS']
+    lines = [SEPARATOR.join(fields)]
+    used = count_tokens(lines[0]) + 1 + FOOTER_TOKENS
+    for row in rows:
+        line = SEPARATOR.join(render_value(row.get(field)) for field in fields)
+        # Every line break is a token of its own.
+        if used + count_tokens(line) + 1 > max_tokens:
+            if len(lines) > 1:
+                break
+            line = _fit_line(row, fields, max_tokens - used - 1)
+        used += count_tokens(line) + 1
+        lines.append(line)
+
+    shown = len(lines) - 1
+    if shown < len(rows) or has_more:
+        more = f'more available: showing {shown} of {len(rows)}{"+" if has_more else ""} rows'
+        if next_page:
+            more += f'; {next_page(shown)}'
+        lines.append(more)
+    return '\n'.join(lines)
+
+
+def project(fields: Optional[List[str]], available: Sequence[str], required: Sequence[str] = ('id',)) -> List[str]:
+    """
+    Return the columns a tool renders: the requested fields among the available ones, always with the
+    required ones first, or every available field when none is requested.
+
+    Raises:
+        ValueError: If a requested field is not available.
+    """
+    if not fields:
+        return list(available)
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f'Unknown fields {", ".join(unknown)}; choose among {", ".join(available)}.')
+    return list(required) + [field for field in available if field in fields and field not in required]
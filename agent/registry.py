@@ -0,0 +1,65 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+
+def get_workflow():
+    """
+    Return the workflow of the agents, built on first use.
+
+    Building it imports llama-index, the OpenAI client and yfinance, which takes seconds, so nothing
+    that runs at startup, such as management commands or the URL configuration, should call this.
+    """
+    with _lock:
+        return _build_workflow()
+
+
+@functools.cache
+def _build_workflow():
+    started = time.perf_counter()
+    from agent.engine import build_workflow
+
+    workflow = build_workflow()
+    logger.info('Built the agent workflow in %.2fs', time.perf_counter() - started)
+    return workflow
+
+
+def _load_consumer(path: str):
+    consumer = import_string(path).as_asgi()
+    get_workflow()
+    return consumer
+
+
+def lazy_consumer(path: str):
+    """
+    Return an ASGI app for the consumer class at `path`, which is imported, with the agent workflow
+    built, when the first connection comes in.
+
+    The import runs on a thread, so a connection arriving before the app is warm does not hold up
+    the event loop.
+    """
+    consumer = None
+
+    async def app(scope, receive, send):
+        nonlocal consumer
+        if consumer is None:
+            consumer = await asyncio.to_thread(_load_consumer, path)
+        return await consumer(scope, receive, send)
+
+    return app
+
+
+def warm_up(path: str):
+    """
+    Import the consumer class at `path` and build the agent workflow on a background thread, so the
+    first chat after startup does not wait for them.
+    """
+    threading.Thread(target=_load_consumer, args=(path,), name='agent-warm-up', daemon=True).start()
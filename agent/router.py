@@ -0,0 +1,104 @@
+import re
+from collections import namedtuple
+from functools import partial
+from zoneinfo import ZoneInfo
+
+from fintrack.services import aget_current_balance, alist_transactions
+
+# The chat is set up for users in Bangladesh, see the initial information sent by the chat consumer.
+TIMEZONE = ZoneInfo('Asia/Dhaka')
+CURRENCY = 'BDT'
+
+FINANCE_AGENT = 'FinanceManagementAgent'
+ACCOUNT_AGENT = 'AccountManagementAgent'
+
+# A route is either a direct reply, built by awaiting `reply` which calls a service function, or
+# a specialist agent the workflow starts with instead of the root agent.
+Route = namedtuple('Route', ['intent', 'agent', 'reply'])
+
+FINANCE_WORDS = {
+    'balance', 'transaction', 'transactions', 'expense', 'expenses', 'spent', 'spend', 'spending', 'income',
+    'deposit', 'deposits', 'deposited', 'salary', 'paid', 'bought', 'cost', 'costs', 'money', 'taka', 'bdt',
+}
+ACCOUNT_WORDS = {
+    'account', 'profile', 'email', 'e-mail', 'name', 'password', 'login', 'logout', 'deactivate', 'signed',
+}
+# Stock questions are answered by the root agent with the Yahoo Finance tools.
+STOCK_WORDS = {'stock', 'stocks', 'share', 'shares', 'ticker', 'market', 'price', 'prices', 'dividend'}
+
+BALANCE = re.compile(
+    r"(what is |whats |show |show me |check |tell me )?(my )?(current |total )?balance"
+    r"|how much (money )?do i have( left)?"
+)
+RECENT_TRANSACTIONS = re.compile(
+    r"(show|list|get|what are)( me)? my (last|latest|recent|most recent) ((?P<limit>\d{1,3}) )?"
+    r"(?P<kind>expenses|deposits|incomes|balance transactions)"
+)
+TRANSACTION_TYPES = {
+    'expenses': ('expense', 'expenses'),
+    'deposits': ('balance', 'deposits'),
+    'incomes': ('balance', 'deposits'),
+    'balance transactions': ('balance', 'deposits'),
+}
+
+# Keywords of a domain a message must contain, and none of the other domain's, to be sent to its agent.
+MIN_KEYWORDS = 2
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace('’', "'").replace("'", '')
+    text = re.sub(r'[?.!]+$', '', text.strip())
+    return re.sub(r'\s+', ' ', text)
+
+
+def route(text: str, user_id: int):
+    """
+    Find the route of a user message, or None if it has to go through the root agent.
+
+    Only whole messages matching a known question are answered directly, and only messages
+    that clearly concern a single domain, with MIN_KEYWORDS keywords of it and none of the other,
+    are sent to its agent.
+    """
+    text = normalize(text)
+
+    if BALANCE.fullmatch(text):
+        return Route('balance', FINANCE_AGENT, partial(_balance_reply, user_id))
+
+    match = RECENT_TRANSACTIONS.fullmatch(text)
+    # Questions about no transactions at all are left to the agents.
+    if match and int(match['limit'] or 10):
+        transaction_type, label = TRANSACTION_TYPES[match['kind']]
+        limit = min(int(match['limit'] or 10), 100)
+        return Route('recent_transactions', FINANCE_AGENT,
+                     partial(_recent_transactions_reply, user_id, transaction_type, label, limit))
+
+    words = set(re.findall(r"[\w-]+", text))
+    if words & STOCK_WORDS:
+        return None
+    finance, account = len(words & FINANCE_WORDS), len(words & ACCOUNT_WORDS)
+    if finance >= MIN_KEYWORDS and not account:
+        return Route('finance', FINANCE_AGENT, None)
+    if account >= MIN_KEYWORDS and not finance:
+        return Route('account', ACCOUNT_AGENT, None)
+    return None
+
+
+async def _balance_reply(user_id):
+    balance = await aget_current_balance(user_id=user_id)
+    return f'Your current balance is {balance:,} {CURRENCY}.'
+
+
+async def _recent_transactions_reply(user_id, transaction_type, label, limit):
+    transactions = await alist_transactions(
+        user_id=user_id, transaction_type=transaction_type, order_by='-created_at', limit=limit,
+    )
+    if not transactions:
+        return f'You have no {label} yet.'
+
+    lines = [f'Here are your last {len(transactions)} {label}:']
+    for i, transaction in enumerate(transactions, start=1):
+        created_at = transaction['created_at'].astimezone(TIMEZONE)
+        lines.append(
+            f"{i}. {transaction['title']}: {transaction['amount']:,} {CURRENCY} on {created_at:%d %B, %Y %I:%M %p}"
+        )
+    return '\n'.join(lines)
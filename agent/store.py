@@ -0,0 +1,118 @@
+import json
+import time
+import zlib
+from collections import OrderedDict
+from functools import cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from llama_index.core.workflow import Context
+from redis.asyncio import Redis
+
+
+class ContextStore:
+    """
+    Storage of serialized workflow contexts, so a conversation can be resumed by any worker.
+
+    Contexts are stored as compressed JSON. Every save refreshes the TTL of the key, and contexts
+    larger than `max_bytes` once compressed are rejected instead of stored.
+    """
+
+    def __init__(self, ttl: int = 86400, max_bytes: int = 512 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    async def _get(self, key: str):
+        raise NotImplementedError
+
+    async def _set(self, key: str, value: bytes):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def load(self, key: str, workflow):
+        """
+        Return the stored context of a key bound to the workflow, or None if there is none.
+        """
+        value = await self._get(key)
+        if value is None:
+            return None
+        return Context.from_dict(workflow, json.loads(zlib.decompress(value)))
+
+    async def save(self, key: str, ctx: Context) -> bool:
+        """
+        Store the context of a finished run under the key.
+
+        Only the conversation state is kept: the event log and stream of the finished run are
+        dropped, as a new run does not need them.
+
+        Returns:
+            bool: False if the context exceeds the size cap and was not stored.
+        """
+        data = ctx.to_dict()
+        data['broker_log'] = []
+        data['streaming_queue'] = json.dumps([])
+        value = zlib.compress(json.dumps(data).encode())
+        if len(value) > self.max_bytes:
+            await self.delete(key)
+            return False
+        await self._set(key, value)
+        return True
+
+
+class InMemoryContextStore(ContextStore):
+    """
+    Process local store, for tests and single worker development servers.
+    """
+
+    def __init__(self, max_entries: int = 1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+
+class RedisContextStore(ContextStore):
+    def __init__(self, url: str = None, prefix: str = 'agent:context:', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+        self.client = Redis.from_url(url or settings.REDIS_URL)
+
+    async def _get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def _set(self, key, value):
+        await self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    async def delete(self, key):
+        await self.client.delete(self.prefix + key)
+
+
+@cache
+def get_context_store() -> ContextStore:
+    config = settings.AGENT_CONTEXT_STORE
+    return import_string(config['BACKEND'])(
+        ttl=config.get('TTL', 86400),
+        max_bytes=config.get('MAX_BYTES', 512 * 1024),
+        **config.get('OPTIONS', {}),
+    )
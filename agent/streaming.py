@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+
+class StreamBuffer:
+    """
+    Buffer of streamed reply text, flushed to `send` by size and by time.
+
+    The first text is sent as soon as it arrives when `first_chunk` is set. After that, text is
+    flushed once `max_chars` characters are buffered or `max_latency` seconds have passed since
+    the last flush, whichever comes first, so a slow stream still shows up promptly and a fast one
+    is not sent a token at a time. A `max_latency` of None only flushes by size.
+    """
+
+    def __init__(self, send, first_chunk: bool = True, max_chars: int = 200, max_latency: float = 0.05):
+        self.send = send
+        self.first_chunk = first_chunk
+        self.max_chars = max_chars
+        self.max_latency = max_latency
+        self.text = ''
+        self.flushes = 0
+        self._buffer = ''
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls, send):
+        config = settings.AGENT_STREAM
+        return cls(send, first_chunk=config['FIRST_CHUNK'], max_chars=config['MAX_CHARS'],
+                   max_latency=config['MAX_LATENCY'])
+
+    async def add(self, delta: str):
+        if not delta:
+            return
+        self._buffer += delta
+        self.text += delta
+
+        if self.first_chunk and not self.flushes:
+            await self.flush()
+        elif len(self._buffer) >= self.max_chars:
+            await self.flush()
+        elif self.max_latency is not None:
+            wait = self.max_latency - (time.monotonic() - self._last_flush)
+            if wait <= 0:
+                await self.flush()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later(wait))
+
+    async def flush(self):
+        """
+        Send the buffered text, if any.
+        """
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+        async with self._lock:
+            text, self._buffer = self._buffer, ''
+            if text:
+                self.flushes += 1
+                self._last_flush = time.monotonic()
+                await self.send(text)
+
+    async def _flush_later(self, wait):
+        await asyncio.sleep(wait)
+        await self.flush()
@@ -0,0 +1,587 @@
+import asyncio
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from llama_index.core.agent.workflow import ToolCallResult
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.llms import MockLLM
+from llama_index.core.workflow import Context, StartEvent, StopEvent, Workflow, step
+from openai import RateLimitError
+
+from agent import metrics, router, tools
+from agent.cache import LLMCache, LRUCacheBackend, cache_scope
+from agent.dispatch import Dispatcher, TokenBucket
+from agent.engine import session_prompt, session_state
+from agent.fake_llm import FakeLLMServer, END_MARKER
+from agent.importtime import profile_imports, report
+from agent.market import FakeYahooFinanceToolSpec, MarketDataCache
+from agent.memory import TRUNCATED, RollingSummaryMemory
+from agent.output import FOOTER_TOKENS, render_table
+from agent.registry import get_workflow
+from agent.store import InMemoryContextStore
+from agent.streaming import StreamBuffer
+from agent.tokens import count_message_tokens, count_tokens
+from agent.tools import async_tool
+from config.llm import CustomLLM, closing_streams, github_model
+from fintrack.seeding import seed_transactions
+from fintrack.services import get_current_balance
+
+MESSAGES = [ChatMessage(role=MessageRole.USER, content='What is my balance?')]
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_take_waits_for_refill(self):
+        async def take():
+            bucket = TokenBucket(6000)
+            await bucket.take(6000)
+            started = time.perf_counter()
+            await bucket.take(10)
+            return time.perf_counter() - started
+
+        self.assertGreaterEqual(asyncio.run(take()), 0.09)
+
+    def test_charge_leaves_debt(self):
+        async def take():
+            bucket = TokenBucket(6000)
+            bucket.charge(6010)
+            started = time.perf_counter()
+            await bucket.take(10)
+            return time.perf_counter() - started
+
+        self.assertGreaterEqual(asyncio.run(take()), 0.19)
+
+
+class DispatcherTests(SimpleTestCase):
+    def test_users_take_turns(self):
+        dispatcher = Dispatcher(max_concurrency=1)
+        order = []
+
+        async def request(user, name):
+            cache_scope.set(user)
+            async with dispatcher.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            tasks = [asyncio.create_task(request('busy', f'busy-{i}')) for i in range(4)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request('other', 'other-0')))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        self.assertEqual(order, ['busy-0', 'busy-1', 'other-0', 'busy-2', 'busy-3'])
+        self.assertEqual((dispatcher.in_flight, dispatcher.queue_depth), (0, 0))
+
+    def test_cancelled_request_leaves_queue(self):
+        dispatcher = Dispatcher(max_concurrency=1)
+
+        async def run():
+            async with dispatcher.slot():
+                waiting = asyncio.create_task(dispatcher.slot().__aenter__())
+                await asyncio.sleep(0)
+                self.assertEqual(dispatcher.queue_depth, 1)
+                waiting.cancel()
+                await asyncio.gather(waiting, return_exceptions=True)
+                self.assertEqual(dispatcher.queue_depth, 0)
+
+        asyncio.run(run())
+        self.assertEqual(dispatcher.in_flight, 0)
+
+
+class CustomLLMDispatchTests(SimpleTestCase):
+    """
+    LLM requests against a local stub endpoint, through a dispatcher.
+    """
+
+    def setUp(self):
+        self.server = FakeLLMServer(first_token_latency=0.05, tool_calls=False).start()
+        self.addCleanup(self.server.stop)
+
+    def llm(self, dispatcher):
+        return CustomLLM(api_base=self.server.url, api_key='fake', model='gpt-4o', max_retries=0,
+                         dispatcher=dispatcher)
+
+    def test_concurrency_is_bounded(self):
+        llm = self.llm(Dispatcher(max_concurrency=2))
+
+        async def chat():
+            response = None
+            async for response in await llm.astream_chat(MESSAGES):
+                pass
+            return response.message.content
+
+        async def run():
+            return await asyncio.gather(*(chat() for _ in range(6)))
+
+        with self.assertLogs('agent.tracing'):
+            replies = asyncio.run(run())
+        self.assertTrue(all(reply.endswith(END_MARKER) for reply in replies))
+        self.assertEqual(self.server.stats['requests'], 6)
+        self.assertEqual(self.server.stats['max_in_flight'], 2)
+
+    def test_abandoned_stream_frees_its_slot(self):
+        llm = self.llm(Dispatcher(max_concurrency=1))
+
+        async def run():
+            # Closed after the first chunk, while still referenced, then cancelled while reading.
+            stream = await llm._astream_chat(MESSAGES)
+            await anext(stream)
+            in_flight = llm.dispatcher.in_flight
+            await stream.aclose()
+            closed = llm.dispatcher.in_flight
+
+            async def read():
+                async with closing_streams():
+                    async for _ in await llm.astream_chat(MESSAGES):
+                        await asyncio.sleep(1)
+
+            task = asyncio.create_task(read())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return in_flight, closed, llm.dispatcher.in_flight
+
+        with self.assertLogs('agent.tracing'):
+            self.assertEqual(asyncio.run(run()), (1, 0, 0))
+
+    def test_rate_limited_request_pauses_dispatch(self):
+        self.server.rate_limited = 1
+        llm = self.llm(Dispatcher())
+
+        async def run():
+            with self.assertRaises(RateLimitError):
+                await llm.achat(MESSAGES)
+            started = time.perf_counter()
+            await llm.achat(MESSAGES)
+            return time.perf_counter() - started
+
+        with self.assertLogs('agent.tracing'):
+            self.assertGreaterEqual(asyncio.run(run()), 0.9)
+
+
+class LLMCacheTests(SimpleTestCase):
+    def test_requests_with_tool_output_are_scoped_to_the_user(self):
+        llm_cache = LLMCache(LRUCacheBackend())
+        with_tool = [*MESSAGES, ChatMessage(role=MessageRole.TOOL, content='1500',
+                                            additional_kwargs={'tool_call_id': 'call'})]
+
+        def key(user, messages):
+            cache_scope.set(user)
+            return llm_cache.key('gpt-4o', messages, {})
+
+        self.assertEqual(key('one', MESSAGES), key('two', MESSAGES))
+        self.assertNotEqual(key('one', with_tool), key('two', with_tool))
+        self.assertIsNone(key(None, with_tool))
+
+    def test_hits_are_counted(self):
+        server = FakeLLMServer(first_token_latency=0.05, tool_calls=False).start()
+        self.addCleanup(server.stop)
+        llm = CustomLLM(api_base=server.url, api_key='fake', model='cache-test/gpt-4o', max_retries=0,
+                        cache=LLMCache(LRUCacheBackend()), dispatcher=Dispatcher())
+
+        async def run():
+            return [(await llm.achat(MESSAGES)).message.content for _ in range(3)]
+
+        with self.assertLogs('agent.tracing'):
+            replies = asyncio.run(run())
+        self.assertEqual(len(set(replies)), 1)
+        self.assertEqual(server.stats['requests'], 1)
+        self.assertEqual(metrics.llm_cache_misses.value(model='cache-test/gpt-4o'), 1)
+        self.assertEqual(metrics.llm_cache_hits.value(model='cache-test/gpt-4o'), 2)
+        self.assertGreaterEqual(metrics.llm_cache_saved_seconds.value(model='cache-test/gpt-4o'), 0.1)
+
+
+class PromptCacheTests(SimpleTestCase):
+    """
+    Cached prompt tokens reported by a local stub endpoint emulating a prompt prefix cache.
+    """
+
+    def setUp(self):
+        self.server = FakeLLMServer(first_token_latency=0, token_latency=0, tool_calls=False,
+                                    prefix_cache_min_tokens=0).start()
+        self.addCleanup(self.server.stop)
+
+    def test_streamed_usage_is_traced(self):
+        llm = CustomLLM(api_base=self.server.url, api_key='fake', model='gpt-4o', max_retries=0,
+                        dispatcher=Dispatcher())
+
+        async def chat(messages):
+            async for _ in await llm.astream_chat(messages):
+                pass
+
+        async def run():
+            await chat(MESSAGES)
+            await chat([*MESSAGES, ChatMessage(role=MessageRole.USER, content='And last month?')])
+
+        with self.assertLogs('agent.tracing') as logs:
+            asyncio.run(run())
+        first, second = (json.loads(record.getMessage())['attributes'] for record in logs.records)
+        self.assertEqual(first['cached_prompt_tokens'], 0)
+        self.assertEqual(second['cached_prompt_tokens'], first['prompt_tokens'])
+        self.assertGreater(second['prompt_tokens'], second['cached_prompt_tokens'])
+
+    def test_session_facts_follow_the_static_prompt(self):
+        prompt = session_prompt({**session_state(7), 'system_date': '01 January, 2026'})
+        self.assertIn('Authenticated User ID: 7', prompt)
+        self.assertTrue(prompt.endswith('- Today: 01 January, 2026'))
+        self.assertEqual(session_prompt({'user_id': None}), '')
+
+
+class StartupTests(SimpleTestCase):
+    """
+    Loading the settings, the ASGI app and the URLs stays within an import budget, and leaves the
+    agents, llama-index, the OpenAI client and yfinance to the first chat.
+    """
+    BUDGET_SECONDS = 2
+    DEFERRED = {'agent.engine', 'fintrack.consumer', 'llama_index.core', 'openai', 'yfinance'}
+
+    def test_import_budget(self):
+        imports = profile_imports(AGENT_WARM_UP='0')
+        message = report(imports)
+        self.assertFalse(self.DEFERRED & {entry.module for entry in imports}, message)
+        self.assertLess(sum(entry.seconds for entry in imports if entry.depth == 0), self.BUDGET_SECONDS, message)
+
+
+class RouterTests(SimpleTestCase):
+    def intent(self, text):
+        route = router.route(text, 1)
+        return route and (route.intent, route.agent)
+
+    def test_direct_replies(self):
+        self.assertEqual(self.intent("What's my balance?"), ('balance', router.FINANCE_AGENT))
+        route = router.route('Show me my last 5 expenses', 1)
+        self.assertEqual(route.intent, 'recent_transactions')
+        self.assertEqual(route.reply.args, (1, 'expense', 'expenses', 5))
+        self.assertEqual(router.route('list my recent deposits', 1).reply.args, (1, 'balance', 'deposits', 10))
+        self.assertEqual(router.route('show my last 500 expenses', 1).reply.args[-1], 100)
+
+    def test_specialists(self):
+        self.assertEqual(self.intent('I spent money on a rickshaw'), ('finance', router.FINANCE_AGENT))
+        self.assertEqual(self.intent('Change my email and password'), ('account', router.ACCOUNT_AGENT))
+
+    def test_fallbacks_to_the_root_agent(self):
+        for text in ('show my last 0 expenses', 'What is my name?', 'How much did I spend?',
+                     'Show my balance and change my email', 'Is the stock price of my salary shares up?',
+                     'Hello'):
+            with self.subTest(text=text):
+                self.assertIsNone(router.route(text, 1))
+
+
+class RenderTableTests(SimpleTestCase):
+    rows = [{'id': i, 'title': f'Tea {i}', 'amount': 20} for i in range(1, 101)]
+
+    def test_all_rows_fit(self):
+        table = render_table(self.rows[:3], ['id', 'title'])
+        self.assertEqual(table, 'id|title\n1|Tea 1\n2|Tea 2\n3|Tea 3')
+
+    def test_rows_cut_off_at_the_budget(self):
+        table = render_table(self.rows, ['id', 'title', 'amount'], max_tokens=120,
+                             next_page=lambda shown: f'pass offset={shown}')
+        lines = table.splitlines()
+        shown = len(lines) - 2
+        self.assertLess(shown, len(self.rows))
+        self.assertEqual(lines[-1], f'more available: showing {shown} of 100 rows; pass offset={shown}')
+        self.assertLessEqual(count_tokens(table), 120)
+
+    def test_has_more(self):
+        table = render_table(self.rows[:2], ['id'], has_more=True, next_page=lambda shown: 'cursor=abc')
+        self.assertEqual(table.splitlines()[-1], 'more available: showing 2 of 2+ rows; cursor=abc')
+
+    def test_first_row_over_the_budget_is_shortened(self):
+        rows = [{'id': i, 'title': 'rickshaw ' * 20, 'description': 'office ' * 20} for i in (1, 2)]
+        table = render_table(rows, ['id', 'title', 'description'], max_tokens=70)
+        header, first, more = table.splitlines()
+        self.assertTrue(first.startswith('1|rick'))
+        self.assertEqual(first.count('…'), 2)
+        self.assertLessEqual(count_tokens(header) + count_tokens(first) + 2 + FOOTER_TOKENS, 70)
+        self.assertEqual(more, 'more available: showing 1 of 2 rows')
+
+
+class StreamBufferTests(SimpleTestCase):
+    def stream(self, deltas, pause=0.0, **kwargs):
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        async def run():
+            buffer = StreamBuffer(send, **kwargs)
+            for delta in deltas:
+                await buffer.add(delta)
+                await asyncio.sleep(pause)
+            await buffer.flush()
+            return buffer
+
+        buffer = asyncio.run(run())
+        self.assertEqual(''.join(sent), ''.join(deltas))
+        self.assertEqual(buffer.flushes, len(sent))
+        return sent
+
+    def test_first_chunk_is_sent_at_once(self):
+        self.assertEqual(self.stream(['Your', ' balance', ' is'], max_chars=100, max_latency=None),
+                         ['Your', ' balance is'])
+        self.assertEqual(self.stream(['Your', ' balance', ' is'], first_chunk=False, max_chars=100,
+                                     max_latency=None), ['Your balance is'])
+
+    def test_flushes_by_size(self):
+        self.assertEqual(self.stream(['ab', 'cd', 'ef', 'g'], first_chunk=False, max_chars=4, max_latency=None),
+                         ['abcd', 'efg'])
+
+    def test_flushes_by_time(self):
+        # Buffered text is sent once max_latency has passed, even when no more text arrives.
+        self.assertEqual(self.stream(['a', 'b'], pause=0.2, first_chunk=False, max_chars=100, max_latency=0.05),
+                         ['a', 'b'])
+        self.assertEqual(self.stream(['a', 'b'], first_chunk=False, max_chars=100, max_latency=0.05), ['ab'])
+
+
+class RollingSummaryMemoryTests(SimpleTestCase):
+    def memory(self, turns, **kwargs):
+        memory = RollingSummaryMemory(llm=MockLLM(max_tokens=20), **kwargs)
+        for i in range(turns):
+            memory.put(ChatMessage(role=MessageRole.USER, content=f'How much did I spend on day {i}? ' * 5))
+            memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=f'You spent {i * 100} taka that day. ' * 5))
+        return memory
+
+    def test_old_turns_are_summarized(self):
+        memory = self.memory(5, keep_turns=2, token_limit=10000)
+        messages = asyncio.run(memory.aget())
+        self.assertTrue(memory.summary)
+        self.assertEqual(messages[0].role, MessageRole.SYSTEM)
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(len(memory.get_all()), 4)
+
+    def test_prompt_fits_in_the_token_limit(self):
+        memory = self.memory(8, keep_turns=8, token_limit=400)
+        messages = asyncio.run(memory.aget(reserved_tokens=150))
+        self.assertLessEqual(count_message_tokens(messages) + 150, 400)
+        self.assertLessEqual(memory.last_prompt_tokens, 400)
+        self.assertGreater(memory.last_prompt_tokens, 150)
+
+    def test_tool_output_of_the_current_turn_is_cut(self):
+        memory = self.memory(1, token_limit=300)
+        output = 'id|title|amount\n' + '\n'.join(f'{i}|Rickshaw to office|{i}' for i in range(300))
+        memory.put(ChatMessage(role=MessageRole.TOOL, content=output, additional_kwargs={'tool_call_id': 'call'}))
+        messages = memory.get(reserved_tokens=50)
+        self.assertLessEqual(count_message_tokens(messages) + 50, 300)
+        self.assertTrue(messages[-1].content.endswith(TRUNCATED))
+        self.assertEqual(memory.get_all()[-1].content, output)
+
+
+class EchoWorkflow(Workflow):
+    @step
+    async def echo(self, ctx: Context, ev: StartEvent) -> StopEvent:
+        await ctx.set('turns', await ctx.get('turns', default=0) + 1)
+        return StopEvent(result=ev.message)
+
+
+class ContextStoreTests(SimpleTestCase):
+    def save_run(self, store, ctx=None):
+        async def run():
+            handler = EchoWorkflow().run(ctx=ctx, message='hi')
+            await handler
+            return await store.save('chat', handler.ctx)
+
+        return asyncio.run(run())
+
+    def load_turns(self, store):
+        async def load():
+            ctx = await store.load('chat', EchoWorkflow())
+            return None if ctx is None else await ctx.get('turns')
+
+        return asyncio.run(load())
+
+    def test_round_trip(self):
+        store = InMemoryContextStore()
+        self.assertTrue(self.save_run(store))
+        self.assertEqual(self.load_turns(store), 1)
+
+        async def resume():
+            return await store.load('chat', EchoWorkflow())
+
+        self.assertTrue(self.save_run(store, asyncio.run(resume())))
+        self.assertEqual(self.load_turns(store), 2)
+
+    def test_expired_context_is_dropped(self):
+        store = InMemoryContextStore(ttl=0)
+        self.save_run(store)
+        self.assertIsNone(self.load_turns(store))
+
+    def test_oversized_context_is_not_stored(self):
+        store = InMemoryContextStore()
+        self.save_run(store)
+        store.max_bytes = 10
+        self.assertFalse(self.save_run(store))
+        self.assertIsNone(self.load_turns(store))
+
+    def test_least_recently_used_contexts_are_dropped(self):
+        store = InMemoryContextStore(max_entries=2)
+
+        async def run():
+            for key in ('a', 'b', 'a', 'c'):
+                await store._set(key, b'context')
+            return [await store._get(key) for key in ('a', 'b', 'c')]
+
+        self.assertEqual(asyncio.run(run()), [b'context', None, b'context'])
+
+
+class MarketDataCacheTests(SimpleTestCase):
+    def test_least_recently_used_entries_are_dropped(self):
+        spec = FakeYahooFinanceToolSpec(latency=0)
+        market_data = MarketDataCache(spec, {}, max_entries=2)
+
+        async def run():
+            for ticker in ('AAPL', 'MSFT', 'AAPL', 'GOOG', 'AAPL', 'MSFT'):
+                await market_data.get('stock_basic_info', ticker)
+
+        asyncio.run(run())
+        self.assertEqual(len(market_data._entries), 2)
+        self.assertEqual(spec.calls, {('stock_basic_info', 'AAPL'): 1, ('stock_basic_info', 'MSFT'): 2,
+                                      ('stock_basic_info', 'GOOG'): 1})
+
+
+class MetricsViewTests(TestCase):
+    def test_denied_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 403)
+
+    @override_settings(AGENT_METRICS={'TOKEN': 'secret', 'PUBLIC': False})
+    def test_served_to_scrapers_with_the_token(self):
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+    def test_served_to_staff(self):
+        user = get_user_model().objects.create_user(email='metrics@example.com', name='Metrics', is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(AGENT_METRICS={'TOKEN': '', 'PUBLIC': True})
+    def test_public(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+def slow_balance(user_id, latency):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_sleep(%s)', [latency])
+    return get_current_balance(user_id)
+
+
+class AsyncToolTests(TransactionTestCase):
+    """
+    Tool calls of simultaneous chats, slowed down in the database, against the async tool wrapper.
+    """
+
+    LATENCY = 0.2
+    CALLS = 6
+
+    def setUp(self):
+        # Without the pool, the tool threads would keep their connections and the test database could not be dropped.
+        self.enterContext(mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0))
+        self.user = get_user_model().objects.create_user(email='async-tools@example.com', name='Async tools')
+        seed_transactions(self.user.id, 20)
+
+    def test_calls_overlap_without_blocking_the_loop(self):
+        tool = async_tool(slow_balance)
+
+        async def run():
+            lag = 0.0
+            done = asyncio.Event()
+
+            async def heartbeat():
+                nonlocal lag
+                while not done.is_set():
+                    started = time.perf_counter()
+                    await asyncio.sleep(0.001)
+                    lag = max(lag, time.perf_counter() - started - 0.001)
+
+            started = time.perf_counter()
+            await tool(self.user.id, self.LATENCY)
+            single = time.perf_counter() - started
+
+            monitor = asyncio.create_task(heartbeat())
+            started = time.perf_counter()
+            results = await asyncio.gather(*(tool(self.user.id, self.LATENCY) for _ in range(self.CALLS)))
+            wall = time.perf_counter() - started
+            done.set()
+            await monitor
+            return results, single, wall, lag
+
+        with self.assertLogs('agent.tracing'):
+            results, single, wall, lag = asyncio.run(run())
+        self.assertEqual(len(set(results)), 1)
+        self.assertLess(wall, self.CALLS * single / 2)
+        self.assertLess(lag, 0.05)
+
+
+class ToolCallWorkflowTests(TransactionTestCase):
+    """
+    Chat turns in which the finance agent calls three tools in the same step, against a local stub endpoint.
+
+    The tools run on their own threads, so the data they read must be committed.
+    """
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0))
+        self.user = get_user_model().objects.create_user(email='tool-steps@example.com', name='Tool steps')
+        seed_transactions(self.user.id, 50)
+        server = FakeLLMServer(reply_words=5, first_token_latency=0, token_latency=0, parallel_tool_calls=True)
+        server.start()
+        self.addCleanup(server.stop)
+        self.addCleanup(setattr, github_model, 'api_base', github_model.api_base)
+        self.addCleanup(setattr, github_model, 'api_key', github_model.api_key)
+        # The client is built with the endpoint of the first request.
+        self.addCleanup(setattr, github_model, '_aclient', None)
+        github_model.api_base, github_model.api_key = server.url, 'fake'
+
+    def run_turns(self):
+        async def turn():
+            memory = RollingSummaryMemory.from_defaults()
+            handler = get_workflow().run(f'Authenticated User ID: {self.user.id}\nWhat did I spend?', memory=memory)
+            completed = [event.tool_name async for event in handler.stream_events()
+                         if isinstance(event, ToolCallResult)]
+            output = await handler
+            # The tools whose results the chat history holds, in its order.
+            messages = await memory.aget_all()
+            names = {call.id: call.function.name for message in messages
+                     for call in message.additional_kwargs.get('tool_calls', [])}
+            history = [names[message.additional_kwargs['tool_call_id']] for message in messages
+                       if message.role == MessageRole.TOOL]
+            return completed, [call.tool_name for call in output.tool_calls], history
+
+        async def run():
+            # On one event loop, which the LLM client's connections are bound to.
+            results = []
+            for parallel in (False, True):
+                with override_settings(AGENT_PARALLEL_TOOL_CALLS=parallel):
+                    results.append(await turn())
+            return results
+
+        with self.assertLogs('agent.tracing'):
+            return asyncio.run(run())
+
+    def test_results_in_call_order(self):
+        expected = ['handoff', 'get_current_balance', 'get_transactions', 'search_transactions']
+        (sequential_completed, sequential, _), (parallel_completed, parallel, _) = self.run_turns()
+        self.assertEqual(sequential_completed, expected)
+        self.assertEqual(sequential, expected)
+        self.assertCountEqual(parallel_completed, expected)
+        self.assertEqual(parallel, expected)
+
+    def test_history_in_call_order_when_calls_complete_out_of_order(self):
+        call = tools._call
+
+        def slow_balance_call(fn, args, kwargs):
+            if fn.__name__ == 'get_current_balance':
+                time.sleep(0.3)
+            return call(fn, args, kwargs)
+
+        with mock.patch.object(tools, '_call', slow_balance_call):
+            _, (completed, tool_calls, history) = self.run_turns()
+        expected = ['handoff', 'get_current_balance', 'get_transactions', 'search_transactions']
+        self.assertEqual(completed[-1], 'get_current_balance')
+        self.assertEqual(tool_calls, expected)
+        self.assertEqual(history, expected)
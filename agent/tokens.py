@@ -0,0 +1,48 @@
+import json
+from functools import cache
+
+import tiktoken
+
+# Tokens the chat format adds around every message.
+MESSAGE_OVERHEAD = 4
+
+
+@cache
+def get_encoder(model: str = 'gpt-4o'):
+    """
+    Return the tiktoken encode function of a model.
+
+    Falls back to the cl100k_base encoding bundled with llama-index when the model's
+    encoding cannot be loaded, e.g. on hosts without access to the tiktoken CDN.
+    """
+    try:
+        return tiktoken.encoding_for_model(model.split('/')[-1]).encode
+    except Exception:
+        # Imported here, as importing llama-index takes longer than everything else these helpers need.
+        from llama_index.core.utils import get_tokenizer
+        return get_tokenizer()
+
+
+def count_tokens(text: str, model: str = 'gpt-4o') -> int:
+    return len(get_encoder(model)(text))
+
+
+def count_message_tokens(messages, model: str = 'gpt-4o') -> int:
+    """
+    Count the prompt tokens of a list of chat messages, including tool calls.
+    """
+    total = 0
+    for message in messages:
+        total += MESSAGE_OVERHEAD + count_tokens(message.content or '', model)
+        tool_calls = message.additional_kwargs.get('tool_calls')
+        if tool_calls:
+            total += count_tokens(json.dumps(tool_calls, default=str), model)
+    return total
+
+
+def count_tool_tokens(tools, model: str = 'gpt-4o') -> int:
+    """
+    Count the prompt tokens of the schemas of the tools sent with a request.
+    """
+    return sum(count_tokens(json.dumps(tool.metadata.to_openai_tool(skip_length_check=True)), model)
+               for tool in tools)
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from agent import metrics
+from agent.tracing import span
+
+executor = ThreadPoolExecutor(max_workers=settings.AGENT_TOOL_WORKERS, thread_name_prefix='agent-tool')
+
+
+@contextmanager
+def tool_span(name: str):
+    """
+    Trace an agent tool call and record it in the tool metrics.
+
+    Set the 'queries' and 'result_bytes' attributes of the yielded span to count them as well.
+    """
+    with span('tool', tool=name) as tool:
+        status = 'error'
+        try:
+            yield tool
+            status = 'ok'
+        finally:
+            metrics.tool_calls.inc(tool=name, status=status)
+            metrics.tool_seconds.observe(tool.elapsed, tool=name)
+            metrics.tool_queries.inc(tool.attributes.get('queries', 0), tool=name)
+            metrics.tool_result_bytes.inc(tool.attributes.get('result_bytes', 0), tool=name)
+
+
+def _call(fn, args, kwargs):
+    started = time.perf_counter()
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    close_old_connections()
+    try:
+        with connection.execute_wrapper(count):
+            result = fn(*args, **kwargs)
+        return result, queries, started
+    finally:
+        close_old_connections()
+
+
+def async_tool(fn):
+    """
+    Build the async counterpart of a synchronous service function, to register as an agent tool.
+
+    The function runs on a bounded thread pool shared by all tools, so ORM calls never block the
+    event loop and at most AGENT_TOOL_WORKERS database connections are held by tools at once.
+    The wrapper keeps the name, signature and docstring the tool schema is generated from, and
+    traces every call with its time waiting for a thread, its queries and the size of its result.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with tool_span(fn.__name__) as tool:
+            submitted = time.perf_counter()
+            result, queries, started = await loop.run_in_executor(executor, _call, fn, args, kwargs)
+            tool.set(queued_ms=round((started - submitted) * 1000, 1), queries=queries,
+                     result_bytes=len(str(result)))
+        return result
+
+    return wrapper
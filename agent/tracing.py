@@ -0,0 +1,92 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    A timed step of a chat turn, with attributes and child spans.
+
+    A span without a parent is the root of a trace. When it ends, the whole trace is logged as one
+    JSON line on the agent.tracing logger, so a slow turn can be broken down into its LLM calls,
+    handoffs and tool calls.
+    """
+
+    def __init__(self, name: str, parent: 'Span' = None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.children = []
+        self.started_at = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, **attributes):
+        if self.duration is not None:
+            return
+        self.attributes.update(attributes)
+        self.duration = self.elapsed
+        if self.parent is None:
+            logger.info(json.dumps(self.as_dict(), default=str))
+
+    def as_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start_ms': round((self.started_at - self._root.started_at) * 1000, 1),
+            'duration_ms': round((self.duration if self.duration is not None else self.elapsed) * 1000, 1),
+            **({'attributes': self.attributes} if self.attributes else {}),
+            **({'children': [child.as_dict() for child in self.children]} if self.children else {}),
+        }
+
+    @property
+    def _root(self):
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+
+def start_span(name: str, **attributes) -> Span:
+    """
+    Start a child span of the current span, or a new trace, without making it the current span.
+
+    For steps that end in another task or callback, such as a streamed LLM response; call `end`.
+    """
+    return Span(name, current_span.get(), **attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time the enclosed block as a child span of the current span, or a new trace, and make it the current span.
+
+    An exception escaping the block is recorded in the span's 'error' attribute.
+    """
+    new = start_span(name, **attributes)
+    token = current_span.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.set(error=f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        current_span.reset(token)
+        new.end()
@@ -0,0 +1,19 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from agent import metrics
+
+
+def metrics_view(request):
+    """
+    Serve the agent metrics of this process in the Prometheus text format.
+
+    Only to scrapers sending the configured bearer token and to staff users, unless the metrics are public.
+    """
+    token = settings.AGENT_METRICS['TOKEN']
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (settings.AGENT_METRICS['PUBLIC'] or authorized or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,9 +12,11 @@ import os
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
-from config.routing import websocket_urlpatterns
+from agent.registry import warm_up
+from config.routing import CHAT_CONSUMER, websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -24,3 +26,6 @@ application = ProtocolTypeRouter({
         AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
     ),
 })
+
+if settings.AGENT_WARM_UP:
+    warm_up(CHAT_CONSUMER)
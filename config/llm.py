@@ -1,9 +1,80 @@
+import time
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+import httpx
+from django.conf import settings
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.llms.openai import OpenAI
+from openai import DefaultAsyncHttpxClient, RateLimitError
+
+from agent import metrics
+from agent.cache import LLMCache, cached_response, get_llm_cache
+from agent.dispatch import Dispatcher, get_dispatcher
+from agent.tokens import count_message_tokens
+from agent.tracing import start_span
+
+# Seconds every request waits after the endpoint refused one for its rate limit without saying how long to wait.
+RATE_LIMIT_PAUSE = 10
+
+# The streams opened within closing_streams().
+_open_streams: ContextVar[Optional[List]] = ContextVar('open_llm_streams', default=None)
+
+
+@contextmanager
+def _throttled(dispatcher):
+    try:
+        yield
+    except RateLimitError as e:
+        retry_after = e.response.headers.get('retry-after', '')
+        dispatcher.pause(float(retry_after) if retry_after.isdigit() else RATE_LIMIT_PAUSE)
+        raise
+
+
+@asynccontextmanager
+async def closing_streams():
+    """
+    Close the streaming responses opened within the block that are not finished when it exits.
+
+    A consumer that stops reading a stream, because it failed or was cancelled, would otherwise keep
+    the stream and its dispatcher slot until the stream is garbage collected.
+    """
+    streams = []
+    token = _open_streams.set(streams)
+    try:
+        yield
+    finally:
+        _open_streams.reset(token)
+        for stream in streams:
+            await stream.aclose()
 
 
 class CustomLLM(OpenAI):
-    def __init__(self, **kwargs):
+    """
+    OpenAI compatible LLM with an optional response cache.
+
+    When a cache is given, or configured with settings.AGENT_LLM_CACHE, async chat and streaming
+    chat requests are answered from the cache when an identical request was made before. A cached
+    streaming response is replayed as a single chunk.
+
+    Async requests missing the cache go through a dispatcher, or the one configured with
+    settings.AGENT_LLM_DISPATCH, which bounds concurrent requests, applies the rate limits and
+    lets users take turns.
+
+    Every async request is traced as an 'llm' span of the current chat turn, with its latency and
+    tokens, and counted in the LLM metrics. The prompt tokens the endpoint served from its prompt
+    prefix cache are recorded as cached_prompt_tokens; with settings.AGENT_LLM_STREAM_USAGE,
+    streamed responses end with their token usage as well.
+    """
+
+    _cache: LLMCache = PrivateAttr(default=None)
+    _dispatcher: Dispatcher = PrivateAttr(default=None)
+
+    def __init__(self, cache: LLMCache = None, dispatcher: Dispatcher = None, **kwargs):
         super().__init__(**kwargs)
+        self._cache = cache
+        self._dispatcher = dispatcher
 
     def _get_model_name(self) -> str:
         model_name = self.model
@@ -13,8 +84,181 @@ class CustomLLM(OpenAI):
             model_name = super()._get_model_name()
         return model_name
 
+    @property
+    def cache(self):
+        return self._cache or get_llm_cache()
+
+    @property
+    def dispatcher(self):
+        return self._dispatcher or get_dispatcher()
+
+    async def _achat(self, messages, **kwargs):
+        traced = start_span('llm', model=self.model, stream=False, cached=False)
+        try:
+            response = await self._achat_cached(messages, traced, **kwargs)
+        except Exception as e:
+            self._end_trace(traced, messages, None, e)
+            raise
+        self._end_trace(traced, messages, response)
+        return response
+
+    def _get_response_token_counts(self, raw_response):
+        counts = super()._get_response_token_counts(raw_response)
+        details = getattr(getattr(raw_response, 'usage', None), 'prompt_tokens_details', None)
+        if counts and details is not None:
+            counts['cached_tokens'] = details.cached_tokens or 0
+        return counts
+
+    async def _astream_chat(self, messages, **kwargs):
+        if settings.AGENT_LLM_STREAM_USAGE:
+            kwargs.setdefault('stream_options', {'include_usage': True})
+        traced = start_span('llm', model=self.model, stream=True, cached=False)
+        try:
+            stream = await self._astream_chat_cached(messages, traced, **kwargs)
+        except Exception as e:
+            self._end_trace(traced, messages, None, e)
+            raise
+
+        async def gen():
+            response, error = None, None
+            try:
+                async with aclosing(stream):
+                    async for response in stream:
+                        if 'first_token_ms' not in traced.attributes:
+                            traced.set(first_token_ms=round(traced.elapsed * 1000, 1))
+                        yield response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._end_trace(traced, messages, response, error)
+
+        traced_stream = gen()
+        streams = _open_streams.get()
+        if streams is not None:
+            streams.append(traced_stream)
+        return traced_stream
+
+    async def _achat_cached(self, messages, traced, **kwargs):
+        cache = self.cache
+        key = cache and cache.key(self.model, messages, self._get_model_kwargs(**kwargs))
+        if key is None:
+            return await self._dispatched_achat(messages, **kwargs)
+
+        value = await self._cache_get(cache, key)
+        if value is not None:
+            traced.set(cached=True)
+            return cached_response(value)
+
+        started = time.perf_counter()
+        response = await self._dispatched_achat(messages, **kwargs)
+        await cache.set(key, response, time.perf_counter() - started)
+        return response
+
+    async def _astream_chat_cached(self, messages, traced, **kwargs):
+        cache = self.cache
+        key = cache and cache.key(self.model, messages, self._get_model_kwargs(**kwargs))
+        if key is None:
+            return self._dispatched_astream_chat(messages, **kwargs)
+
+        value = await self._cache_get(cache, key)
+        if value is not None:
+            traced.set(cached=True)
+
+            async def replay():
+                yield cached_response(value)
+
+            return replay()
+
+        started = time.perf_counter()
+        stream = self._dispatched_astream_chat(messages, **kwargs)
+
+        async def gen():
+            response = None
+            async with aclosing(stream):
+                async for response in stream:
+                    yield response
+            if response is not None:
+                await cache.set(key, response, time.perf_counter() - started)
+
+        return gen()
+
+    async def _cache_get(self, cache, key):
+        value = await cache.get(key)
+        if value is None:
+            metrics.llm_cache_misses.inc(model=self.model)
+        else:
+            metrics.llm_cache_hits.inc(model=self.model)
+            metrics.llm_cache_saved_seconds.inc(value['latency'], model=self.model)
+        return value
+
+    async def _dispatched_achat(self, messages, **kwargs):
+        dispatcher = self.dispatcher
+        async with dispatcher.slot(self._prompt_tokens(dispatcher, messages)):
+            with _throttled(dispatcher):
+                response = await super()._achat(messages, **kwargs)
+        dispatcher.charge(self._completion_tokens(dispatcher, response))
+        return response
+
+    async def _dispatched_astream_chat(self, messages, **kwargs):
+        # The slot is held until the last chunk is streamed, or until the stream is closed or cancelled.
+        # Every stream wrapping this one closes it when closed itself, see closing_streams.
+        dispatcher = self.dispatcher
+        async with dispatcher.slot(self._prompt_tokens(dispatcher, messages)):
+            response = None
+            with _throttled(dispatcher):
+                async with aclosing(await super()._astream_chat(messages, **kwargs)) as stream:
+                    async for response in stream:
+                        yield response
+            if response is not None:
+                dispatcher.charge(self._completion_tokens(dispatcher, response))
+
+    def _prompt_tokens(self, dispatcher, messages):
+        return count_message_tokens(messages, self.model) if dispatcher.limits_tokens else 0
+
+    def _completion_tokens(self, dispatcher, response):
+        if not dispatcher.limits_tokens:
+            return 0
+        return (response.additional_kwargs.get('completion_tokens')
+                or count_message_tokens([response.message], self.model))
+
+    def _end_trace(self, traced, messages, response, error=None):
+        # Responses without usage are counted like the chat memory counts them, with no cached tokens.
+        usage = response.additional_kwargs if response is not None else {}
+        prompt_tokens = usage.get('prompt_tokens') or count_message_tokens(messages, self.model)
+        cached_prompt_tokens = usage.get('cached_tokens') or 0
+        completion_tokens = usage.get('completion_tokens') or 0
+        if response is not None and not completion_tokens:
+            completion_tokens = count_message_tokens([response.message], self.model)
+        traced.end(prompt_tokens=prompt_tokens, cached_prompt_tokens=cached_prompt_tokens,
+                   completion_tokens=completion_tokens,
+                   **({'error': f'{type(error).__name__}: {error}'} if error else {}))
+
+        cached = traced.attributes['cached']
+        metrics.llm_requests.inc(model=self.model, cached=str(cached).lower())
+        if not cached:
+            metrics.llm_seconds.observe(traced.duration, model=self.model)
+            metrics.llm_prompt_tokens.inc(prompt_tokens, model=self.model)
+            metrics.llm_cached_prompt_tokens.inc(cached_prompt_tokens, model=self.model)
+            metrics.llm_completion_tokens.inc(completion_tokens, model=self.model)
+
+
+def http_client() -> httpx.AsyncClient:
+    """
+    Return an HTTP client keeping a connection alive for every request the dispatcher lets through.
+    """
+    config = settings.AGENT_LLM_DISPATCH
+    return DefaultAsyncHttpxClient(limits=httpx.Limits(
+        max_connections=config['MAX_CONCURRENCY'],
+        max_keepalive_connections=config['MAX_CONCURRENCY'],
+        keepalive_expiry=config['KEEPALIVE_SECONDS'],
+    ))
+
 
 github_model = CustomLLM(
     api_base='https://models.github.ai/inference',
     model='openai/gpt-4o',
+    timeout=settings.AGENT_LLM_DISPATCH['TIMEOUT'],
+    max_retries=settings.AGENT_LLM_DISPATCH['MAX_RETRIES'],
+    async_http_client=http_client(),
 )
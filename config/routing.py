@@ -1,6 +1,9 @@
 from django.urls import re_path
-from fintrack.consumer import ChatConsumer
+
+from agent.registry import lazy_consumer
+
+CHAT_CONSUMER = 'fintrack.consumer.ChatConsumer'
 
 websocket_urlpatterns = [
-    re_path(r"ws/chat/$", ChatConsumer.as_asgi()),
+    re_path(r"ws/chat/$", lazy_consumer(CHAT_CONSUMER)),
 ]
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'account.apps.AccountConfig',
     'fintrack.apps.FintrackConfig',
@@ -74,18 +75,59 @@ ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Set POSTGRES_POOL to 1 to have every process keep a psycopg pool of POSTGRES_POOL_MIN_SIZE to
+# POSTGRES_POOL_MAX_SIZE connections, checked before being handed out; a view or tool call waiting
+# POSTGRES_POOL_TIMEOUT seconds for a free connection fails. Connections are taken by the agent tool
+# threads (AGENT_TOOL_WORKERS) and the threads serving views, and given back after every call, so
+# keep MAX_SIZE above AGENT_TOOL_WORKERS. Without the pool, the default, connections are kept by their
+# thread for POSTGRES_CONN_MAX_AGE seconds and checked before being reused.
+POSTGRES_POOL = os.environ.get('POSTGRES_POOL', '0') == '1'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.environ.get('POSTGRES_NAME'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('POSTGRES_HOST'),
         'PORT': os.environ.get('POSTGRES_PORT'),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 20)),
+                'timeout': float(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+                'max_idle': float(os.environ.get('POSTGRES_POOL_MAX_IDLE', 300)),
+                'max_lifetime': float(os.environ.get('POSTGRES_POOL_MAX_LIFETIME', 3600)),
+            },
+        } if POSTGRES_POOL else {},
     }
 }
 
+# Optional Postgres partitioning of the transactions table by month of created_at. With ENABLED,
+# migrating converts the table, and `manage.py transaction_partitions partition` converts it later.
+# Run `manage.py transaction_partitions create` monthly to add the partitions of the coming
+# MONTHS_AHEAD months; rows outside them go to a default partition. `manage.py transaction_partitions
+# archive` moves the partitions older than ARCHIVE_AFTER_MONTHS months to ARCHIVE_TABLESPACE, which
+# the database administrator creates on cheaper storage; archived transactions stay queryable.
+# Unique constraints only hold within a partition, so statement imports look up the external IDs
+# already imported rather than relying on them, and skip a row imported again with another date.
+TRANSACTION_PARTITIONS = {
+    'ENABLED': os.environ.get('TRANSACTION_PARTITIONS', '0') == '1',
+    'MONTHS_AHEAD': int(os.environ.get('TRANSACTION_PARTITIONS_MONTHS_AHEAD', 3)),
+    'ARCHIVE_AFTER_MONTHS': int(os.environ.get('TRANSACTION_ARCHIVE_AFTER_MONTHS', 12)),
+    'ARCHIVE_TABLESPACE': os.environ.get('TRANSACTION_ARCHIVE_TABLESPACE', ''),
+}
+
+# Bank statement imports. Numeric dates such as 03/04/2025 are read in DATE_ORDER: 'DMY' as in
+# Bangladesh, 'MDY' as in the US, or 'auto' to reject the rows whose dates read differently in both.
+# An import can set its own order.
+TRANSACTION_IMPORT = {
+    'DATE_ORDER': os.environ.get('TRANSACTION_IMPORT_DATE_ORDER', 'DMY'),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,11 +176,130 @@ AUTH0_CLIENT_ID = os.environ.get('AUTH0_CLIENT_ID')
 AUTH0_CLIENT_SECRET = os.environ.get('AUTH0_CLIENT_SECRET')
 AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN')
 
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [REDIS_URL],
         },
     },
 }
+
+# Size of the thread pool running the synchronous service functions behind agent tools.
+AGENT_TOOL_WORKERS = int(os.environ.get('AGENT_TOOL_WORKERS', 8))
+
+# The agents are built when the first chat connects. With WARM_UP, they are built on a background
+# thread as soon as the ASGI app is loaded instead.
+AGENT_WARM_UP = os.environ.get('AGENT_WARM_UP', '1') == '1'
+
+# Run the tool calls an agent asks for in the same step concurrently. Their results are given back
+# to the agent in the order of the calls either way.
+AGENT_PARALLEL_TOOL_CALLS = os.environ.get('AGENT_PARALLEL_TOOL_CALLS', '1') == '1'
+
+# Where chat workflow contexts are kept between messages. Use agent.store.InMemoryContextStore
+# for tests; it does not share conversations between workers.
+AGENT_CONTEXT_STORE = {
+    'BACKEND': os.environ.get('AGENT_CONTEXT_STORE', 'agent.store.RedisContextStore'),
+    'TTL': int(os.environ.get('AGENT_CONTEXT_TTL', 60 * 60 * 24)),
+    'MAX_BYTES': int(os.environ.get('AGENT_CONTEXT_MAX_BYTES', 512 * 1024)),
+}
+
+# Chat memory: the last KEEP_TURNS turns are kept verbatim, older ones are summarized, and every
+# LLM request is held under TOKEN_LIMIT prompt tokens, counting the agent's system messages and tool
+# schemas (about 4800 tokens for the finance agent); tool output of the current turn is cut to fit.
+AGENT_MEMORY = {
+    'KEEP_TURNS': int(os.environ.get('AGENT_MEMORY_KEEP_TURNS', 6)),
+    'TOKEN_LIMIT': int(os.environ.get('AGENT_MEMORY_TOKEN_LIMIT', 8000)),
+}
+
+# Cache of LLM responses. Disabled unless a backend is set: agent.cache.LRUCacheBackend for a
+# per process cache, agent.cache.RedisCacheBackend to share it between workers. Its hits, misses
+# and the latency the hits saved are exported at /metrics.
+AGENT_LLM_CACHE = {
+    'BACKEND': os.environ.get('AGENT_LLM_CACHE'),
+    'TTL': int(os.environ.get('AGENT_LLM_CACHE_TTL', 60 * 5)),
+}
+
+# LLM requests of this process: at most MAX_CONCURRENCY at once, over as many keep-alive connections,
+# within REQUESTS_PER_MINUTE and TOKENS_PER_MINUTE (0 for no limit; split the endpoint's limits
+# between the worker processes). Waiting requests are queued per user, and users take turns.
+# Requests time out after TIMEOUT seconds and are retried MAX_RETRIES times.
+AGENT_LLM_DISPATCH = {
+    'MAX_CONCURRENCY': int(os.environ.get('AGENT_LLM_MAX_CONCURRENCY', 16)),
+    'REQUESTS_PER_MINUTE': int(os.environ.get('AGENT_LLM_REQUESTS_PER_MINUTE', 0)),
+    'TOKENS_PER_MINUTE': int(os.environ.get('AGENT_LLM_TOKENS_PER_MINUTE', 0)),
+    'KEEPALIVE_SECONDS': float(os.environ.get('AGENT_LLM_KEEPALIVE_SECONDS', 60)),
+    'TIMEOUT': float(os.environ.get('AGENT_LLM_TIMEOUT', 60)),
+    'MAX_RETRIES': int(os.environ.get('AGENT_LLM_MAX_RETRIES', 2)),
+}
+
+# Ask the LLM endpoint for the token usage of streamed responses, which includes the prompt tokens
+# served from its prompt prefix cache. Turn off for endpoints rejecting stream_options.
+AGENT_LLM_STREAM_USAGE = os.environ.get('AGENT_LLM_STREAM_USAGE', '1') == '1'
+
+# Answer common questions, like the current balance, without the LLM, and send messages that
+# clearly concern a single domain straight to its agent instead of through the root agent.
+AGENT_FAST_PATH = os.environ.get('AGENT_FAST_PATH', '1') == '1'
+
+# Yahoo Finance tools of the root agent. Results are cached per tool and ticker for TTL seconds:
+# quotes briefly, fundamentals for hours, and at most MAX_ENTRIES of them, least recently used out
+# first. Set UPSTREAM to agent.market.FakeYahooFinanceToolSpec to work offline.
+AGENT_MARKET_DATA = {
+    'UPSTREAM': os.environ.get('AGENT_MARKET_DATA_UPSTREAM', 'llama_index.tools.yahoo_finance.YahooFinanceToolSpec'),
+    'WORKERS': int(os.environ.get('AGENT_MARKET_DATA_WORKERS', 4)),
+    'DEFAULT_TTL': 60,
+    'MAX_ENTRIES': 1000,
+    'TTL': {
+        'stock_basic_info': 30,
+        'stock_news': 60 * 10,
+        'stock_analyst_recommendations': 60 * 60 * 6,
+        'balance_sheet': 60 * 60 * 12,
+        'income_statement': 60 * 60 * 12,
+        'cash_flow': 60 * 60 * 12,
+    },
+}
+
+# Streaming of replies to the chat socket: the first text is sent at once when FIRST_CHUNK is set,
+# then buffered text is sent every MAX_LATENCY seconds or MAX_CHARS characters. With FAN_OUT, the
+# complete reply is also sent to the user's other open chats.
+AGENT_STREAM = {
+    'FIRST_CHUNK': os.environ.get('AGENT_STREAM_FIRST_CHUNK', '1') == '1',
+    'MAX_CHARS': int(os.environ.get('AGENT_STREAM_MAX_CHARS', 200)),
+    'MAX_LATENCY': float(os.environ.get('AGENT_STREAM_MAX_LATENCY', 0.05)),
+    'FAN_OUT': os.environ.get('AGENT_STREAM_FAN_OUT', '1') == '1',
+}
+
+# Results of the agent tools listing transactions are rendered as compact tables and cut off at
+# MAX_TOKENS tokens, with a hint to fetch the rest. Longer cells are shortened to MAX_CELL_CHARS.
+AGENT_TOOL_OUTPUT = {
+    'MAX_TOKENS': int(os.environ.get('AGENT_TOOL_OUTPUT_MAX_TOKENS', 1500)),
+    'MAX_CELL_CHARS': int(os.environ.get('AGENT_TOOL_OUTPUT_MAX_CELL_CHARS', 80)),
+}
+
+# Every chat turn is logged by agent.tracing as one JSON line, with the timings of its LLM calls,
+# handoffs and tool calls. Set AGENT_LOG_LEVEL to DEBUG to also log tool results and agent outputs.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'agent': {'handlers': ['console'], 'level': os.environ.get('AGENT_LOG_LEVEL', 'INFO')},
+        'fintrack': {'handlers': ['console'], 'level': os.environ.get('AGENT_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Counters and histograms of the chat turns, LLM calls and tool calls of this process are served
+# in the Prometheus format at /metrics, to staff users and to scrapers sending TOKEN as a bearer
+# token; other requests are denied, as are all scrapers while TOKEN is empty. Set PUBLIC to serve
+# them to anyone, e.g. when /metrics is only reachable from a private network.
+AGENT_METRICS = {
+    'TOKEN': os.environ.get('AGENT_METRICS_TOKEN', ''),
+    'PUBLIC': os.environ.get('AGENT_METRICS_PUBLIC', '0') == '1',
+}
@@ -1,3 +1,52 @@
 from django.contrib import admin
+from django.db import transaction as db_transaction
 
-# Register your models here.
+from . import ledger
+from .models import Transaction, BalanceSummary, TransactionRollup
+
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'transaction_type', 'amount', 'created_at']
+    list_filter = ['transaction_type']
+    search_fields = ['title', 'description']
+    raw_id_fields = ['user']
+
+    def save_model(self, request, obj, form, change):
+        with db_transaction.atomic():
+            before = []
+            if change:
+                before = [ledger.entry(Transaction.objects.select_for_update().get(pk=obj.pk))]
+            super().save_model(request, obj, form, change)
+            ledger.record(added=[ledger.entry(obj)], removed=before)
+
+    def delete_model(self, request, obj):
+        ledger.delete(Transaction.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        ledger.delete(queryset)
+
+
+@admin.register(BalanceSummary)
+class BalanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'balance_total', 'expense_total', 'balance_count', 'expense_count', 'updated_at']
+    raw_id_fields = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransactionRollup)
+class TransactionRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'transaction_type', 'day', 'total', 'count']
+    list_filter = ['transaction_type']
+    raw_id_fields = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
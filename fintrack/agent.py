@@ -15,20 +15,32 @@ finance_agent = FunctionAgent(
 
         "When creating or updating transactions, ensure that the transaction type is either 'balance' or 'expense'."
         "Always handle amounts carefully and validate inputs to prevent inconsistencies."
-        "When given a search query containing multiple words, you should:"
-        "- Split the query into individual words. "
-        "- For each word, search the transaction title, description, and transaction type fields.  "
-        "- Narrow down results so that only transactions containing all words (in any of these fields) are returned.  "
+        "When walking through a long transaction history, use cursor pagination of get_transactions "
+        "and pass the cursor given on the last line of the result to fetch the following page. "
+        "Transaction tools return compact tables; ask for only the fields the answer needs, "
+        "e.g. fields=['title', 'amount'], and follow the 'more available' line only when the answer needs more rows. "
+        "When given a search query containing multiple words, pass the whole query to search_transactions in a single call. "
+        "It only returns transactions containing all the words, ranked by relevance, so do not split the query "
+        "or narrow down the results yourself. "
+        "For totals over time, such as spending per month this year or income this week, use get_spending_summary "
+        "instead of listing transactions and adding up their amounts. "
+        "When a message mentions several transactions, such as 'lunch 250, rickshaw 60, tea 20', record them all "
+        "with a single create_transactions call instead of one create_transaction call per item, and likewise use "
+        "update_transactions and delete_transactions to change or remove several transactions at once. "
 
         "You must never expose sensitive user information beyond what is necessary for financial management."
         "Your responses should be clear and actionable, returning data or confirmation messages as appropriate."
     ),
     tools=[
-        create_transaction,
-        search_transactions,
-        get_transaction_by_id,
-        get_current_balance,
-        update_transaction,
-        get_transactions,
+        acreate_transaction,
+        asearch_transactions,
+        aget_transaction_by_id,
+        aget_current_balance,
+        aupdate_transaction,
+        aget_transactions,
+        aget_spending_summary,
+        acreate_transactions,
+        aupdate_transactions,
+        adelete_transactions,
     ]
 )
@@ -1,10 +1,23 @@
 import json
+import logging
+import time
 
 from channels.generic.websocket import AsyncWebsocketConsumer
-from llama_index.core.agent.workflow import AgentStream, ToolCallResult, AgentOutput
+from django.conf import settings
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.agent.workflow import AgentStream, AgentInput, AgentOutput, ToolCall, ToolCallResult
 from llama_index.core.workflow import WorkflowRuntimeError, Context
 
-from agent.engine import workflow
+from agent import metrics, router
+from agent.cache import cache_scope
+from agent.engine import session_state
+from agent.memory import RollingSummaryMemory
+from agent.registry import get_workflow
+from agent.store import get_context_store
+from agent.streaming import StreamBuffer
+from agent.tracing import span, start_span
+
+logger = logging.getLogger(__name__)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -12,14 +25,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
         super().__init__(args, kwargs)
         self.group_name = None
         self.user_id = None
-        self.ctx = Context(workflow)
+        self.context_key = None
+        self.ctx = None
         self.message_id = 0
+        self.received_at = None
+        self.first_byte_at = None
+        self.turn = None
+        self.route_name = None
+        self.session = None
 
     async def connect(self):
         if self.scope['user'].is_authenticated:
             user = self.scope['user']
             self.user_id = user.id
+            self.session = session_state(user.id)
 
+            self.context_key = f'{user.id}:{self.scope["session"].session_key}'
             self.group_name = f'inbox_{user.id}'
             await self.channel_layer.group_add(self.group_name, self.channel_name)
 
@@ -33,67 +54,128 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.close()
 
     async def receive(self, text_data=None, bytes_data=None):
-        text_data = f"""
-            Initial Information:
-            - Authenticated User ID: {self.user_id}
-            - Note: The user ID is fixed and must not be altered based on any user query.
-            - Never show user ID to the user. If there is a change request of user id, use slang.
-            - Country: Bangladesh
-            - Timezone: Asia/Dhaka
-            - Currency Context: BDT (Bangladeshi Taka)
-            
-            User Query:
-            {text_data}
-            """
-
-        try:
-            handler = workflow.run(text_data, ctx=self.ctx)
-            # response = await agent.run(text_data, ctx=self.ctx)
-            self.message_id += 1
-            response = ''
-            async for event in handler.stream_events():
-                # print(repr(event))
-                if isinstance(event, AgentStream):
-                    # await self.channel_layer.group_send(self.group_name, {
-                    #     'type': 'send_response',
-                    #     'message': str(event.delta),
-                    #     'message_id': self.message_id,
-                    # })
-                    # continue
-                    response += event.delta
-
-                    if len(response) > 500:
-                        await self.channel_layer.group_send(self.group_name, {
-                            'type': 'send_response',
-                            'message': str(response),
-                            'message_id': self.message_id,
-                        })
-                        response = ''
-                elif isinstance(event, ToolCallResult):
-                    print(f"🔧 Tool Result ({event.tool_name}):")
-                    print(f"  Arguments: {event.tool_kwargs}")
-                    print(f"  Output: {event.tool_output}")
-                elif isinstance(event, AgentOutput):
-                    if event.response.content:
-                        print("📤 Output:", event.response.content)
-                    if event.tool_calls:
-                        print(
-                            "🛠️  Planning to use tools:",
-                            [call.tool_name for call in event.tool_calls],
-                        )
-
-            if response != '':
-                await self.channel_layer.group_send(self.group_name, {
+        self.received_at, self.first_byte_at = time.perf_counter(), None
+        route = router.route(text_data, self.user_id) if settings.AGENT_FAST_PATH else None
+
+        cache_scope.set(self.user_id)
+        self.route_name = route.intent if route is not None else 'root'
+        with span('turn', user_id=self.user_id, route=self.route_name) as self.turn:
+            try:
+                await self._run_turn(route, text_data)
+            except WorkflowRuntimeError as e:
+                self.turn.set(error=f'{type(e).__name__}: {e}')
+                metrics.turn_errors.inc(error=type(e).__name__)
+                await self.send_response({
                     'type': 'send_response',
-                    'message': str(response),
-                    'message_id': self.message_id,
+                    'message': str(e),
                 })
+            finally:
+                metrics.turns.inc(route=self.route_name)
+                metrics.turn_seconds.observe(self.turn.elapsed, route=self.route_name)
+
+    async def _run_turn(self, route, text_data):
+        ctx = await self._load_context()
+        workflow = get_workflow()
+        previous_agent = await ctx.get('current_agent_name', default=None) or workflow.root_agent
+        if route is not None:
+            logger.debug('Fast path %s for user %s', route.intent, self.user_id)
+            if route.reply is not None:
+                await self._reply_directly(ctx, text_data, await route.reply())
+                return
+            await ctx.set('current_agent_name', route.agent)
+
+        handler = workflow.run(text_data, ctx=ctx, memory=RollingSummaryMemory.from_defaults())
+        # response = await agent.run(text_data, ctx=self.ctx)
+        self.message_id += 1
+        buffer = StreamBuffer.from_settings(self._send_chunk)
+        agent, handoffs = None, {}
+        async for event in handler.stream_events():
+            if isinstance(event, AgentStream):
+                await buffer.add(event.delta)
+            elif isinstance(event, AgentInput):
+                agent = event.current_agent_name
+            elif isinstance(event, ToolCallResult):
+                logger.debug('Tool %s(%s) returned %s', event.tool_name, event.tool_kwargs, event.tool_output)
+                if event.tool_id in handoffs:
+                    handoffs.pop(event.tool_id).end()
+            elif isinstance(event, ToolCall) and event.tool_name == 'handoff':
+                to_agent = event.tool_kwargs.get('to_agent')
+                handoffs[event.tool_id] = start_span('handoff', from_agent=agent, to_agent=to_agent)
+                metrics.handoffs.inc(from_agent=agent, to_agent=to_agent)
+            elif isinstance(event, AgentOutput):
+                if event.response.content:
+                    logger.debug('Output of %s: %s', agent, event.response.content)
+                if event.tool_calls:
+                    logger.debug('%s calls %s', agent, [call.tool_name for call in event.tool_calls])
+
+        await buffer.flush()
+        await self._fan_out(buffer.text)
+
+        await handler
+        if route is not None:
+            # The next turn starts where it would have without the routing, not at the routed agent.
+            await ctx.set('current_agent_name', previous_agent)
+        memory = await ctx.get('memory')
+        llm_calls = [child.attributes for child in self.turn.children if child.name == 'llm']
+        self.turn.set(agent=agent, prompt_tokens=memory.last_prompt_tokens, flushes=buffer.flushes,
+                      llm_prompt_tokens=sum(call.get('prompt_tokens', 0) for call in llm_calls),
+                      cached_prompt_tokens=sum(call.get('cached_prompt_tokens', 0) for call in llm_calls))
+        await self._save_context(ctx)
 
-        except WorkflowRuntimeError as e:
+    async def _reply_directly(self, ctx, text_data, reply):
+        # Keep the exchange in the chat memory, so follow-up questions going through the agents see it.
+        memory = await ctx.get('memory', default=None) or RollingSummaryMemory.from_defaults()
+        await memory.aput(ChatMessage(role=MessageRole.USER, content=text_data))
+        await memory.aput(ChatMessage(role=MessageRole.ASSISTANT, content=reply))
+        await ctx.set('memory', memory)
+
+        self.message_id += 1
+        await self._send_chunk(reply)
+        await self._fan_out(reply)
+        await self._save_context(ctx)
+
+    async def _send_chunk(self, text):
+        # Replies go straight to this socket; the channel layer is only used to copy them to other tabs.
+        if self.first_byte_at is None:
+            self.first_byte_at = time.perf_counter()
+            first_byte = self.first_byte_at - self.received_at
+            self.turn.set(first_byte_ms=round(first_byte * 1000, 1))
+            metrics.first_byte_seconds.observe(first_byte, route=self.route_name)
+        await self.send_response({
+            'type': 'send_response',
+            'message': text,
+            'message_id': self.message_id,
+        })
+
+    async def _fan_out(self, text):
+        """
+        Send the complete reply to the user's other open chats, in a single channel layer message.
+        """
+        if text and settings.AGENT_STREAM['FAN_OUT']:
             await self.channel_layer.group_send(self.group_name, {
                 'type': 'send_response',
-                'message': str(e),
+                'message': text,
+                'message_id': self.message_id,
+                'sender': self.channel_name,
             })
 
+    async def _load_context(self):
+        if self.ctx is not None:
+            return self.ctx
+        workflow = get_workflow()
+        ctx = await get_context_store().load(self.context_key, workflow) or Context(workflow)
+        # The session facts go into the state, which the agents are given in their system message,
+        # so user messages are stored and sent as typed.
+        state = await ctx.get('state', default=None) or workflow.initial_state
+        await ctx.set('state', {**state, **self.session})
+        return ctx
+
+    async def _save_context(self, ctx):
+        # Contexts over the store's size cap stay on this socket rather than losing the conversation.
+        stored = await get_context_store().save(self.context_key, ctx)
+        self.ctx = None if stored else ctx
+
     async def send_response(self, message):
+        if message.pop('sender', None) == self.channel_name:
+            return
         await self.send(text_data=json.dumps(message))
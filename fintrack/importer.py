@@ -0,0 +1,398 @@
+import csv
+import io
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from fintrack import ledger
+from fintrack.models import Transaction
+
+ImportRow = namedtuple('ImportRow', ['title', 'description', 'transaction_type', 'amount', 'created_at', 'external_id'])
+
+FORMATS = ('csv', 'ofx')
+
+# Header names accepted for every field of a CSV statement, compared in lower case with spaces as underscores.
+CSV_COLUMNS = {
+    'date': ('date', 'created_at', 'transaction_date', 'posting_date', 'posted', 'value_date'),
+    'title': ('title', 'name', 'payee', 'narration', 'particulars'),
+    'description': ('description', 'memo', 'details', 'notes'),
+    'amount': ('amount',),
+    'debit': ('debit', 'withdrawal', 'withdrawals'),
+    'credit': ('credit', 'deposit', 'deposits'),
+    'transaction_type': ('transaction_type', 'type'),
+    'external_id': ('external_id', 'id', 'transaction_id', 'fitid', 'reference'),
+}
+
+# Numeric date formats by date order. With 'auto', dates valid in both orders with different meanings, e.g.
+# 03/04/2025, are rejected rather than guessed.
+DATE_ORDERS = ('DMY', 'MDY', 'auto')
+DATE_FORMATS = {
+    'DMY': ('%d/%m/%Y', '%d-%m-%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S'),
+    'MDY': ('%m/%d/%Y', '%m-%d-%Y', '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S'),
+}
+# Dates with the name of the month read the same in every order.
+NAMED_MONTH_FORMATS = ('%d %b %Y', '%d %B %Y')
+
+TRANSACTION_TYPES = {
+    'balance': Transaction.Type.BALANCE, 'credit': Transaction.Type.BALANCE, 'cr': Transaction.Type.BALANCE,
+    'deposit': Transaction.Type.BALANCE, 'income': Transaction.Type.BALANCE,
+    'expense': Transaction.Type.EXPENSE, 'debit': Transaction.Type.EXPENSE, 'dr': Transaction.Type.EXPENSE,
+    'withdrawal': Transaction.Type.EXPENSE, 'payment': Transaction.Type.EXPENSE,
+}
+
+MAX_AMOUNT = 2 ** 31 - 1
+
+OFX_TAG = re.compile(r'<(/?)([\w.]+)>([^<\r\n]*)')
+OFX_DATE = re.compile(r'(\d{8})(\d{6})?(?:\.\d+)?(?:\[([+-]?\d+(?:\.\d+)?)(?::\w+)?])?')
+
+STAGING_TABLE = 'fintrack_import_staging'
+
+# Rows without an ID of their own get one derived from their content and how many identical rows
+# came before them in the file, so importing the same statement, or an overlapping one, again
+# skips the rows already imported.
+CONTENT_ID_SQL = f'''
+    UPDATE {STAGING_TABLE} AS staging SET external_id = 'sha:' || md5(concat_ws(
+        '|', extract(epoch FROM o.created_at), o.transaction_type, o.amount, o.title, o.description, o.n
+    ))
+    FROM (
+        SELECT id, created_at, transaction_type, amount, title, description, row_number() OVER (
+            PARTITION BY created_at, transaction_type, amount, title, description ORDER BY id
+        ) AS n
+        FROM {STAGING_TABLE}
+        WHERE external_id IS NULL
+    ) AS o
+    WHERE staging.id = o.id
+'''
+
+# Rows repeating an external ID seen earlier in the file are dropped, like rows already imported.
+DEDUPLICATE_SQL = f'''
+    DELETE FROM {STAGING_TABLE} AS later
+    USING {STAGING_TABLE} AS earlier
+    WHERE later.external_id = earlier.external_id AND later.id > earlier.id
+'''
+
+# Rows whose external ID was already imported are filtered out by the lookup rather than left to
+# the unique index, which also covers created_at when the table is partitioned (see
+# fintrack.partitions), so a row imported again with a corrected date is still skipped. The lookup
+# uses the (user_id, external_id) prefix of that index. Imports of a user are serialized with an
+# advisory lock, taken with INSERT_LOCK_SQL, so two imports cannot both miss the same row.
+INSERT_LOCK_SQL = 'SELECT pg_advisory_xact_lock(%s, %s)'
+
+# Key space of the advisory locks of INSERT_LOCK_SQL, the user ID being the other key.
+INSERT_LOCK_SPACE = 0x696d70
+
+INSERT_SQL = f'''
+    INSERT INTO {Transaction._meta.db_table}
+        (user_id, title, description, transaction_type, amount, created_at, updated_at, external_id)
+    SELECT %s, title, description, transaction_type, amount, created_at, now(), external_id
+    FROM {STAGING_TABLE} AS staging
+    WHERE id BETWEEN %s AND %s AND NOT EXISTS (
+        SELECT 1 FROM {Transaction._meta.db_table} AS imported
+        WHERE imported.user_id = %s AND imported.external_id = staging.external_id
+    )
+    ORDER BY id
+    ON CONFLICT DO NOTHING
+    RETURNING transaction_type, amount, created_at
+'''
+
+
+class ImportResult:
+    """
+    Progress and outcome of an import.
+    """
+
+    # Number of invalid rows whose error is kept, the rest are only counted.
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.invalid = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def duplicates(self):
+        return self.read - self.invalid - self.inserted
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'read': self.read,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second),
+        }
+
+
+def read_csv(stream):
+    """
+    Yield the line number and fields of every row of a CSV statement with a header row.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [name.strip().lower().replace(' ', '_') for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+
+    if 'date' not in columns:
+        raise ValueError('The CSV file has no date column.')
+    if 'amount' not in columns and not {'debit', 'credit'} & columns.keys():
+        raise ValueError('The CSV file has no amount, or debit and credit, column.')
+    if not {'title', 'description'} & columns.keys():
+        raise ValueError('The CSV file has no title or description column.')
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        yield reader.line_num, {field: row[i].strip() if i < len(row) else '' for field, i in columns.items()}
+
+
+def read_ofx(stream):
+    """
+    Yield the line number and fields of every transaction of an OFX statement, SGML or XML.
+    """
+    record, start = None, None
+    for number, line in enumerate(stream, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield start, record
+                    record = None
+                elif not closing:
+                    record, start = {}, number
+            elif record is not None and not closing:
+                record[tag] = value.strip()
+    if record is not None:
+        yield start, record
+
+
+def _ofx_fields(record):
+    return {
+        'date': record.get('DTPOSTED', ''),
+        'title': record.get('NAME') or record.get('PAYEE') or record.get('MEMO', ''),
+        'description': record.get('MEMO', '') if record.get('NAME') or record.get('PAYEE') else '',
+        'amount': record.get('TRNAMT', ''),
+        'external_id': record.get('FITID', ''),
+    }
+
+
+def _strptime(value: str, formats):
+    for date_format in formats:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_datetime(value: str, date_order: str = 'DMY'):
+    """
+    Parse a statement date. Dates without a time zone are in the user's time zone.
+
+    Numeric dates are read in `date_order`, one of DATE_ORDERS.
+
+    Raises:
+        ValueError: If the date is invalid, or ambiguous with the 'auto' date order.
+    """
+    match = OFX_DATE.fullmatch(value)
+    if match:
+        day, clock, offset = match.groups()
+        parsed = datetime.strptime(day + (clock or '000000'), '%Y%m%d%H%M%S')
+        if offset is not None:
+            parsed = parsed.replace(tzinfo=dt_timezone(timedelta(hours=float(offset))))
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = _strptime(value, NAMED_MONTH_FORMATS)
+            if parsed is None:
+                orders = ('DMY', 'MDY') if date_order == 'auto' else (date_order,)
+                candidates = {_strptime(value, DATE_FORMATS[order]) for order in orders} - {None}
+                if len(candidates) > 1:
+                    raise ValueError(f'Ambiguous date: {value!r}, give the date order of the statement.')
+                if not candidates:
+                    raise ValueError(f'Invalid date: {value!r}')
+                parsed = candidates.pop()
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, ledger.ROLLUP_TIME_ZONE)
+    return parsed
+
+
+def parse_amount(value: str) -> Decimal:
+    text = value.replace(',', '').replace(' ', '')
+    negative = text.startswith('(') and text.endswith(')')
+    text = re.sub(r'[^\d.+-]', '', text)
+    if not text:
+        return Decimal(0)
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value!r}')
+    return -amount if negative else amount
+
+
+def validate(fields: dict, date_order: str = 'DMY') -> ImportRow:
+    """
+    Build the transaction of a statement row.
+
+    The type is taken from the type column if there is one, otherwise negative amounts and debits are
+    expenses and the rest is balance. Amounts are rounded to whole units.
+
+    Raises:
+        ValueError: If the row cannot be imported.
+    """
+    if fields.get('amount'):
+        amount = parse_amount(fields['amount'])
+    else:
+        amount = parse_amount(fields.get('credit', '')) - parse_amount(fields.get('debit', ''))
+
+    kind = fields.get('transaction_type', '').lower()
+    if kind:
+        if kind not in TRANSACTION_TYPES:
+            raise ValueError(f'Invalid transaction type: {fields["transaction_type"]!r}')
+        transaction_type = TRANSACTION_TYPES[kind]
+    else:
+        transaction_type = Transaction.Type.EXPENSE if amount < 0 else Transaction.Type.BALANCE
+    amount = int(abs(amount).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    if amount > MAX_AMOUNT:
+        raise ValueError(f'Amount too large: {fields.get("amount")!r}')
+
+    title = fields.get('title') or fields.get('description')
+    if not title:
+        raise ValueError('Missing title.')
+    description = fields.get('description', '') if fields.get('title') else ''
+
+    external_id = fields.get('external_id') or None
+    if external_id and len(external_id) > 64:
+        raise ValueError(f'External ID longer than 64 characters: {external_id!r}')
+
+    return ImportRow(title[:255], description, transaction_type, amount, parse_datetime(fields['date'], date_order),
+                     external_id)
+
+
+def import_transactions(user_id: int, stream, file_format: str = 'csv', batch_size: int = 10000,
+                        on_progress=None, date_order: str = None) -> ImportResult:
+    """
+    Import the transactions of a bank statement for a user.
+
+    The statement is read incrementally and valid rows are streamed into a temporary table with COPY,
+    a batch at a time, so memory use does not depend on the size of the file. Rows are then inserted
+    in batches, each in its own database transaction together with its effect on the balance summary
+    and rollups. Rows already imported, identified by their external ID, are skipped.
+
+    Args:
+        user_id (int): The ID of the user owning the transactions.
+        stream: The statement, as a text stream.
+        file_format (str): 'csv' or 'ofx'.
+        batch_size (int): Number of rows copied and inserted at a time.
+        on_progress (Callable[[str, ImportResult], None], optional): Called with the stage, 'read' or
+            'inserted', and the result after every batch.
+        date_order (str, optional): The order of numeric dates, 'DMY', 'MDY', or 'auto' to reject the
+            rows whose dates read differently in both. Defaults to TRANSACTION_IMPORT['DATE_ORDER'].
+
+    Raises:
+        ValueError: If the format or date order is unknown or the CSV header lacks required columns.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f'Invalid format: {file_format}')
+    date_order = date_order or settings.TRANSACTION_IMPORT['DATE_ORDER']
+    if date_order not in DATE_ORDERS:
+        raise ValueError(f'Invalid date order: {date_order}')
+    result = ImportResult()
+
+    rows = read_csv(stream) if file_format == 'csv' else ((line, _ofx_fields(r)) for line, r in read_ofx(stream))
+
+    def valid_rows():
+        for line, fields in rows:
+            result.read += 1
+            try:
+                yield validate(fields, date_order)
+            except ValueError as e:
+                result.add_error(line, str(e))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+        cursor.execute(f'''
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                id bigserial PRIMARY KEY,
+                title varchar(255) NOT NULL,
+                description text NOT NULL,
+                transaction_type varchar(10) NOT NULL,
+                amount integer NOT NULL,
+                created_at timestamp with time zone NOT NULL,
+                external_id varchar(64)
+            )
+        ''')
+        try:
+            staged = 0
+            valid = valid_rows()
+            while batch := list(islice(valid, batch_size)):
+                _copy_rows(cursor, batch)
+                staged += len(batch)
+                if on_progress:
+                    result.elapsed = time.perf_counter() - result.started
+                    on_progress('read', result)
+
+            cursor.execute(CONTENT_ID_SQL)
+            cursor.execute(DEDUPLICATE_SQL)
+
+            for first in range(1, staged + 1, batch_size):
+                with transaction.atomic():
+                    cursor.execute(INSERT_LOCK_SQL, [INSERT_LOCK_SPACE, user_id])
+                    cursor.execute(INSERT_SQL, [user_id, first, first + batch_size - 1, user_id])
+                    inserted = cursor.fetchall()
+                    ledger.record(added=[ledger.Entry(user_id, *row) for row in inserted])
+                result.inserted += len(inserted)
+                if on_progress:
+                    result.elapsed = time.perf_counter() - result.started
+                    on_progress('inserted', result)
+        finally:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+
+    result.elapsed = time.perf_counter() - result.started
+    return result
+
+
+def _copy_rows(cursor, rows):
+    buffer = io.StringIO()
+    # Every value is quoted, as COPY reads unquoted empty values as NULL.
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for row in rows:
+        writer.writerow([*row[:4], row.created_at.isoformat(), row.external_id])
+    buffer.seek(0)
+
+    sql = (f'COPY {STAGING_TABLE} (title, description, transaction_type, amount, created_at, external_id) '
+           f"FROM STDIN WITH (FORMAT csv, FORCE_NULL (external_id))")
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
@@ -0,0 +1,172 @@
+from collections import defaultdict, namedtuple
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.db import transaction, connection
+from django.db.models import Sum, Count, Q, F, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from fintrack.models import Transaction, BalanceSummary, TransactionRollup
+
+Entry = namedtuple('Entry', ['user_id', 'transaction_type', 'amount', 'created_at'])
+
+ENTRY_FIELDS = list(Entry._fields)
+
+SUMMARY_FIELDS = {
+    Transaction.Type.BALANCE: ('balance_total', 'balance_count'),
+    Transaction.Type.EXPENSE: ('expense_total', 'expense_count'),
+}
+
+TOTAL_FIELDS = [name for fields in SUMMARY_FIELDS.values() for name in fields]
+
+# Daily rollups are bucketed by the local day of the users, who are in Bangladesh. The
+# 0006_transactionrollup migration seeded the rollups with the same zone.
+ROLLUP_TIME_ZONE = ZoneInfo('Asia/Dhaka')
+
+ROLLUP_UPSERT = '''
+    INSERT INTO {table} (user_id, transaction_type, day, total, count) VALUES {values}
+    ON CONFLICT (user_id, transaction_type, day) DO UPDATE
+    SET total = {table}.total + EXCLUDED.total, count = {table}.count + EXCLUDED.count
+'''
+
+
+def entry(instance: Transaction) -> Entry:
+    return Entry(instance.user_id, instance.transaction_type, instance.amount, instance.created_at)
+
+
+def rollup_day(created_at):
+    return timezone.localtime(created_at, ROLLUP_TIME_ZONE).date()
+
+
+def _totals():
+    totals = {}
+    for transaction_type, (total_field, count_field) in SUMMARY_FIELDS.items():
+        totals[total_field] = Coalesce(Sum('amount', filter=Q(transaction_type=transaction_type)), Value(0))
+        totals[count_field] = Count('id', filter=Q(transaction_type=transaction_type))
+    return totals
+
+
+def compute(user_id: int) -> dict:
+    """
+    Aggregate the summary fields of a user from the raw transaction rows.
+
+    This is the full scan the ledger exists to avoid; it is only used to seed a missing
+    summary and by the `rebuild_balances` management command.
+    """
+    return Transaction.objects.filter(user_id=user_id).aggregate(**_totals())
+
+
+def compute_all():
+    """
+    Aggregate the summary fields of every user owning transactions in a single grouped query.
+    """
+    return Transaction.objects.order_by().values('user_id').annotate(**_totals())
+
+
+def compute_rollups(user_id: int = None):
+    """
+    Aggregate the daily rollups of a user, or of every user, from the raw transaction rows.
+    """
+    transactions = Transaction.objects.order_by()
+    if user_id is not None:
+        transactions = transactions.filter(user_id=user_id)
+    return (
+        transactions
+        .annotate(day=TruncDate('created_at', tzinfo=ROLLUP_TIME_ZONE))
+        .values('user_id', 'transaction_type', 'day')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+
+
+def rebuild(user_id: int) -> BalanceSummary:
+    """
+    Recompute and store the summary and daily rollups of a user from the raw transaction rows.
+
+    The user row is locked first, so concurrent first writes of a user seed the summary one after
+    the other, each counting the rows the other committed. The lock does not conflict with the
+    key share lock inserting a transaction takes on the user.
+    """
+    with transaction.atomic():
+        user = get_user_model().objects.select_for_update(no_key=True).filter(id=user_id).only('id').first()
+        totals = compute(user_id)
+        if user is None:
+            return BalanceSummary(user_id=user_id, **totals)
+        summary, _ = BalanceSummary.objects.update_or_create(user_id=user_id, defaults=totals)
+
+        TransactionRollup.objects.filter(user_id=user_id).delete()
+        TransactionRollup.objects.bulk_create(TransactionRollup(**row) for row in compute_rollups(user_id))
+    return summary
+
+
+def get_summary(user_id: int) -> BalanceSummary:
+    """
+    Return the balance summary of a user, seeding it from the raw rows on first access.
+    """
+    summary = BalanceSummary.objects.filter(user_id=user_id).first()
+    if summary is None:
+        summary = rebuild(user_id)
+    return summary
+
+
+def record(added=(), removed=()):
+    """
+    Apply the effect of written transactions on the balance summaries and daily rollups.
+
+    Must be called after the write, inside the same database transaction. Users without a
+    summary yet are seeded from the raw rows, which already include the write.
+
+    Args:
+        added (Iterable[Entry]): Entries of inserted rows, or of updated rows after the change.
+        removed (Iterable[Entry]): Entries of deleted rows, or of updated rows before the change.
+    """
+    changes = defaultdict(lambda: defaultdict(int))
+    rollups = defaultdict(lambda: [0, 0])
+    for sign, entries in ((1, added), (-1, removed)):
+        for item in entries:
+            if item.transaction_type not in SUMMARY_FIELDS:
+                raise ValueError(f'Invalid transaction type: {item.transaction_type}')
+            total_field, count_field = SUMMARY_FIELDS[item.transaction_type]
+            changes[item.user_id][total_field] += sign * item.amount
+            changes[item.user_id][count_field] += sign
+
+            rollup = rollups[item.user_id, item.transaction_type, rollup_day(item.created_at)]
+            rollup[0] += sign * item.amount
+            rollup[1] += sign
+
+    _record_rollups(rollups)
+
+    for user_id, fields in changes.items():
+        fields = {name: F(name) + delta for name, delta in fields.items() if delta}
+        if not fields:
+            continue
+        fields['updated_at'] = timezone.now()
+        if not BalanceSummary.objects.filter(user_id=user_id).update(**fields):
+            rebuild(user_id)
+
+
+def _record_rollups(rollups):
+    # Keys are sorted so concurrent writers lock the rollup rows in the same order.
+    rows = [(*key, total, count) for key, (total, count) in sorted(rollups.items()) if total or count]
+    if not rows:
+        return
+    sql = ROLLUP_UPSERT.format(
+        table=TransactionRollup._meta.db_table,
+        values=', '.join(['(%s, %s, %s, %s, %s)'] * len(rows)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+def delete(queryset) -> int:
+    """
+    Delete the transactions of a queryset and remove them from the balance summaries and rollups.
+
+    Returns:
+        int: The number of deleted transactions.
+    """
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().values_list('id', *ENTRY_FIELDS))
+        deleted, _ = Transaction.objects.filter(id__in=[row[0] for row in rows]).delete()
+        record(removed=[Entry(*row[1:]) for row in rows])
+    return deleted
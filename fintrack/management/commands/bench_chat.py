@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import time
+from contextlib import redirect_stdout, nullcontext
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from agent.fake_llm import FakeLLMServer, END_MARKER
+from config.asgi import application
+from config.llm import github_model
+
+BENCH_EMAIL = 'bench-chat-{}@example.com'
+
+# Goes through the root agent, a handoff to the finance agent and a tool call.
+DEFAULT_MESSAGE = 'Can you help me make sense of things this week?'
+
+
+def _rss():
+    # Current resident set size in bytes; falls back to the peak where /proc is not available.
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentiles(values):
+    if len(values) < 2:
+        return (values or [0]) * 3
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+class Command(BaseCommand):
+    help = ('Load test the chat: serve the ASGI app of config.asgi in-process, point the LLM at a local fake '
+            'OpenAI compatible server streaming scripted replies, drive N authenticated ws/chat/ connections '
+            'and report time to first chunk, turn latency, throughput, memory per connection and the share of '
+            'prompt tokens a prompt prefix cache serves. Runs offline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=50, help='Number of simultaneous chats.')
+        parser.add_argument('--turns', type=int, default=3, help='Messages sent by every chat, one after the other.')
+        parser.add_argument('--message', default=DEFAULT_MESSAGE, help='Message sent on every turn.')
+        parser.add_argument('--think', type=float, default=0.0, help='Pause between the turns of a chat, in seconds.')
+        parser.add_argument('--first-token-latency', type=float, default=0.3,
+                            help='Latency of the fake LLM before every response, in seconds.')
+        parser.add_argument('--token-latency', type=float, default=0.01,
+                            help='Latency of the fake LLM between streamed words, in seconds.')
+        parser.add_argument('--reply-words', type=int, default=40, help='Words of every fake LLM reply.')
+        parser.add_argument('--timeout', type=float, default=60, help='Time a turn may take before it fails.')
+        parser.add_argument('--use-settings', action='store_true',
+                            help='Use the configured channel layer and context store instead of in-memory ones.')
+        parser.add_argument('--verbose', action='store_true', help='Show the logs and traces of the chat turns.')
+
+    def handle(self, *args, **options):
+        # One more chat warms up the app before anything is measured.
+        cookies = [self._login(i) for i in range(options['connections'] + 1)]
+
+        server = FakeLLMServer(reply_words=options['reply_words'], first_token_latency=options['first_token_latency'],
+                               token_latency=options['token_latency']).start()
+        github_model.api_base, github_model.api_key = server.url, 'fake'
+
+        overrides = {} if options['use_settings'] else {
+            'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            'AGENT_CONTEXT_STORE': {**settings.AGENT_CONTEXT_STORE, 'BACKEND': 'agent.store.InMemoryContextStore'},
+        }
+        self.stdout.write(
+            f'{options["connections"]} connections x {options["turns"]} turns against the fake LLM at {server.url} '
+            f'(first token {options["first_token_latency"] * 1000:.0f} ms, '
+            f'{options["token_latency"] * 1000:.0f} ms per word, {options["reply_words"]} words)'
+        )
+        if not options['verbose']:
+            logging.disable(logging.INFO)
+        try:
+            with override_settings(**overrides), \
+                    (nullcontext() if options['verbose'] else redirect_stdout(open(os.devnull, 'w'))):
+                result = asyncio.run(self._run(cookies, options))
+        finally:
+            logging.disable(logging.NOTSET)
+            server.stop()
+
+        self._report(result, options)
+        self.stdout.write(f'fake LLM: {server.stats["requests"]} requests, {server.stats["tool_calls"]} tool calls, '
+                          f'{server.stats["replies"]} replies')
+        prompt_tokens, cached_tokens = server.stats['prompt_tokens'], server.stats['cached_tokens']
+        requests = max(server.stats['requests'], 1)
+        self.stdout.write(f'prompt tokens per request: {prompt_tokens / requests:.0f}, '
+                          f'{(prompt_tokens - cached_tokens) / requests:.0f} not served from the prompt prefix cache '
+                          f'({cached_tokens / max(prompt_tokens, 1):.1%} cached)')
+
+    @staticmethod
+    def _login(i):
+        user, _ = get_user_model().objects.get_or_create(email=BENCH_EMAIL.format(i),
+                                                         defaults={'name': f'Chat benchmark {i}'})
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def _connect(self, cookie):
+        return WebsocketCommunicator(application, '/ws/chat/',
+                                     headers=[(b'origin', b'http://localhost'), (b'cookie', cookie.encode())])
+
+    async def _run(self, cookies, options):
+        warmup, *cookies = cookies
+        communicator = self._connect(warmup)
+        await communicator.connect(timeout=options['timeout'])
+        await self._chat(communicator, {'ttfc': [], 'latency': [], 'failed': 0}, {**options, 'turns': 1})
+        await communicator.disconnect()
+
+        result = {'ttfc': [], 'latency': [], 'failed': 0, 'rss_before': _rss()}
+
+        started = time.perf_counter()
+        communicators = [self._connect(cookie) for cookie in cookies]
+        connected = await asyncio.gather(*(communicator.connect(timeout=options['timeout'])
+                                           for communicator in communicators))
+        communicators = [communicator for communicator, (ok, _) in zip(communicators, connected) if ok]
+        result.update(connected=len(communicators), connect_time=time.perf_counter() - started,
+                      rss_connected=_rss())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(self._chat(communicator, result, options) for communicator in communicators))
+        result.update(turn_time=time.perf_counter() - started, rss_done=_rss())
+
+        await asyncio.gather(*(communicator.disconnect() for communicator in communicators))
+        return result
+
+    async def _chat(self, communicator, result, options):
+        for turn in range(options['turns']):
+            if turn and options['think']:
+                await asyncio.sleep(options['think'])
+            started = time.perf_counter()
+            await communicator.send_to(text_data=options['message'])
+            first_chunk, text = None, ''
+            try:
+                while not text.endswith(END_MARKER):
+                    timeout = options['timeout'] - (time.perf_counter() - started)
+                    message = json.loads(await communicator.receive_from(timeout=max(timeout, 0.001)))
+                    if 'message_id' not in message:
+                        # Errors of the workflow are sent without a message id.
+                        raise RuntimeError(message['message'])
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    text += message['message']
+            except (asyncio.TimeoutError, RuntimeError) as e:
+                result['failed'] += 1
+                self.stderr.write(f'Turn failed: {type(e).__name__}: {e}')
+                return
+            result['ttfc'].append(first_chunk)
+            result['latency'].append(time.perf_counter() - started)
+
+    def _report(self, result, options):
+        connected, turns = result['connected'], len(result['latency'])
+
+        def memory(rss):
+            growth = rss - result['rss_before']
+            return f'RSS +{growth / 2 ** 20:.1f} MiB ({growth / max(connected, 1) / 1024:.0f} KiB per connection)'
+
+        def timings(values):
+            p50, p95, p99 = _percentiles(values)
+            return f'p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms'
+
+        self.stdout.write(f'connected: {connected}/{options["connections"]} in {result["connect_time"]:.2f}s, '
+                          f'{memory(result["rss_connected"])}')
+        self.stdout.write(f'turns: {turns} completed, {result["failed"]} failed in {result["turn_time"]:.2f}s, '
+                          f'{turns / result["turn_time"]:.1f} turns/s')
+        self.stdout.write(f'time to first chunk: {timings(result["ttfc"])}')
+        self.stdout.write(f'turn latency: {timings(result["latency"])}')
+        self.stdout.write(f'after the turns: {memory(result["rss_done"])}')
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from agent.tools import async_tool
+from fintrack.models import Transaction
+from fintrack.seeding import seed_user
+from fintrack.services import get_transaction_by_id
+
+BENCH_EMAIL = 'bench-db-connections@example.com'
+
+# Environment of each measured setup, applied on top of the current one.
+SETUPS = [
+    ('new connection per call', {'POSTGRES_POOL': '0', 'POSTGRES_CONN_MAX_AGE': '0'}),
+    ('persistent connections', {'POSTGRES_POOL': '0', 'POSTGRES_CONN_MAX_AGE': '60'}),
+    ('connection pool', {'POSTGRES_POOL': '1'}),
+]
+
+
+def _backend_pid():
+    raw = connection.connection
+    return raw.info.backend_pid if hasattr(raw, 'info') else raw.get_backend_pid()
+
+
+async def _run(transaction_id, calls, concurrency):
+    pids = set()
+    timings = []
+
+    def get_transaction(transaction_id):
+        result = get_transaction_by_id(transaction_id)
+        pids.add(_backend_pid())
+        return result
+
+    tool = async_tool(get_transaction)
+
+    async def client(n):
+        for _ in range(n):
+            started = time.perf_counter()
+            await tool(transaction_id)
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(calls // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'calls': len(timings),
+        'calls_per_second': len(timings) / elapsed,
+        'p50_ms': timings[len(timings) // 2] * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95)] * 1000,
+        'connections': len(pids),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent get_transaction_by_id tool calls with a new database connection per call, with '
+            'persistent connections and with the connection pool, and report the latency of the calls and '
+            'the number of connections opened for them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=2000, help='Tool calls per setup.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Tool calls in flight at once.')
+        # Each setup is measured in a child process started with --worker, as its settings are read at start up.
+        parser.add_argument('--worker', type=int, metavar='TRANSACTION_ID', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            logging.disable(logging.INFO)
+            result = asyncio.run(_run(options['worker'], options['calls'], options['concurrency']))
+            self.stdout.write(json.dumps(result))
+            return
+
+        user = seed_user(BENCH_EMAIL, 100, name='Connections benchmark')
+        transaction_id = Transaction.objects.filter(user=user).values_list('id', flat=True).first()
+
+        self.stdout.write(f'{"setup":<26} {"calls/s":>8} {"p50":>9} {"p95":>9} {"connections":>12}')
+        for name, env in SETUPS:
+            process = subprocess.run(
+                [sys.executable, sys.argv[0], 'bench_db_connections', '--worker', str(transaction_id),
+                 '--calls', str(options['calls']), '--concurrency', str(options['concurrency'])],
+                env={**os.environ, **env}, capture_output=True, text=True,
+            )
+            if process.returncode:
+                raise CommandError(f'{name} failed:\n{process.stderr}')
+            result = json.loads(process.stdout.splitlines()[-1])
+            self.stdout.write(
+                f'{name:<26} {result["calls_per_second"]:>8.0f} {result["p50_ms"]:>6.1f} ms '
+                f'{result["p95_ms"]:>6.1f} ms {result["connections"]:>12}'
+            )
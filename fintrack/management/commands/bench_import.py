@@ -0,0 +1,75 @@
+import csv
+import random
+import resource
+import tempfile
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fintrack import ledger
+from fintrack.importer import import_transactions
+from fintrack.models import Transaction
+
+BENCH_EMAIL = 'bench-import@example.com'
+
+PAYEES = ['Grocery', 'Rickshaw', 'Electricity bill', 'Mobile recharge', 'Restaurant', 'Pharmacy', 'Salary', 'Rent']
+
+
+class Command(BaseCommand):
+    help = ('Generate a CSV statement of N rows, import it twice for a benchmark user (the second time every '
+            'row is a duplicate) and report the throughput and the memory growth of each run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of rows of the statement.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows copied and inserted at a time.')
+        parser.add_argument('--keep', action='store_true', help='Keep the imported transactions.')
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(email=BENCH_EMAIL, defaults={'name': 'Import benchmark'})
+        self._clear(user)
+
+        with tempfile.NamedTemporaryFile('w+', suffix='.csv', newline='') as statement:
+            self._write_statement(statement, options['rows'])
+            statement.flush()
+            self.stdout.write(f'Generated {options["rows"]} rows ({statement.tell() / 2 ** 20:.0f} MiB).')
+
+            for run in ('first import', 'reimport'):
+                statement.seek(0)
+                before = self._max_rss()
+                result = import_transactions(user.id, statement, 'csv', options['batch_size'])
+                self.stdout.write(
+                    f'{run:>12}: {result.read} rows in {result.elapsed:.1f}s, {result.rows_per_second:.0f} rows/s, '
+                    f'{result.inserted} inserted, {result.duplicates} duplicates, {result.invalid} invalid, '
+                    f'peak memory +{(self._max_rss() - before) / 1024:.0f} MiB'
+                )
+
+        summary = ledger.get_summary(user.id)
+        self.stdout.write(f'Balance summary: {summary.transaction_count} transactions, '
+                          f'balance {summary.current_balance}.')
+        if not options['keep']:
+            self._clear(user)
+
+    @staticmethod
+    def _write_statement(statement, rows):
+        writer = csv.writer(statement)
+        writer.writerow(['Date', 'Title', 'Description', 'Amount'])
+        rng = random.Random(0)
+        start = datetime(2020, 1, 1)
+        for i in range(rows):
+            payee = rng.choice(PAYEES)
+            amount = rng.randint(1, 50000) if payee == 'Salary' else -rng.randint(10, 5000)
+            day = start + timedelta(minutes=i * 3)
+            writer.writerow([day.strftime('%Y-%m-%d %H:%M'), payee, f'Statement line {i}', amount])
+
+    @staticmethod
+    def _clear(user):
+        with transaction.atomic():
+            Transaction.objects.filter(user=user).delete()
+            ledger.rebuild(user.id)
+
+    @staticmethod
+    def _max_rss():
+        # Kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from llama_index.core.tools import FunctionTool
+
+from agent.market import FakeYahooFinanceToolSpec, MarketDataCache
+
+
+class Command(BaseCommand):
+    help = ('Ask the Yahoo Finance tools about the same tickers from N simultaneous chats, against a fake '
+            'upstream, and report the upstream calls made with and without the market data cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=100, help='Number of simultaneous chats.')
+        parser.add_argument('--tickers', nargs='+', default=['AAPL', 'MSFT'], help='Tickers the chats ask about.')
+        parser.add_argument('--tool', default='stock_basic_info', help='Tool the chats call.')
+        parser.add_argument('--rounds', type=int, default=2, help='Times every chat asks, one after another.')
+        parser.add_argument('--latency', type=float, default=0.2, help='Latency of the fake upstream, in seconds.')
+
+    def handle(self, *args, **options):
+        if options['tool'] not in FakeYahooFinanceToolSpec.spec_functions:
+            raise CommandError(f'Unknown tool {options["tool"]}.')
+
+        # Without a cache the tools are the spec's own, which FunctionTool runs in the default executor.
+        for mode, ttl in (('uncached', None), ('coalesced', 0), ('cached', 60)):
+            spec = FakeYahooFinanceToolSpec(latency=options['latency'])
+            cache = MarketDataCache(spec, {}, default_ttl=ttl) if ttl is not None else None
+            tools = cache.to_tool_list() if cache else [FunctionTool.from_defaults(getattr(spec, name))
+                                                        for name in spec.spec_functions]
+            wall = asyncio.run(self._run(tools, options))
+            stats = cache.stats if cache else {}
+            self.stdout.write(
+                f'{mode:>9}: {options["chats"]} chats x {options["rounds"]} rounds in {wall * 1000:.0f} ms, '
+                f'{sum(spec.calls.values())} upstream calls, {stats.get("coalesced", 0)} coalesced, '
+                f'{stats.get("hits", 0)} hits'
+            )
+
+    async def _run(self, tools, options):
+        tool = next(t for t in tools if t.metadata.name == options['tool'])
+        tickers = options['tickers']
+
+        async def chat(i):
+            for _ in range(options['rounds']):
+                output = await tool.acall(ticker=tickers[i % len(tickers)].lower())
+                assert not output.is_error, output.content
+
+        started = time.perf_counter()
+        await asyncio.gather(*(chat(i) for i in range(options['chats'])))
+        return time.perf_counter() - started
@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from fintrack import partitions
+from fintrack.models import Transaction
+from fintrack.seeding import seed_user
+from fintrack.services import get_current_balance, get_transactions, get_transaction_by_id, search_transactions
+
+BENCH_EMAIL = 'bench-partitions-{}@example.com'
+
+
+class Command(BaseCommand):
+    help = ('Seed benchmark users with two years of transactions each, then time the agent tool services over '
+            'recent ranges with the transactions table plain and partitioned by month. The table is converted '
+            'back to its original layout at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of benchmark users.')
+        parser.add_argument('--rows', type=int, default=100000, help='Transactions of every benchmark user.')
+        parser.add_argument('--repeat', type=int, default=20, help='Calls timed per service, over the users.')
+        parser.add_argument('--tablespace', help='Also time the services with the partitions older than a year '
+                                                 'moved to this tablespace.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Transaction partitions need Postgres.')
+        # Spread over about two years, like a long-time user's history.
+        minutes_apart = max(2 * 365 * 24 * 60 // options['rows'], 1)
+        self.stdout.write(f'Preparing {options["users"]} users with {options["rows"]} transactions...')
+        users = [seed_user(BENCH_EMAIL.format(i), options['rows'], f'Partitions benchmark {i}', minutes_apart).id
+                 for i in range(options['users'])]
+
+        was_partitioned = partitions.is_partitioned()
+        layouts = ['partitioned', 'plain'] if was_partitioned else ['plain', 'partitioned']
+        try:
+            for layout in layouts:
+                self._convert(partitioned=layout == 'partitioned')
+                self._time(layout, users, options)
+                if layout == 'partitioned' and options['tablespace']:
+                    archive_before = partitions.add_months(partitions.month_start(timezone.now().date()), -12)
+                    partitions.archive_partitions(archive_before, options['tablespace'])
+                    self._time('archived', users, options)
+        finally:
+            self._convert(partitioned=was_partitioned)
+
+    def _convert(self, partitioned):
+        if partitions.is_partitioned() == partitioned:
+            return
+        started = time.perf_counter()
+        with transaction.atomic(), connection.schema_editor() as schema_editor:
+            if partitioned:
+                partitions.partition_table(schema_editor)
+            else:
+                partitions.unpartition_table(schema_editor)
+        self.stdout.write(f'{"Partitioned" if partitioned else "Unpartitioned"} the table in '
+                          f'{time.perf_counter() - started:.1f}s')
+
+    def _time(self, layout, users, options):
+        today = timezone.localdate()
+        week_ago, month_ago = (today - timedelta(days=7)).isoformat(), (today - timedelta(days=30)).isoformat()
+        recent_ids = [Transaction.objects.filter(user_id=user_id).order_by('-created_at').values_list('id', flat=True)
+                      .first() for user_id in users]
+        cases = [
+            ('latest 20', lambda user_id, _: get_transactions(user_id, 'expense', limit=20)),
+            ('last 7 days', lambda user_id, _: get_transactions(user_id, 'expense', start_date=week_ago)),
+            ('last 30 days, page 5', lambda user_id, _: get_transactions(user_id, 'expense', start_date=month_ago,
+                                                                         offset=400)),
+            ('search', lambda user_id, _: search_transactions(user_id, 'rickshaw office')),
+            ('balance', lambda user_id, _: get_current_balance(user_id)),
+            ('by id', lambda _, transaction_id: get_transaction_by_id(transaction_id)),
+        ]
+        self._vacuum()
+        self.stdout.write(f'\n{layout}:')
+        for name, call in cases:
+            for user_id, transaction_id in zip(users, recent_ids):
+                call(user_id, transaction_id)
+            timings = []
+            for i in range(options['repeat']):
+                started = time.perf_counter()
+                call(users[i % len(users)], recent_ids[i % len(users)])
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(f'{name:<24} median {timings[len(timings) // 2] * 1000:>7.2f} ms, '
+                              f'p95 {timings[int(len(timings) * 0.95)] * 1000:>7.2f} ms')
+
+        # What vacuum goes through after a day of edits: the whole table and its indexes, or only the
+        # current month. Index cleanup is forced, as it is once edits reach 2% of the table's pages.
+        table = Transaction._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {table} SET updated_at = now() WHERE created_at > now() - interval '1 day'")
+            started = time.perf_counter()
+            cursor.execute(f'VACUUM (INDEX_CLEANUP ON) '
+                           f'{table if layout == "plain" else partitions.partition_name(table, today.replace(day=1))}')
+            self.stdout.write(f'{"vacuum after edits":<24} {(time.perf_counter() - started) * 1000:>14.0f} ms')
+
+    @staticmethod
+    def _vacuum():
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM ANALYZE {Transaction._meta.db_table}')
@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from account.services import get_user_information, update_user_information
+from fintrack.models import Transaction
+from fintrack.seeding import seed_user
+from fintrack.services import (
+    get_current_balance, get_transactions, search_transactions, get_transaction_by_id, get_spending_summary,
+    create_transaction, create_transactions, update_transaction, update_transactions, delete_transactions,
+)
+
+BENCH_EMAIL = 'bench-services-{}@example.com'
+
+DATATABLE_COLUMNS = ['title', 'amount', 'transaction_type', 'created_at', 'id']
+
+
+def datatable_query(search_text='', start=0, length=25):
+    query = {'draw': 1, 'start': start, 'length': length, 'search[value]': search_text,
+             'order[0][column]': 3, 'order[0][dir]': 'desc'}
+    for i, column in enumerate(DATATABLE_COLUMNS):
+        query.update({f'columns[{i}][data]': column, f'columns[{i}][name]': '',
+                      f'columns[{i}][searchable]': 'true', f'columns[{i}][orderable]': 'true'})
+    return query
+
+
+def rolled_back(fn):
+    # Writes are timed in a transaction that is rolled back, so every run sees the same data.
+    def wrapper():
+        with transaction.atomic():
+            result = fn()
+            transaction.set_rollback(True)
+        return result
+
+    return wrapper
+
+
+class Command(BaseCommand):
+    help = ('Seed benchmark users with N transactions for every given N, then time every agent tool service '
+            'and transaction view and count their queries.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                            help='Numbers of transactions of the benchmark users.')
+        parser.add_argument('--repeat', type=int, default=5, help='Calls timed per service or view.')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            self.stdout.write(f'Preparing a user with {size} transactions...')
+            user = seed_user(BENCH_EMAIL.format(size), size, name=f'Services benchmark {size}')
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+
+            self.stdout.write(f'{"call":<32} {"median":>10} {"max":>10} {"queries":>8}')
+            for name, call in self._cases(user, client):
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        result = call()
+                        timings.append(time.perf_counter() - started)
+                    if getattr(result, 'status_code', 200) != 200:
+                        raise CommandError(f'{name} answered {result.status_code}: {result.content[:200]}')
+                timings.sort()
+                self.stdout.write(f'{name:<32} {timings[len(timings) // 2] * 1000:>7.1f} ms '
+                                  f'{timings[-1] * 1000:>7.1f} ms {len(queries):>8}')
+
+    @staticmethod
+    def _cases(user, client):
+        ids = list(Transaction.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:3])
+        month_ago = (timezone.localdate() - timedelta(days=30)).isoformat()
+        items = [{'title': 'Lunch', 'amount': 250, 'transaction_type': 'expense'},
+                 {'title': 'Rickshaw', 'amount': 60, 'transaction_type': 'expense'},
+                 {'title': 'Tea', 'amount': 20, 'transaction_type': 'expense'}]
+        return [
+            ('get_current_balance', lambda: get_current_balance(user.id)),
+            ('get_transactions', lambda: get_transactions(user.id, 'expense', limit=100)),
+            ('get_transactions, cursor', lambda: get_transactions(user.id, 'expense', limit=100, pagination='cursor')),
+            ('search_transactions', lambda: search_transactions(user.id, 'rickshaw office')),
+            ('get_transaction_by_id', lambda: get_transaction_by_id(ids[0])),
+            ('get_spending_summary', lambda: get_spending_summary(user.id)),
+            ('create_transaction', rolled_back(lambda: create_transaction(user.id, 'Tea', '', 20, 'expense'))),
+            ('create_transactions', rolled_back(lambda: create_transactions(user.id, items))),
+            ('update_transaction', rolled_back(lambda: update_transaction(ids[0], {'amount': 10}))),
+            ('update_transactions', rolled_back(
+                lambda: update_transactions(user.id, [{'id': i, 'amount': 10} for i in ids]))),
+            ('delete_transactions', rolled_back(lambda: delete_transactions(user.id, ids))),
+            ('get_user_information', lambda: get_user_information(user.id)),
+            ('update_user_information', rolled_back(lambda: update_user_information(user.id, {'name': 'Bench'}))),
+            ('view transactions-list', lambda: client.get(reverse('fintrack:transactions-list'), datatable_query())),
+            ('view transactions-list, search',
+             lambda: client.get(reverse('fintrack:transactions-list'), datatable_query('rickshaw office'))),
+            ('view transactions-list, page 200',
+             lambda: client.get(reverse('fintrack:transactions-list'), datatable_query(start=5000))),
+            ('view transactions-detail',
+             lambda: client.get(reverse('fintrack:transactions-detail', args=[ids[0]]))),
+            ('view transactions-summary', lambda: client.get(reverse('fintrack:transactions-summary'))),
+            ('view transactions-export, month', lambda: b''.join(client.get(
+                reverse('fintrack:transactions-export', args=['csv']), {'start_date': month_ago}
+            ).streaming_content)),
+        ]
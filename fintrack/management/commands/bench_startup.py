@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from agent.importtime import STARTUP, profile_imports, report
+
+BUILD_WORKFLOW = ('import time, django; django.setup(); started = time.perf_counter(); '
+                  'from agent.registry import get_workflow; get_workflow(); print(time.perf_counter() - started)')
+
+
+class Command(BaseCommand):
+    help = ('Profile the imports of a worker loading the settings, the ASGI app and the URLs, then the time '
+            'taken to build the agents on first use, each in a new interpreter, and show the heaviest modules.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Number of modules shown.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Startup: ' + report(profile_imports(STARTUP, AGENT_WARM_UP='0'), options['top']))
+
+        build = subprocess.run([sys.executable, '-c', BUILD_WORKFLOW], cwd=settings.BASE_DIR, capture_output=True,
+                               text=True, check=True)
+        self.stdout.write(f'\nFirst chat: building the agents took {float(build.stdout.split()[-1]):.2f}s')
+        self.stdout.write('Agents: ' + report(profile_imports(BUILD_WORKFLOW), options['top']))
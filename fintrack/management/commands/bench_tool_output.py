@@ -0,0 +1,95 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from agent.tokens import count_tokens
+from fintrack import ledger
+from fintrack.models import Transaction
+from fintrack.services import get_transactions, search_transactions, get_transaction_by_id
+from fintrack.search import search
+
+BENCH_EMAIL = 'bench-tool-output@example.com'
+
+PAYEES = ['Grocery', 'Rickshaw', 'Electricity bill', 'Mobile recharge', 'Restaurant', 'Pharmacy', 'Salary', 'Rent']
+
+
+def _legacy_dict(transaction):
+    # The tool results before compact tables: a dictionary per transaction, repr'd by the tool.
+    return {
+        'id': transaction.id,
+        'title': transaction.title,
+        'transaction_type': transaction.transaction_type,
+        'amount': transaction.amount,
+        'description': transaction.description,
+        'created_at': transaction.created_at.isoformat(),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare the tokens of the transaction tool results fed back to the LLM, as dictionaries and as '
+            'compact tables, for a benchmark user with N transactions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of transactions of the benchmark user.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark transactions.')
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(email=BENCH_EMAIL, defaults={'name': 'Tool output benchmark'})
+        self._seed(user, options['rows'])
+
+        transactions = Transaction.objects.filter(user=user)
+        expenses = transactions.filter(transaction_type='expense').order_by('-created_at')
+        first = transactions.order_by('id').first()
+        cases = [
+            ('get_transactions, 100 rows', expenses[:100],
+             lambda: get_transactions(user.id, 'expense', limit=100)),
+            ('get_transactions, 100 rows, title+amount', expenses[:100],
+             lambda: get_transactions(user.id, 'expense', limit=100, fields=['title', 'amount'])),
+            ('get_transactions, cursor page of 20', expenses[:20],
+             lambda: get_transactions(user.id, 'expense', limit=20, pagination='cursor')),
+            ('search_transactions, 20 rows', search(transactions, 'rickshaw')[:20],
+             lambda: search_transactions(user.id, 'rickshaw')),
+            ('get_transaction_by_id', [first],
+             lambda: get_transaction_by_id(first.id)),
+        ]
+
+        self.stdout.write(f'{"tool call":<42} {"before":>7} {"after":>7} {"saved":>6}  rows shown')
+        for name, legacy, call in cases:
+            before = count_tokens(str([_legacy_dict(t) for t in legacy]))
+            output = call()
+            after = count_tokens(output)
+            lines = output.splitlines()
+            more = lines[-1] if lines[-1].startswith('more available') else ''
+            shown = len(lines) - 1 - bool(more)
+            self.stdout.write(
+                f'{name:<42} {before:>7} {after:>7} {1 - after / before:>6.0%}  {shown} {more[:60]}'
+            )
+
+        if not options['keep']:
+            self._clear(user)
+
+    @staticmethod
+    def _seed(user, rows):
+        rng = random.Random(0)
+        with transaction.atomic():
+            Transaction.objects.filter(user=user).delete()
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user=user,
+                    title=payee,
+                    description=f'{payee} paid from the {rng.choice(["bKash", "card", "cash"])} account, '
+                                f'reference {rng.randint(10 ** 8, 10 ** 9)}',
+                    transaction_type='balance' if payee == 'Salary' else 'expense',
+                    amount=rng.randint(10, 50000),
+                )
+                for payee in (rng.choice(PAYEES) for _ in range(rows))
+            ], batch_size=5000)
+            ledger.rebuild(user.id)
+
+    @staticmethod
+    def _clear(user):
+        with transaction.atomic():
+            Transaction.objects.filter(user=user).delete()
+            ledger.rebuild(user.id)
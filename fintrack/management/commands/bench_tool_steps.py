@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from llama_index.core.agent.workflow import ToolCall, ToolCallResult
+
+from agent.fake_llm import FakeLLMServer
+from agent.memory import RollingSummaryMemory
+from agent.registry import get_workflow
+from config.llm import github_model
+from fintrack.seeding import seed_user
+
+BENCH_EMAIL = 'bench-tool-steps@example.com'
+
+EXPECTED_CALLS = ['handoff', 'get_current_balance', 'get_transactions', 'search_transactions']
+
+
+def _with_latency(latency):
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def add_delay(sender, connection, **kwargs):
+        # Connections of the tool threads are reopened, or taken from the pool, for every call.
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    return add_delay
+
+
+class Command(BaseCommand):
+    help = ('Run chat turns in which the finance agent calls get_current_balance, get_transactions and '
+            'search_transactions in the same step, against a fake LLM, with the tool calls run one after '
+            'another and concurrently, and compare the latency of that step.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of transactions of the benchmark user.')
+        parser.add_argument('--turns', type=int, default=10, help='Turns timed per mode.')
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help='Extra database latency simulated on every query of the tools, in seconds.')
+        parser.add_argument('--verbose', action='store_true', help='Show the logs and traces of the turns.')
+
+    def handle(self, *args, **options):
+        if not options['verbose']:
+            logging.disable(logging.INFO)
+        user = seed_user(BENCH_EMAIL, options['rows'], name='Tool steps benchmark')
+        server = FakeLLMServer(reply_words=5, first_token_latency=0.05, token_latency=0,
+                               parallel_tool_calls=True).start()
+        api_base, api_key = github_model.api_base, github_model.api_key
+        github_model.api_base, github_model.api_key = server.url, 'fake'
+        add_delay = _with_latency(options['latency'])
+        if options['latency']:
+            connection_created.connect(add_delay)
+        try:
+            self.stdout.write(f'{"mode":<12} {"tool step p50":>14} {"max":>9} {"turn p50":>10}')
+            for mode, steps, turns in asyncio.run(self._compare(user, options['turns'])):
+                self.stdout.write(f'{mode:<12} {statistics.median(steps) * 1000:>11.0f} ms '
+                                  f'{max(steps) * 1000:>6.0f} ms {statistics.median(turns) * 1000:>7.0f} ms')
+        finally:
+            connection_created.disconnect(add_delay)
+            github_model.api_base, github_model.api_key = api_base, api_key
+            server.stop()
+
+    async def _compare(self, user, turns):
+        # Both modes run on one event loop, which the LLM client's connections are bound to.
+        results = []
+        for mode, parallel in (('sequential', False), ('parallel', True)):
+            with override_settings(AGENT_PARALLEL_TOOL_CALLS=parallel):
+                results.append((mode, *await self._run(user, turns)))
+        return results
+
+    async def _run(self, user, turns):
+        steps, durations = [], []
+        # The first turn warms up the connections and the search, and is not timed.
+        for i in range(turns + 1):
+            started = time.perf_counter()
+            handler = get_workflow().run(f'Authenticated User ID: {user.id}\nHow much did I spend on rickshaws?',
+                                   memory=RollingSummaryMemory.from_defaults())
+            step_started = step_ended = None
+            async for event in handler.stream_events():
+                if isinstance(event, ToolCall) and event.tool_name != 'handoff' and step_started is None:
+                    step_started = time.perf_counter()
+                elif isinstance(event, ToolCallResult) and event.tool_name != 'handoff':
+                    step_ended = time.perf_counter()
+            output = await handler
+
+            calls = [call.tool_name for call in output.tool_calls]
+            if calls != EXPECTED_CALLS:
+                raise CommandError(f'Tool results were given back as {calls}, not in the order of the calls.')
+            if i:
+                steps.append(step_ended - step_started)
+                durations.append(time.perf_counter() - started)
+        return steps, durations
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from agent.tools import async_tool
+from fintrack.services import get_current_balance, get_transactions
+
+
+def _with_latency(fn, latency):
+    def wrapper(*args, **kwargs):
+        if latency:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(%s)', [latency])
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class Command(BaseCommand):
+    help = ('Run N simultaneous simulated chats against the agent tools, once with Django\'s default '
+            'thread-sensitive sync_to_async and once with the async tool counterparts, and compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='User whose data the tools read. Defaults to the first user.')
+        parser.add_argument('--chats', type=int, default=16, help='Number of simultaneous chats.')
+        parser.add_argument('--calls', type=int, default=4, help='Tool calls made by every chat.')
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help='Extra database latency simulated on every call, in seconds.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(id=options['user']) if options['user'] \
+            else get_user_model().objects.order_by('id')
+        user = user.first()
+        if user is None:
+            raise CommandError('No user to run the tools for.')
+
+        tools = [
+            (_with_latency(get_current_balance, options['latency']), {'user_id': user.id}),
+            (_with_latency(get_transactions, options['latency']),
+             {'user_id': user.id, 'transaction_type': 'expense', 'limit': 10}),
+        ]
+
+        for mode, wrap in (('serialized', sync_to_async), ('async tools', async_tool)):
+            wall, lag = asyncio.run(self._run([(wrap(fn), kwargs) for fn, kwargs in tools], options))
+            self.stdout.write(
+                f'{mode:>12}: {options["chats"]} chats x {options["calls"]} calls in {wall * 1000:.0f} ms, '
+                f'max event loop lag {lag * 1000:.1f} ms'
+            )
+
+    async def _run(self, tools, options):
+        async def chat():
+            for i in range(options['calls']):
+                fn, kwargs = tools[i % len(tools)]
+                await fn(**kwargs)
+
+        lag = 0.0
+        done = asyncio.Event()
+
+        async def heartbeat():
+            nonlocal lag
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lag = max(lag, time.perf_counter() - started - 0.001)
+
+        monitor = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        await asyncio.gather(*(chat() for _ in range(options['chats'])))
+        wall = time.perf_counter() - started
+        done.set()
+        await monitor
+        return wall, lag
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django_datatables_view.base_datatable_view import BaseDatatableView
+
+from fintrack.models import Transaction
+from fintrack.seeding import seed_user
+from fintrack.views import TransactionListJson
+
+BENCH_EMAIL = 'bench-transaction-list@example.com'
+
+COLUMNS = ['title', 'amount', 'transaction_type', 'created_at', 'id']
+
+SCENARIOS = [
+    ('first page', {'order[0][column]': 3, 'order[0][dir]': 'desc'}),
+    ('page 200', {'order[0][column]': 3, 'order[0][dir]': 'desc', 'start': 5000}),
+    ('sort by title', {'order[0][column]': 0, 'order[0][dir]': 'asc'}),
+    ('search', {'order[0][column]': 3, 'order[0][dir]': 'desc', 'search[value]': 'rickshaw office'}),
+]
+
+
+class LegacyTransactionListJson(BaseDatatableView):
+    # The view before it was scoped to the user, for comparison.
+    model = Transaction
+    columns = ['title', 'amount', 'transaction_type', 'created_at', 'description', 'id']
+    order_columns = ['title', 'amount', 'transaction_type', 'created_at', 'id']
+    max_display_length = 100
+
+
+class Command(BaseCommand):
+    help = ('Seed a benchmark user with N transactions and time draws of the transactions DataTables '
+            'endpoint, against the previous unscoped implementation.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of transactions of the user.')
+        parser.add_argument('--repeat', type=int, default=5, help='Draws timed per scenario.')
+        parser.add_argument('--skip-legacy', action='store_true', help='Only time the current implementation.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Preparing a user with {options["rows"]} transactions...')
+        user = seed_user(BENCH_EMAIL, options['rows'], name='List benchmark')
+
+        views = [('current', TransactionListJson)]
+        if not options['skip_legacy']:
+            views.append(('legacy', LegacyTransactionListJson))
+
+        factory = RequestFactory()
+        for name, params in SCENARIOS:
+            for label, view in views:
+                query = {'draw': 1, 'start': 0, 'length': 25, 'search[value]': '', **params}
+                for i, column in enumerate(COLUMNS):
+                    query.update({f'columns[{i}][data]': column, f'columns[{i}][name]': '',
+                                  f'columns[{i}][searchable]': 'true', f'columns[{i}][orderable]': 'true'})
+                request = factory.get('/datatable/data/', query)
+                request.user = user
+
+                timings = []
+                for _ in range(options['repeat']):
+                    reset_queries()
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = view.as_view()(request)
+                        timings.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content
+
+                timings.sort()
+                self.stdout.write(f'{name:>14} {label:>8}: median {timings[len(timings) // 2] * 1000:7.1f} ms, '
+                                  f'{len(queries)} queries')
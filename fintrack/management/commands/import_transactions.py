@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from fintrack.importer import DATE_ORDERS, FORMATS, import_transactions
+
+
+class Command(BaseCommand):
+    help = 'Import the transactions of a CSV or OFX bank statement for a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The statement file, or - to read it from standard input.')
+        parser.add_argument('--user', required=True, help='ID or email of the user owning the transactions.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the statement. Defaults to the extension of the file.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows copied and inserted at a time.')
+        parser.add_argument('--date-order', choices=DATE_ORDERS,
+                            help='Order of day and month in numeric dates. Defaults to the setting.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        user = users.filter(id=options['user']).first() if options['user'].isdigit() \
+            else users.filter(email=options['user']).first()
+        if user is None:
+            raise CommandError(f'User {options["user"]} not found.')
+
+        path = options['path']
+        file_format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError('Cannot tell the format of the statement, use --format.')
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            result = import_transactions(user.id, stream, file_format, options['batch_size'], self._progress,
+                                         options['date_order'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f'Line {error["line"]}: {error["error"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.read} rows read in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s): '
+            f'{result.inserted} imported, {result.duplicates} already imported, {result.invalid} invalid.'
+        ))
+
+    def _progress(self, stage, result):
+        count = result.read if stage == 'read' else result.inserted
+        self.stderr.write(f'{count} rows {stage}, {result.rows_per_second:.0f} rows/s', ending='\r')
@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from fintrack import ledger
+from fintrack.models import BalanceSummary, TransactionRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the per-user balance summaries and daily rollups from the raw transaction rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only process the given user ID. Can be repeated.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report summaries that differ from the raw rows, without writing.')
+
+    def handle(self, *args, **options):
+        expected = {row.pop('user_id'): row for row in ledger.compute_all()}
+        stored = {summary.user_id: summary for summary in BalanceSummary.objects.all()}
+        expected_rollups, stored_rollups = self._rollups()
+
+        user_ids = options['users'] or sorted(set(expected) | set(stored) | set(stored_rollups))
+        empty = dict.fromkeys(ledger.TOTAL_FIELDS, 0)
+
+        mismatched = 0
+        for user_id in user_ids:
+            totals = expected.get(user_id, empty)
+            summary = stored.get(user_id)
+            summary_ok = summary and all(getattr(summary, name) == value for name, value in totals.items())
+            rollups, stored_user_rollups = expected_rollups.get(user_id, {}), stored_rollups.get(user_id, {})
+            rollups_ok = rollups == stored_user_rollups
+            if summary_ok and rollups_ok:
+                continue
+
+            mismatched += 1
+            if not summary_ok:
+                self.stdout.write(f'User {user_id}: stored {self._describe(summary)}, expected {totals}')
+            if not rollups_ok:
+                keys = {key for key in set(rollups) | set(stored_user_rollups)
+                        if rollups.get(key) != stored_user_rollups.get(key)}
+                self.stdout.write(f'User {user_id}: daily rollups differ on {len({day for _, day in keys})} days')
+            if not options['verify']:
+                with transaction.atomic():
+                    ledger.rebuild(user_id)
+
+        if options['verify'] and mismatched:
+            raise CommandError(f'{mismatched} of {len(user_ids)} balance summaries are out of date.')
+
+        action = 'found out of date' if options['verify'] else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(f'{len(user_ids)} users checked, {mismatched} {action}.'))
+
+    @staticmethod
+    def _rollups():
+        expected, stored = defaultdict(dict), defaultdict(dict)
+        for row in ledger.compute_rollups():
+            expected[row['user_id']][row['transaction_type'], row['day']] = (row['total'], row['count'])
+        # Rows emptied by deletes are left at zero rather than removed.
+        rows = TransactionRollup.objects.exclude(count=0).values_list('user_id', 'transaction_type', 'day', 'total', 'count')
+        for user_id, transaction_type, day, total, count in rows:
+            stored[user_id][transaction_type, day] = (total, count)
+        return expected, stored
+
+    @staticmethod
+    def _describe(summary):
+        if summary is None:
+            return 'nothing'
+        return {name: getattr(summary, name) for name in ledger.TOTAL_FIELDS}
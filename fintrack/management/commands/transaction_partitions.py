@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from fintrack import partitions
+
+ACTIONS = ('list', 'create', 'archive', 'partition', 'unpartition')
+
+
+class Command(BaseCommand):
+    help = ('Manage the monthly partitions of the transactions table: list them, create those of the coming '
+            'months, move old ones to the archive tablespace, or convert the table to or from a partitioned one.')
+
+    def add_arguments(self, parser):
+        config = settings.TRANSACTION_PARTITIONS
+        parser.add_argument('action', choices=ACTIONS)
+        parser.add_argument('--months-ahead', type=int, default=config['MONTHS_AHEAD'],
+                            help='Months after the current one to create partitions for.')
+        parser.add_argument('--archive-after', type=int, default=config['ARCHIVE_AFTER_MONTHS'],
+                            help='Age in months from which partitions are archived.')
+        parser.add_argument('--tablespace', default=config['ARCHIVE_TABLESPACE'],
+                            help='Tablespace archived partitions are moved to.')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if connection.vendor != 'postgresql':
+            raise CommandError('Transaction partitions need Postgres.')
+        if (action == 'partition') == partitions.is_partitioned():
+            raise CommandError(f'The transactions table is {"already" if action == "partition" else "not"} '
+                               f'partitioned.')
+
+        if action == 'partition':
+            with transaction.atomic(), connection.schema_editor() as schema_editor:
+                partitions.partition_table(schema_editor, months_ahead=options['months_ahead'])
+        elif action == 'unpartition':
+            with transaction.atomic(), connection.schema_editor() as schema_editor:
+                partitions.unpartition_table(schema_editor)
+        elif action == 'create':
+            for name in partitions.create_partitions(options['months_ahead']):
+                self.stdout.write(f'Created {name}')
+        elif action == 'archive':
+            self._archive(options)
+        self._list()
+
+    def _archive(self, options):
+        if not options['tablespace']:
+            raise CommandError('Set TRANSACTION_ARCHIVE_TABLESPACE or pass --tablespace.')
+        before = partitions.add_months(partitions.month_start(timezone.now().date()), -options['archive_after'])
+        for name in partitions.archive_partitions(before, options['tablespace']):
+            # Frozen, the archived rows are not visited again by autovacuum until they change.
+            with connection.cursor() as cursor:
+                cursor.execute(f'VACUUM (FREEZE, ANALYZE) {name}')
+            self.stdout.write(f'Moved {name} to {options["tablespace"]}')
+
+    def _list(self):
+        for partition in partitions.list_partitions():
+            self.stdout.write(f'{partition.name:<32} {partition.tablespace or "default":<16} '
+                              f'~{partition.rows:>10} rows {partition.bytes / 2 ** 20:>9.1f} MiB')
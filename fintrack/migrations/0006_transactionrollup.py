@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fintrack', '0005_transaction_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('balance', 'Balance'), ('expense', 'Expense')], max_length=10)),
+                ('day', models.DateField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'transaction_type', 'day'), name='transaction_rollup_unique_day')],
+            },
+        ),
+        # Seed the rollups from the existing rows, with days in the ledger's time zone.
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO fintrack_transactionrollup (user_id, transaction_type, day, total, count)
+                SELECT user_id, transaction_type, (created_at AT TIME ZONE 'Asia/Dhaka')::date, SUM(amount), COUNT(*)
+                FROM fintrack_transaction
+                GROUP BY 1, 2, 3
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+from fintrack import partitions
+
+
+def partition(apps, schema_editor):
+    model = apps.get_model('fintrack', 'Transaction')
+    if settings.TRANSACTION_PARTITIONS['ENABLED'] and not partitions.is_partitioned(model):
+        partitions.partition_table(schema_editor, model, settings.TRANSACTION_PARTITIONS['MONTHS_AHEAD'])
+
+
+def unpartition(apps, schema_editor):
+    model = apps.get_model('fintrack', 'Transaction')
+    if partitions.is_partitioned(model):
+        partitions.unpartition_table(schema_editor, model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fintrack', '0008_transaction_user_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
+from fintrack.search import search_vector
+
 
 class Transaction(models.Model):
     class Type(models.TextChoices):
@@ -16,8 +19,71 @@ class Transaction(models.Model):
     description = models.TextField(blank=True)
     transaction_type = models.CharField(max_length=10, choices=Type.choices)
     amount = models.IntegerField(default=0)
+    # Stable ID of a transaction imported from a bank statement, so a statement can be imported again
+    # without creating duplicates.
+    external_id = models.CharField(max_length=64, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'transaction_type', 'created_at', 'id'],
+                         name='transaction_user_type_created'),
+            models.Index(fields=['user', 'created_at', 'id'], name='transaction_user_created'),
+            GinIndex(search_vector(), name='transaction_search'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'external_id'], condition=models.Q(external_id__isnull=False),
+                                    name='transaction_user_external_id'),
+        ]
+
     def __str__(self):
         return self.title
+
+
+class BalanceSummary(models.Model):
+    user = models.OneToOneField(
+        to=get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="balance_summary",
+    )
+    balance_total = models.BigIntegerField(default=0)
+    expense_total = models.BigIntegerField(default=0)
+    balance_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def current_balance(self):
+        return self.balance_total - self.expense_total
+
+    @property
+    def transaction_count(self):
+        return self.balance_count + self.expense_count
+
+    def __str__(self):
+        return f'Balance summary of user {self.user_id}'
+
+
+class TransactionRollup(models.Model):
+    """
+    Total and count of a user's transactions of one type on one day, kept up to date on every
+    transaction write by the ledger. Days are in the ledger's time zone.
+    """
+    user = models.ForeignKey(
+        to=get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="transaction_rollups",
+    )
+    transaction_type = models.CharField(max_length=10, choices=Transaction.Type.choices)
+    day = models.DateField()
+    total = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'transaction_type', 'day'], name='transaction_rollup_unique_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.transaction_type} of user {self.user_id} on {self.day}'
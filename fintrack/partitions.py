@@ -0,0 +1,233 @@
+import re
+from collections import namedtuple
+from datetime import date, timezone as dt_timezone
+
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from fintrack.models import Transaction
+
+Partition = namedtuple('Partition', ['name', 'month', 'tablespace', 'rows', 'bytes'])
+
+PARTITION_KEY = 'created_at'
+
+# Partitions are named after their table and month, e.g. fintrack_transaction_2026_10.
+MONTH_SUFFIX = re.compile(r'_(\d{4})_(\d{2})$')
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def next_month(month: date) -> date:
+    return add_months(month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+def default_partition_name(table: str) -> str:
+    return f'{table}_default'
+
+
+def _bound(month: date) -> str:
+    # Months are in UTC, like the stored timestamps.
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def is_partitioned(model=Transaction) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)',
+                       [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def list_partitions(model=Transaction) -> list:
+    """
+    Return the partitions of the table of `model`, oldest first, with the default partition last.
+
+    `tablespace` is None for partitions in the database's default tablespace, `rows` is the planner's estimate.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT child.relname, tablespace.spcname, child.reltuples::bigint, pg_total_relation_size(child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            LEFT JOIN pg_tablespace tablespace ON tablespace.oid = child.reltablespace
+            WHERE pg_inherits.inhparent = %s::regclass
+        ''', [model._meta.db_table])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, tablespace, estimate, size in rows:
+        match = MONTH_SUFFIX.search(name)
+        month = date(int(match[1]), int(match[2]), 1) if match else None
+        partitions.append(Partition(name, month, tablespace, max(estimate, 0), size))
+    return sorted(partitions, key=lambda partition: (partition.month is None, partition.month))
+
+
+def create_partitions(months_ahead: int, model=Transaction, today: date = None) -> list:
+    """
+    Create the missing monthly partitions of the table of `model`, up to `months_ahead` months after
+    the current one.
+
+    Rows of a new partition's month already stored in the default partition are moved to it.
+
+    Returns:
+        list: The names of the created partitions.
+    """
+    month = month_start(today or timezone.now().date())
+    existing = {partition.month for partition in list_partitions(model)}
+    created = []
+    for _ in range(months_ahead + 1):
+        if month not in existing:
+            with transaction.atomic():
+                created.append(_create_partition(model._meta.db_table, month))
+        month = next_month(month)
+    return created
+
+
+def _create_partition(table: str, month: date) -> str:
+    # The partition is filled from the default partition before it is attached, which only takes a
+    # lock on the default partition, and attaching it creates its indexes.
+    name, default = partition_name(table, month), default_partition_name(table)
+    start, end = _bound(month), _bound(next_month(month))
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'''
+            WITH moved AS (
+                DELETE FROM {default} WHERE {PARTITION_KEY} >= {start} AND {PARTITION_KEY} < {end} RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        ''')
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})')
+    return name
+
+
+def archive_partitions(before: date, tablespace: str, model=Transaction) -> list:
+    """
+    Move the monthly partitions of the table of `model` ending on or before `before` to `tablespace`,
+    with their indexes.
+
+    The partitions stay attached, so queries over any range keep working; those over recent months
+    never read the archived ones. Moving a partition locks it for the time of the copy.
+
+    Returns:
+        list: The names of the moved partitions.
+    """
+    moved, tablespace = [], connection.ops.quote_name(tablespace)
+    with connection.cursor() as cursor:
+        for partition in list_partitions(model):
+            if partition.month is None or next_month(partition.month) > before:
+                continue
+            cursor.execute(f'ALTER TABLE {partition.name} SET TABLESPACE {tablespace}')
+            cursor.execute('''
+                SELECT index.relname FROM pg_index JOIN pg_class index ON index.oid = pg_index.indexrelid
+                WHERE pg_index.indrelid = %s::regclass
+            ''', [partition.name])
+            for (index,) in cursor.fetchall():
+                cursor.execute(f'ALTER INDEX {index} SET TABLESPACE {tablespace}')
+            moved.append(partition.name)
+    return moved
+
+
+def partition_table(schema_editor, model=Transaction, months_ahead: int = 3):
+    """
+    Convert the table of `model` into a table partitioned by the month of created_at, with a partition
+    for every month from the oldest row to `months_ahead` months from now, and a default partition.
+
+    Rows are copied, so the table is locked for the time of the copy. The primary key and unique
+    constraints are extended with created_at, as Postgres requires of partitioned tables; a unique
+    constraint then only holds between rows of the same created_at, which is why the importer looks up
+    the external IDs it has already imported instead of relying on theirs.
+    """
+    table = model._meta.db_table
+    old = f'{table}_unpartitioned'
+    with schema_editor.connection.cursor() as cursor:
+        # Checks deferred by earlier writes of the transaction would hold on to the old table.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        cursor.execute(f"""
+            SELECT min({PARTITION_KEY}),
+                   greatest(max(id), pg_sequence_last_value(pg_get_serial_sequence('{old}', 'id')))
+            FROM {old}
+        """)
+        oldest, last_id = cursor.fetchone()
+        cursor.execute(f'''
+            CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE ({PARTITION_KEY})
+        ''')
+        cursor.execute(f'CREATE TABLE {default_partition_name(table)} PARTITION OF {table} DEFAULT')
+
+        this_month = month_start(timezone.now().date())
+        first = month_start(oldest.astimezone(dt_timezone.utc).date()) if oldest else this_month
+        for month in _months(first, add_months(this_month, months_ahead)):
+            cursor.execute(f'''
+                CREATE TABLE {partition_name(table, month)} PARTITION OF {table}
+                FOR VALUES FROM ({_bound(month)}) TO ({_bound(next_month(month))})
+            ''')
+
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old}')
+
+        # The identity column of the old table cannot be kept, so ids come from a sequence going on from it.
+        cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        cursor.execute(f"SELECT setval('{table}_id_seq', %s, %s)", [last_id or 1, last_id is not None])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, {PARTITION_KEY})')
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+    _create_indexes(schema_editor, model, partitioned=True)
+
+
+def unpartition_table(schema_editor, model=Transaction):
+    """
+    Convert the partitioned table of `model` back into a plain table, with its rows, wherever their partitions are.
+    """
+    table = model._meta.db_table
+    old = f'{table}_partitioned'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        cursor.execute(f"SELECT greatest(max(id), pg_sequence_last_value('{table}_id_seq')) FROM {old}")
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING CONSTRAINTS)')
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old}')
+
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), %s, %s)",
+                       [last_id or 1, last_id is not None])
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+    _create_indexes(schema_editor, model, partitioned=False)
+
+
+def _months(first: date, last: date):
+    month = first
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def _create_indexes(schema_editor, model, partitioned: bool):
+    """
+    Create the indexes, unique constraints and foreign keys `model` declares, as migrations would.
+    """
+    for field in model._meta.local_fields:
+        if field.db_index and not field.unique:
+            schema_editor.execute(schema_editor._create_index_sql(model, fields=[field]))
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(schema_editor._create_fk_sql(model, field, '_fk_%(to_table)s_%(to_column)s'))
+    for index in model._meta.indexes:
+        schema_editor.execute(index.create_sql(model, schema_editor))
+    for constraint in model._meta.constraints:
+        if partitioned and isinstance(constraint, models.UniqueConstraint):
+            constraint = models.UniqueConstraint(fields=[*constraint.fields, PARTITION_KEY], name=constraint.name,
+                                                 condition=constraint.condition)
+        schema_editor.execute(constraint.create_sql(model, schema_editor))
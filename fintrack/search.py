@@ -0,0 +1,70 @@
+import re
+
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.db.models import F
+
+# 'simple' keeps words as typed (no stemming or stop words), which suits the short,
+# often transliterated transaction titles better than a language dictionary.
+SEARCH_CONFIG = 'simple'
+
+# The weight each text column has in the search document, so a query can be limited to one column.
+COLUMN_WEIGHTS = {'title': 'A', 'description': 'B', 'transaction_type': 'C'}
+
+
+def search_vector():
+    """
+    The weighted document searched for a transaction.
+
+    The transaction search GIN index is built on this exact expression, so queries must
+    filter on it unchanged for Postgres to use the index.
+    """
+    return (
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('transaction_type', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def search_query(search_text: str, weights: str = ''):
+    """
+    Build a query matching documents that contain every word of the text, as a word prefix.
+
+    With `weights`, the words only match in the columns of those weights, see `COLUMN_WEIGHTS`.
+    Returns None if the text contains no searchable words.
+    """
+    terms = re.findall(r'\w+', search_text.lower())
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*{weights}' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search(queryset, search_text: str):
+    """
+    Filter a transaction queryset to the rows matching all words of the text, best matches first.
+    """
+    query = search_query(search_text)
+    if query is None:
+        return queryset.none()
+    return (
+        queryset
+        .annotate(search=search_vector())
+        .filter(search=query)
+        .annotate(rank=SearchRank(F('search'), query))
+        .order_by('-rank', '-created_at', '-id')
+    )
+
+
+def search_columns(queryset, column_texts: dict):
+    """
+    Filter a transaction queryset to the rows where each text column matches all words of its text.
+
+    The columns are matched through their weights in the indexed search document, so the index is
+    still used.
+    """
+    queries = [search_query(text, COLUMN_WEIGHTS[column]) for column, text in column_texts.items()]
+    if None in queries:
+        return queryset.none()
+    query = queries[0]
+    for other in queries[1:]:
+        query &= other
+    return queryset.annotate(column_search=search_vector()).filter(column_search=query)
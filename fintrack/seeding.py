@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from fintrack import ledger
+from fintrack.models import Transaction
+
+TITLES = ['Grocery', 'Rickshaw to office', 'Electricity bill', 'Restaurant', 'Salary']
+
+# Every fifth transaction is a salary, the others are expenses, one every few minutes going back from now.
+SEED_SQL = '''
+    INSERT INTO {table} (user_id, title, description, transaction_type, amount, created_at, updated_at)
+    SELECT %s,
+           (%s::text[])[i %% 5 + 1],
+           'Benchmark transaction ' || i,
+           CASE WHEN i %% 5 = 4 THEN 'balance' ELSE 'expense' END,
+           (i::bigint * 7919) %% 5000 + 1,
+           now() - i * %s * interval '1 minute',
+           now()
+    FROM generate_series(1, %s) AS i
+'''
+
+
+def seed_transactions(user_id: int, rows: int, minutes_apart: int = 1):
+    """
+    Replace a user's transactions with `rows` generated ones, `minutes_apart` minutes apart, and rebuild
+    the user's summary and rollups.
+
+    The rows are generated by the database, so seeding a million transactions takes seconds. The same
+    arguments always generate the same titles, types and amounts.
+    """
+    with transaction.atomic():
+        Transaction.objects.filter(user_id=user_id).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_SQL.format(table=Transaction._meta.db_table), [user_id, TITLES, minutes_apart, rows])
+        ledger.rebuild(user_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Transaction._meta.db_table}')
+
+
+def seed_user(email: str, rows: int, name: str = 'Benchmark', minutes_apart: int = 1):
+    """
+    Return the user with the given email, created if needed, with `rows` generated transactions.
+
+    Users that already have that many transactions are not seeded again.
+    """
+    user, _ = get_user_model().objects.get_or_create(email=email, defaults={'name': name})
+    if ledger.get_summary(user.id).transaction_count != rows:
+        seed_transactions(user.id, rows, minutes_apart)
+    return user
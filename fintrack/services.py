@@ -1,14 +1,26 @@
+import logging
 import os
-from datetime import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime, date, timedelta
 from typing import List, Literal, Dict, Optional
 
-from django.db.models import Sum, Case, When, F, Value, Q
-from django.db.models.fields import DecimalField
+from typing_extensions import TypedDict, NotRequired
 
-from fintrack.models import Transaction
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from agent.output import render_table, project
+from agent.tools import async_tool
+from fintrack import ledger
+from fintrack.models import Transaction, TransactionRollup
+from fintrack.search import search
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+logger = logging.getLogger(__name__)
+
 
 def create_transaction(user_id: int, title: str, description: Optional[str], amount: int,
                        transaction_type: Literal['balance', 'expense']):
@@ -27,19 +39,20 @@ def create_transaction(user_id: int, title: str, description: Optional[str], amo
        str: A message indicating whether the transaction was successfully recorded
            or an error occurred.
    """
-    print(
-        f'Creating transaction for user {user_id}: {title}, amount {amount}, type {transaction_type}, description {description}')
+    logger.debug('Creating transaction for user %s: %s, amount %s, type %s', user_id, title, amount, transaction_type)
     try:
-        Transaction.objects.create(
-            user_id=user_id,
-            title=title,
-            amount=amount,
-            description=description,
-            transaction_type=transaction_type,
-        )
+        with db_transaction.atomic():
+            transaction = Transaction.objects.create(
+                user_id=user_id,
+                title=title,
+                amount=amount,
+                description=description,
+                transaction_type=transaction_type,
+            )
+            ledger.record(added=[ledger.entry(transaction)])
         return f"Transaction recorded of type {transaction_type}"
     except Exception as e:
-        print(str(e))
+        logger.warning('Could not create transaction for user %s: %s', user_id, e)
         return f"Could not create transaction. Error: {str(e)}"
 
 
@@ -47,34 +60,116 @@ def get_current_balance(user_id: int):
     """
     Calculate and return the current balance for a given user.
 
-    This function sums all 'balance' type transactions and subtracts all 'expense'
-    type transactions for the specified user to compute their current balance.
+    The balance is read from the user's balance summary, which is kept up to date on every
+    transaction write, so the lookup does not depend on the size of the transaction history.
 
     Args:
         user_id (int): The ID of the user whose balance is being calculated.
 
     Returns:
-        Decimal: The user's current balance as a decimal number. Returns 0 if the user has no transactions.
-    """
-    print(f'Getting current balance for user {user_id}')
-    result = (
-        Transaction.objects.filter(user_id=user_id).aggregate(
-            current_balance=Sum(
-                Case(
-                    When(transaction_type=Transaction.Type.BALANCE, then=F('amount')),
-                    default=Value(0),
-                    output_field=DecimalField()
-                )
-            ) - Sum(
-                Case(
-                    When(transaction_type=Transaction.Type.EXPENSE, then=F('amount')),
-                    default=Value(0),
-                    output_field=DecimalField()
-                )
+        int: The user's current balance. Returns 0 if the user has no transactions.
+    """
+    logger.debug('Getting current balance for user %s', user_id)
+    return ledger.get_summary(user_id).current_balance
+
+
+TRANSACTION_FIELDS = ['id', 'title', 'transaction_type', 'amount', 'created_at', 'description']
+
+TransactionField = Literal['title', 'transaction_type', 'amount', 'created_at', 'description']
+
+
+def _encode_cursor(row: Dict) -> str:
+    value = f'{row["created_at"].isoformat()}|{row["id"]}'
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, transaction_id = urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except ValueError:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+def filter_transactions(user_id, transaction_type: Optional[str] = None, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None):
+    """
+    Return the queryset of a user's transactions, optionally of one type and created between two dates.
+
+    Raises:
+        ValueError: If a date is not a valid 'YYYY-MM-DD' date.
+    """
+    try:
+        transactions = Transaction.objects.filter(user_id=user_id)
+        if transaction_type:
+            transactions = transactions.filter(transaction_type=transaction_type)
+        if start_date:
+            transactions = transactions.filter(created_at__gte=start_date)
+        if end_date:
+            transactions = transactions.filter(created_at__lte=f'{end_date} 23:59:59')
+    except Exception as e:
+        raise ValueError(f"Error fetching transactions: {str(e)}")
+    return transactions
+
+
+def list_transactions(
+        user_id,
+        transaction_type: Optional[str] = None,
+        order_by: str = '-created_at',
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+        pagination: Literal['offset', 'cursor'] = 'offset',
+        cursor: Optional[str] = None,
+) -> List[Dict] | Dict:
+    """
+    Return a user's transactions as dictionaries, with the filters and paging of get_transactions.
+
+    Returns:
+        List[Dict]: With 'offset' pagination, the transactions, with the TRANSACTION_FIELDS keys.
+        Dict: With 'cursor' pagination, the 'transactions' and the 'next_cursor' of the following page,
+            or None if this is the last page.
+
+    Raises:
+        ValueError: If a date, the cursor or the ordering used with 'cursor' pagination is invalid.
+    """
+    limit = min(limit, 100)
+
+    transactions = filter_transactions(user_id, transaction_type, start_date, end_date)
+
+    if pagination == 'cursor':
+        return _get_transactions_page(transactions, order_by, limit, cursor)
+
+    transactions = transactions.order_by(order_by)[offset:offset + limit]
+    return list(transactions.values(*TRANSACTION_FIELDS))
+
+
+def _get_transactions_page(transactions, order_by: str, limit: int, cursor: Optional[str]) -> Dict:
+    if order_by not in ('created_at', '-created_at'):
+        raise ValueError("Cursor pagination only supports ordering by 'created_at' or '-created_at'.")
+
+    descending = order_by.startswith('-')
+    if cursor:
+        created_at, transaction_id = _decode_cursor(cursor)
+        if descending:
+            transactions = transactions.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=transaction_id)
+            )
+        else:
+            transactions = transactions.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=transaction_id)
             )
-        )
-    )
-    return result['current_balance'] if result['current_balance'] else 0
+
+    ordering = (order_by, '-id' if descending else 'id')
+    page = list(transactions.order_by(*ordering).values(*TRANSACTION_FIELDS)[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    return {
+        'transactions': page,
+        'next_cursor': _encode_cursor(page[-1]) if has_more else None,
+    }
 
 
 def get_transactions(
@@ -84,8 +179,11 @@ def get_transactions(
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
-) -> List[Dict]:
+        offset: int = 0,
+        pagination: Literal['offset', 'cursor'] = 'offset',
+        cursor: Optional[str] = None,
+        fields: Optional[List[TransactionField]] = None,
+) -> str:
     """
     Retrieve a list of a user's financial transactions filtered, ordered, and serialized.
     Can be used to get transaction records.
@@ -102,106 +200,176 @@ def get_transactions(
             created on or before this date.
         limit (int, optional): The maximum number of transactions to retrieve (max 100). Defaults to 100.
         offset (int, optional): The number of records to skip before returning results. Defaults to 0.
+            Only used with 'offset' pagination.
+        pagination (Literal['offset', 'cursor'], optional): Paging mode. Defaults to 'offset'.
+            - 'offset' pages with limit and offset.
+            - 'cursor' pages with the cursor given at the end of the previous page; every page is equally fast,
+              so prefer it to walk long histories. order_by must be 'created_at' or '-created_at'.
+        cursor (Optional[str], optional): The cursor given at the end of the previous page. Leave empty for the
+            first page. Only used with 'cursor' pagination.
+        fields (Optional[List[str]], optional): The columns to return besides 'id', among 'title',
+            'transaction_type', 'amount', 'created_at' and 'description'. Ask only for what the answer needs,
+            e.g. ['title', 'amount']. Defaults to all of them.
 
     Returns:
-        List[Dict]: A list of dictionaries representing transactions, where each dictionary contains:
-            - 'id': Transaction ID.
-            - 'user_id': User ID.
-            - 'transaction_type': 'balance' or 'expense'.
-            - 'amount': Transaction amount.
-            - 'description': Description of the transaction.
-            - 'created_at': Timestamp of creation (ISO 8601 string).
+        str: A table with a header line of column names, then one line per transaction with the values
+            separated by '|'. created_at is in UTC. When more transactions are available than shown, a last
+            line says so and gives the offset or cursor that fetches the rest.
 
     Raises:
-        ValueError: If an invalid date format is provided for start_date or end_date.
+        ValueError: If an invalid date format is provided for start_date or end_date, an unknown field is
+            requested, or an invalid cursor or ordering is used with 'cursor' pagination.
 
     Notes:
         - Transactions are retrieved using Django's ORM and limited to 100 records to ensure performance.
-        - If no transactions match the filters, an empty list is returned.
-        - This function ensures safe serialization of the transactions for external use.
+        - The table is cut off to stay within the token budget of tool results.
         - For descending ordering append '-' before filed name else it will be ordered in ascending order.
     """
-    print(f'Passed values', user_id, start_date, end_date, limit, offset, transaction_type)
-    limit = min(limit, 100)
+    logger.debug('Getting %s transactions for user %s from %s to %s, limit %s, offset %s, %s pagination',
+                 transaction_type, user_id, start_date, end_date, limit, offset, pagination)
+    columns = project(fields, TRANSACTION_FIELDS)
+    result = list_transactions(user_id, transaction_type, order_by, start_date, end_date, limit, offset,
+                               pagination, cursor)
 
-    try:
-        transactions = Transaction.objects.filter(
-            user_id=user_id, transaction_type=transaction_type
-        )
-        if start_date:
-            transactions = transactions.filter(created_at__gte=start_date)
-        if end_date:
-            transactions = transactions.filter(created_at__lte=f'{end_date} 23:59:59')
-        transactions = transactions.order_by(order_by)[offset:offset + limit]
-    except Exception as e:
-        raise f"Error fetching transactions: {str(e)}"
+    if pagination == 'cursor':
+        rows = result['transactions']
+        return render_table(rows, columns, has_more=result['next_cursor'] is not None,
+                            next_page=lambda shown: f'cursor={_encode_cursor(rows[shown - 1])}',
+                            empty='No transactions found.')
+
+    return render_table(result, columns, has_more=len(result) == min(limit, 100),
+                        next_page=lambda shown: f'offset={offset + shown}', empty='No transactions found.')
+
+
+def search_transactions(user_id: int, search_text: str, limit: int = 20, offset: int = 0,
+                        fields: Optional[List[TransactionField]] = None) -> str:
+    """
+    Search a user's transactions by keywords, best matches first.
 
-    print('fetched results: ', transactions)
+    Every word of the search text must appear, as a whole word or the beginning of one, in the transaction
+    title, description or transaction type. Pass the complete multi-word query in a single call; matches in
+    the title rank above matches in the description.
 
-    return [
-        {
-            'id': t.id,
-            'title': t.title,
-            'transaction_type': t.transaction_type,
-            'amount': t.amount,
-            'description': t.description,
-            'created_at': t.created_at.isoformat() if isinstance(t.created_at, datetime) else str(t.created_at),
-        }
-        for t in transactions
-    ]
+    Args:
+        user_id (int): The ID of the user whose transactions are searched.
+        search_text (str): The search text, e.g. 'rickshaw office'.
+        limit (int, optional): The maximum number of results to return (max 100). Defaults to 20.
+        offset (int, optional): The number of results to skip, for fetching the next page. Defaults to 0.
+        fields (Optional[List[str]], optional): The columns to return besides 'id', among 'title',
+            'transaction_type', 'amount', 'created_at' and 'description'. Defaults to all of them.
+    Returns:
+        str: A table with a header line of column names, then one line per transaction with the values
+            separated by '|', best matches first. When more results are available than shown, a last line
+            says so and gives the offset that fetches the rest.
+    """
+    logger.debug('Searching transactions of user %s for %r', user_id, search_text)
+    columns = project(fields, TRANSACTION_FIELDS)
+    limit = min(limit, 100)
+    transactions = search(Transaction.objects.filter(user_id=user_id), search_text)[offset:offset + limit]
+    rows = list(transactions.values(*TRANSACTION_FIELDS))
+    return render_table(rows, columns, has_more=len(rows) == limit,
+                        next_page=lambda shown: f'offset={offset + shown}', empty='No transactions found.')
 
 
-def search_transactions(search_text: str) -> List[Dict]:
+def get_spending_summary(
+        user_id: int,
+        bucket: Literal['day', 'week', 'month'] = 'month',
+        period: Literal['week', 'month', 'year', 'all'] = 'year',
+        transaction_type: Literal['balance', 'expense'] = 'expense',
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+) -> Dict:
     """
-    Search for transactions matching a search text. Searches are done for title, description, transaction type, and amount.
-    Better way of searching is to use words and use it for search_text, then join other words to narrow down the results.
+    Calculate a user's transaction totals grouped by day, week or month, e.g. the spending per month this year.
+    Prefer it to adding up the amounts of listed transactions.
+
     Args:
-        search_text (str): The search text.
+        user_id (int): The ID of the user whose transactions are summarized.
+        bucket (Literal['day', 'week', 'month'], optional): The length of the groups. Defaults to 'month'.
+        period (Literal['week', 'month', 'year', 'all'], optional): The period summarized when no start_date
+            is given: the current week (from Monday), month or year up to today, or all time. Defaults to 'year'.
+        transaction_type (Literal['balance', 'expense'], optional): The type of transactions summarized.
+            - 'balance' for deposits and income.
+            - 'expense' for spending. Defaults to 'expense'.
+        start_date (Optional[str], optional): A date string in 'YYYY-MM-DD' format. If provided, summarizes the
+            transactions made on or after this date instead of the period.
+        end_date (Optional[str], optional): A date string in 'YYYY-MM-DD' format. If provided, summarizes the
+            transactions made on or before this date.
+
     Returns:
-        List[Dict]: A list of dictionaries representing transactions, where each dictionary contains: Transaction details
-    """
-    print('Searching transactions...', search_text)
-    transactions = Transaction.objects.filter(
-        Q(title__icontains=search_text) |
-        Q(description__icontains=search_text) |
-        Q(transaction_type__icontains=search_text)
-    )[:20]
-    print('Fetched search results: ', transactions)
-    return [
-        {
-            'id': transaction.id,
-            'title': transaction.title,
-            'description': transaction.description,
-            'transaction_type': transaction.transaction_type,
-            'amount': transaction.amount,
-            'created_at': transaction.created_at.isoformat() if isinstance(transaction.created_at, datetime) else str(
-                transaction.created_at),
-        }
-        for transaction in transactions
-    ]
-
-
-def get_transaction_by_id(transaction_id: int) -> [Dict | str]:
+        Dict: A dictionary containing:
+            - 'transaction_type', 'bucket', 'start_date' and 'end_date': The summarized range; dates are None
+              when unbounded.
+            - 'total' and 'count': The total amount and number of transactions in the range.
+            - 'buckets': A list of the groups containing transactions, in date order, each with 'start' (the
+              first day of the group, 'YYYY-MM-DD'), 'total' and 'count'.
+
+    Raises:
+        ValueError: If an invalid bucket or period is given, or a date is not in 'YYYY-MM-DD' format.
+
+    Notes:
+        - Dates are days in the user's timezone (Asia/Dhaka).
+        - Totals are read from daily rollups kept up to date on every write, so the answer does not depend on
+          the size of the transaction history.
+    """
+    logger.debug('Getting %s summary of user %s by %s over %s', transaction_type, user_id, bucket, period)
+    if bucket not in ('day', 'week', 'month'):
+        raise ValueError(f'Invalid bucket: {bucket}')
+
+    today = timezone.localdate(timezone=ledger.ROLLUP_TIME_ZONE)
+    periods = {
+        'week': today - timedelta(days=today.weekday()),
+        'month': today.replace(day=1),
+        'year': today.replace(month=1, day=1),
+        'all': None,
+    }
+    if period not in periods:
+        raise ValueError(f'Invalid period: {period}')
+    start = date.fromisoformat(start_date) if start_date else periods[period]
+    end = date.fromisoformat(end_date) if end_date else None
+
+    rollups = TransactionRollup.objects.filter(user_id=user_id, transaction_type=transaction_type)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    rows = (
+        rollups
+        .annotate(start=Trunc('day', bucket, output_field=DateField()))
+        .values('start')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .filter(count__gt=0)
+        .order_by('start')
+    )
+    buckets = [{'start': row['start'].isoformat(), 'total': row['total'], 'count': row['count']} for row in rows]
+
+    return {
+        'transaction_type': transaction_type,
+        'bucket': bucket,
+        'start_date': start.isoformat() if start else None,
+        'end_date': end.isoformat() if end else None,
+        'total': sum(row['total'] for row in buckets),
+        'count': sum(row['count'] for row in buckets),
+        'buckets': buckets,
+    }
+
+
+def get_transaction_by_id(transaction_id: int, fields: Optional[List[TransactionField]] = None) -> str:
     """
     Retrieve a transaction by its ID.
     Args:
         transaction_id (int): The unique identifier of the transaction.
+        fields (Optional[List[str]], optional): The columns to return besides 'id', among 'title',
+            'transaction_type', 'amount', 'created_at' and 'description'. Defaults to all of them.
     Returns:
-        List[Dict]: A list of dictionaries representing transactions, where each dictionary contains: Transaction details,
-        or provides a string containing transaction not found and error from backend system.
+        str: A table with a header line of column names and a line with the transaction details separated
+            by '|', or a message saying the transaction was not found.
     """
-    print('Getting transaction by ID:', transaction_id)
+    logger.debug('Getting transaction %s', transaction_id)
+    columns = project(fields, TRANSACTION_FIELDS)
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
-        return {
-            'id': transaction.id,
-            'title': transaction.title,
-            'description': transaction.description,
-            'created_at': transaction.created_at.isoformat() if isinstance(transaction.created_at, datetime) else str(
-                transaction.created_at),
-            'transaction_type': transaction.transaction_type,
-            'amount': transaction.amount,
-        }
+        transaction = Transaction.objects.values(*TRANSACTION_FIELDS).get(id=transaction_id)
+        return render_table([transaction], columns)
     except Transaction.DoesNotExist as e:
         return f'Transaction not found: {str(e)}'
 
@@ -215,13 +383,218 @@ def update_transaction(transaction_id: int, update_fields: dict) -> str:
     Returns:
         str: The updated message.
     """
-    print('Updating transaction...', transaction_id, update_fields)
+    logger.debug('Updating transaction %s: %s', transaction_id, update_fields)
     try:
-        Transaction.objects.filter(id=transaction_id).update(**update_fields)
+        with db_transaction.atomic():
+            transaction = Transaction.objects.select_for_update().get(id=transaction_id)
+            before = ledger.entry(transaction)
+            Transaction.objects.filter(id=transaction_id).update(**update_fields)
+            transaction.refresh_from_db()
+            ledger.record(added=[ledger.entry(transaction)], removed=[before])
         return 'Transaction updated.'
     except Transaction.DoesNotExist as e:
         return f'Transaction not found: {str(e)}'
 
 
+class NewTransaction(TypedDict):
+    title: str
+    amount: int
+    transaction_type: Literal['balance', 'expense']
+    description: NotRequired[Optional[str]]
+
+
+class TransactionChange(TypedDict):
+    id: int
+    title: NotRequired[str]
+    description: NotRequired[Optional[str]]
+    amount: NotRequired[int]
+    transaction_type: NotRequired[Literal['balance', 'expense']]
+
+
+BATCH_FIELDS = ['title', 'description', 'amount', 'transaction_type']
+
+MAX_BATCH_SIZE = 100
+
+TITLE_MAX_LENGTH = Transaction._meta.get_field('title').max_length
+
+
+def _validate_fields(fields: dict) -> List[str]:
+    errors = []
+    unknown = set(fields) - set(BATCH_FIELDS)
+    if unknown:
+        errors.append(f'unknown fields {", ".join(sorted(unknown))}')
+    if 'title' in fields and (not isinstance(fields['title'], str) or not fields['title'].strip()
+                              or len(fields['title']) > TITLE_MAX_LENGTH):
+        errors.append(f'title must be a non-empty string of at most {TITLE_MAX_LENGTH} characters')
+    if 'description' in fields and not isinstance(fields['description'], (str, type(None))):
+        errors.append('description must be a string')
+    if 'amount' in fields and (isinstance(fields['amount'], bool) or not isinstance(fields['amount'], int)
+                               or fields['amount'] < 0):
+        errors.append('amount must be a non-negative integer')
+    if 'transaction_type' in fields and fields['transaction_type'] not in Transaction.Type.values:
+        errors.append("transaction_type must be 'balance' or 'expense'")
+    return errors
+
+
+def _batch_errors(items: list, validate) -> Optional[str]:
+    if not items:
+        return 'Nothing to do: no transactions given.'
+    if len(items) > MAX_BATCH_SIZE:
+        return f'Too many transactions in one call: {len(items)}, at most {MAX_BATCH_SIZE}.'
+    errors = [f'item {i + 1}: {"; ".join(item_errors)}'
+              for i, item in enumerate(items) if (item_errors := validate(item))]
+    if errors:
+        return 'Nothing was saved. Invalid items: ' + ' | '.join(errors)
+    return None
+
+
+def _batch_summary(verb: str, transactions) -> str:
+    totals = {}
+    for transaction in transactions:
+        totals[transaction.transaction_type] = totals.get(transaction.transaction_type, 0) + transaction.amount
+    ids = ', '.join(str(transaction.id) for transaction in transactions)
+    amounts = ', '.join(f'{transaction_type} {total}' for transaction_type, total in sorted(totals.items()))
+    return f'{verb} {len(transactions)} transactions (ids {ids}); totals: {amounts}.'
+
+
+def create_transactions(user_id: int, transactions: List[NewTransaction]) -> str:
+    """
+    Create several transactions for a user in one call, such as every item of "lunch 250, rickshaw 60, tea 20".
+
+    All items are validated first and then written together, so either every transaction is recorded
+    or none is.
+
+    Args:
+        user_id (int): The ID of the user who owns the transactions.
+        transactions (List[NewTransaction]): The transactions to record, each with a title, an amount,
+            a transaction_type of 'balance' (e.g., deposit, income) or 'expense' (e.g., spending)
+            and an optional description.
+
+    Returns:
+        str: A summary with the ids of the recorded transactions and the total amount per type,
+            or the reason nothing was recorded.
+    """
+    logger.debug('Creating %s transactions for user %s', len(transactions), user_id)
+
+    def validate(item):
+        missing = [name for name in ('title', 'amount', 'transaction_type') if name not in item]
+        return ([f'missing {", ".join(missing)}'] if missing else []) + _validate_fields(item)
+
+    errors = _batch_errors(transactions, validate)
+    if errors:
+        return errors
+
+    try:
+        with db_transaction.atomic():
+            created = Transaction.objects.bulk_create([
+                Transaction(user_id=user_id, title=item['title'], description=item.get('description') or '',
+                            amount=item['amount'], transaction_type=item['transaction_type'])
+                for item in transactions
+            ])
+            ledger.record(added=[ledger.entry(transaction) for transaction in created])
+        return _batch_summary('Recorded', created)
+    except Exception as e:
+        logger.warning('Could not create transactions for user %s: %s', user_id, e)
+        return f'Could not create transactions. Error: {str(e)}'
+
+
+def update_transactions(user_id: int, changes: List[TransactionChange]) -> str:
+    """
+    Update several transactions of a user in one call.
+
+    All changes are validated first and then written together, so either every transaction is updated
+    or none is.
+
+    Args:
+        user_id (int): The ID of the user who owns the transactions.
+        changes (List[TransactionChange]): The changes, each with the id of the transaction and the
+            fields to change among title, description, amount and transaction_type.
+
+    Returns:
+        str: A summary with the ids of the updated transactions and their new total amount per type,
+            or the reason nothing was updated.
+    """
+    logger.debug('Updating %s transactions for user %s', len(changes), user_id)
+
+    def validate(item):
+        if not isinstance(item.get('id'), int):
+            return ['missing id']
+        fields = {name: value for name, value in item.items() if name != 'id'}
+        return _validate_fields(fields) if fields else ['no fields to change']
+
+    errors = _batch_errors(changes, validate)
+    if errors:
+        return errors
+
+    ids = [item['id'] for item in changes]
+    if len(set(ids)) != len(ids):
+        return 'Nothing was saved. Each transaction may only appear once.'
+
+    with db_transaction.atomic():
+        transactions = Transaction.objects.select_for_update().filter(user_id=user_id, id__in=ids).in_bulk()
+        missing = [str(i) for i in ids if i not in transactions]
+        if missing:
+            return f'Nothing was saved. Transactions not found: {", ".join(missing)}.'
+
+        before = [ledger.entry(transaction) for transaction in transactions.values()]
+        now = timezone.now()
+        fields = {'updated_at'}
+        for item in changes:
+            transaction = transactions[item['id']]
+            for name, value in item.items():
+                if name != 'id':
+                    setattr(transaction, name, '' if value is None else value)
+                    fields.add(name)
+            transaction.updated_at = now
+        updated = [transactions[i] for i in ids]
+        Transaction.objects.bulk_update(updated, sorted(fields))
+        ledger.record(added=[ledger.entry(transaction) for transaction in updated], removed=before)
+    return _batch_summary('Updated', updated)
+
+
+def delete_transactions(user_id: int, transaction_ids: List[int]) -> str:
+    """
+    Delete several transactions of a user in one call.
+
+    Either every transaction is deleted or, if any of them does not exist, none is.
+
+    Args:
+        user_id (int): The ID of the user who owns the transactions.
+        transaction_ids (List[int]): The IDs of the transactions to delete.
+
+    Returns:
+        str: The number of deleted transactions, or the reason nothing was deleted.
+    """
+    logger.debug('Deleting transactions %s for user %s', transaction_ids, user_id)
+    errors = _batch_errors(transaction_ids, lambda i: [] if isinstance(i, int) else ['not a transaction id'])
+    if errors:
+        return errors
+
+    ids = set(transaction_ids)
+    with db_transaction.atomic():
+        queryset = Transaction.objects.filter(user_id=user_id, id__in=ids)
+        found = set(queryset.select_for_update().values_list('id', flat=True))
+        if found != ids:
+            return f'Nothing was deleted. Transactions not found: {", ".join(map(str, sorted(ids - found)))}.'
+        deleted = ledger.delete(queryset)
+    return f'Deleted {deleted} transactions (ids {", ".join(map(str, sorted(ids)))}).'
+
+
+acreate_transaction = async_tool(create_transaction)
+asearch_transactions = async_tool(search_transactions)
+aget_transaction_by_id = async_tool(get_transaction_by_id)
+aupdate_transaction = async_tool(update_transaction)
+aget_transactions = async_tool(get_transactions)
+aget_current_balance = async_tool(get_current_balance)
+aget_spending_summary = async_tool(get_spending_summary)
+alist_transactions = async_tool(list_transactions)
+acreate_transactions = async_tool(create_transactions)
+aupdate_transactions = async_tool(update_transactions)
+adelete_transactions = async_tool(delete_transactions)
+
 __all__ = ['create_transaction', 'search_transactions', 'get_transaction_by_id', 'update_transaction',
-           'get_transactions', 'get_current_balance']
+           'get_transactions', 'get_current_balance', 'get_spending_summary', 'create_transactions',
+           'update_transactions', 'delete_transactions',
+           'acreate_transaction', 'asearch_transactions', 'aget_transaction_by_id', 'aupdate_transaction',
+           'aget_transactions', 'aget_current_balance', 'aget_spending_summary', 'acreate_transactions',
+           'aupdate_transactions', 'adelete_transactions']
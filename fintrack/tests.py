@@ -1,3 +1,580 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from fintrack import ledger, partitions
+from fintrack.importer import import_transactions, parse_datetime
+from fintrack.models import Transaction, TransactionRollup
+from fintrack.search import search
+from fintrack.seeding import seed_transactions
+from fintrack.services import (
+    get_current_balance, get_transactions, list_transactions, search_transactions, get_transaction_by_id,
+    get_spending_summary, create_transaction, create_transactions, update_transaction, update_transactions,
+    delete_transactions, MAX_BATCH_SIZE,
+)
+from fintrack.views import TransactionExport, TransactionListJson
+
+SEEDED_ROWS = 1000
+
+
+def datatable_query(search_text='', start=0, length=25, **column_search):
+    query = {'draw': 1, 'start': start, 'length': length, 'search[value]': search_text,
+             'order[0][column]': 3, 'order[0][dir]': 'desc'}
+    for i, column in enumerate(['title', 'amount', 'transaction_type', 'created_at', 'id']):
+        query.update({f'columns[{i}][data]': column, f'columns[{i}][name]': '',
+                      f'columns[{i}][searchable]': 'true', f'columns[{i}][orderable]': 'true',
+                      f'columns[{i}][search][value]': column_search.get(column, '')})
+    return query
+
+
+class SeededTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='queries@example.com', name='Queries')
+        seed_transactions(cls.user.id, SEEDED_ROWS)
+        cls.ids = list(Transaction.objects.filter(user=cls.user).order_by('id').values_list('id', flat=True)[:3])
+
+    def assertLedgerConsistent(self):
+        summary = ledger.get_summary(self.user.id)
+        totals = ledger.compute(self.user.id)
+        self.assertEqual(summary.current_balance, totals['balance_total'] - totals['expense_total'])
+        self.assertEqual(summary.transaction_count, totals['balance_count'] + totals['expense_count'])
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='first-writes@example.com', name='First writes')
+
+    def test_concurrent_first_writes(self):
+        # The first writer seeds the summary and holds it uncommitted while the second writer records.
+        seeded = threading.Event()
+
+        # Of different types, so the writers do not wait on each other's daily rollup rows.
+        def write(transaction_type, amount, first):
+            try:
+                with transaction.atomic():
+                    instance = Transaction.objects.create(user_id=self.user.id, title='First write', amount=amount,
+                                                          transaction_type=transaction_type)
+                    if not first:
+                        seeded.wait(5)
+                    ledger.record(added=[ledger.entry(instance)])
+                    if first:
+                        seeded.set()
+                        threading.Event().wait(0.2)
+            finally:
+                connection.close()
+
+        writers = [threading.Thread(target=write, args=(Transaction.Type.BALANCE, 100, True)),
+                   threading.Thread(target=write, args=(Transaction.Type.EXPENSE, 30, False))]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        summary = ledger.get_summary(self.user.id)
+        self.assertEqual((summary.current_balance, summary.transaction_count), (70, 2))
+
+
+class ServiceQueryCountTests(SeededTestCase):
+    """
+    Every agent tool service runs a fixed number of queries, whatever the number of rows it reads.
+    """
+
+    def test_get_current_balance(self):
+        with self.assertNumQueries(1):
+            get_current_balance(self.user.id)
+
+    def test_get_transactions(self):
+        for limit in (1, 100):
+            with self.assertNumQueries(1):
+                output = get_transactions(self.user.id, 'expense', limit=limit)
+            self.assertTrue(output.startswith('id|title|'))
+
+    def test_get_transactions_cursor(self):
+        with self.assertNumQueries(1):
+            output = get_transactions(self.user.id, 'expense', limit=20, pagination='cursor')
+        cursor = output.splitlines()[-1].split('cursor=')[1]
+        with self.assertNumQueries(1):
+            get_transactions(self.user.id, 'expense', limit=20, pagination='cursor', cursor=cursor)
+
+    def test_search_transactions(self):
+        with self.assertNumQueries(1):
+            output = search_transactions(self.user.id, 'rickshaw office', limit=100)
+        self.assertIn('Rickshaw to office', output)
+
+    def test_get_transaction_by_id(self):
+        with self.assertNumQueries(1):
+            get_transaction_by_id(self.ids[0])
+
+    def test_get_spending_summary(self):
+        with self.assertNumQueries(1):
+            summary = get_spending_summary(self.user.id, bucket='day', period='month')
+        self.assertGreater(summary['count'], 0)
+
+    def test_create_transaction(self):
+        with self.assertNumQueries(5):
+            create_transaction(self.user.id, 'Tea', '', 20, 'expense')
+        self.assertLedgerConsistent()
+
+    def test_create_transactions(self):
+        items = [{'title': title, 'amount': 10, 'transaction_type': 'expense'} for title in ('Tea', 'Bus', 'Bread')]
+        with self.assertNumQueries(5):
+            create_transactions(self.user.id, items)
+        self.assertLedgerConsistent()
+
+    def test_update_transaction(self):
+        with self.assertNumQueries(7):
+            update_transaction(self.ids[0], {'amount': 10})
+        self.assertLedgerConsistent()
+
+    def test_update_transactions(self):
+        with self.assertNumQueries(6):
+            update_transactions(self.user.id, [{'id': i, 'amount': 10} for i in self.ids])
+        self.assertLedgerConsistent()
+
+    def test_delete_transactions(self):
+        with self.assertNumQueries(9):
+            delete_transactions(self.user.id, self.ids)
+        self.assertLedgerConsistent()
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='batch@example.com', name='Batch')
+        create_transactions(self.user.id, [{'title': title, 'amount': 10, 'transaction_type': 'expense'}
+                                           for title in ('Tea', 'Bus', 'Bread')])
+        self.ids = sorted(Transaction.objects.filter(user=self.user).values_list('id', flat=True))
+
+    def rows(self):
+        return sorted(Transaction.objects.filter(user=self.user).values_list('id', 'title', 'amount'))
+
+    def assertNothingSaved(self, output, before):
+        self.assertTrue(output.startswith('Nothing was'), output)
+        self.assertEqual(self.rows(), before)
+        self.assertEqual(ledger.get_summary(self.user.id).expense_total, 30)
+
+    def test_create(self):
+        output = create_transactions(self.user.id, [{'title': 'Lunch', 'amount': 250, 'transaction_type': 'expense'},
+                                                    {'title': 'Salary', 'amount': 900, 'transaction_type': 'balance'}])
+        self.assertIn('Recorded 2 transactions', output)
+        self.assertIn('totals: balance 900, expense 250', output)
+        self.assertEqual(ledger.get_summary(self.user.id).transaction_count, 5)
+
+    def test_create_invalid_item_saves_nothing(self):
+        before = self.rows()
+        output = create_transactions(self.user.id, [{'title': 'Lunch', 'amount': 250, 'transaction_type': 'expense'},
+                                                    {'title': 'Tea', 'amount': -5, 'transaction_type': 'expense'},
+                                                    {'title': 'Bus', 'amount': 60}])
+        self.assertIn('item 2: amount must be a non-negative integer', output)
+        self.assertIn('item 3: missing transaction_type', output)
+        self.assertNotIn('item 1', output)
+        self.assertNothingSaved(output, before)
+
+    def test_update(self):
+        output = update_transactions(self.user.id, [{'id': self.ids[0], 'amount': 40},
+                                                    {'id': self.ids[1], 'title': 'Rickshaw'}])
+        self.assertIn('Updated 2 transactions', output)
+        self.assertEqual(self.rows(), [(self.ids[0], 'Tea', 40), (self.ids[1], 'Rickshaw', 10),
+                                       (self.ids[2], 'Bread', 10)])
+        self.assertEqual(ledger.get_summary(self.user.id).expense_total, 60)
+
+    def test_update_invalid_or_missing_item_saves_nothing(self):
+        before = self.rows()
+        self.assertNothingSaved(update_transactions(self.user.id, [{'id': self.ids[0], 'amount': 40},
+                                                                   {'id': self.ids[1], 'colour': 'red'}]), before)
+        self.assertNothingSaved(update_transactions(self.user.id, [{'id': self.ids[0], 'amount': 40},
+                                                                   {'id': self.ids[0], 'amount': 50}]), before)
+        output = update_transactions(self.user.id, [{'id': self.ids[0], 'amount': 40}, {'id': 0, 'amount': 50}])
+        self.assertIn('Transactions not found: 0', output)
+        self.assertNothingSaved(output, before)
+
+    def test_delete(self):
+        self.assertEqual(delete_transactions(self.user.id, self.ids[:2]),
+                         f'Deleted 2 transactions (ids {self.ids[0]}, {self.ids[1]}).')
+        self.assertEqual(ledger.get_summary(self.user.id).transaction_count, 1)
+
+    def test_delete_missing_item_deletes_nothing(self):
+        before = self.rows()
+        other = get_user_model().objects.create_user(email='other-batch@example.com', name='Other')
+        create_transaction(other.id, 'Tea', '', 20, 'expense')
+        other_id = Transaction.objects.get(user=other).id
+        output = delete_transactions(self.user.id, [self.ids[0], other_id])
+        self.assertIn(f'Transactions not found: {other_id}', output)
+        self.assertNothingSaved(output, before)
+        self.assertNothingSaved(delete_transactions(self.user.id, [self.ids[0], 'tea']), before)
+
+    def test_batch_size_limit(self):
+        before = self.rows()
+        items = [{'title': 'Tea', 'amount': 20, 'transaction_type': 'expense'}] * (MAX_BATCH_SIZE + 1)
+        for output in (create_transactions(self.user.id, items),
+                       update_transactions(self.user.id, [{'id': self.ids[0], 'amount': 1}] * (MAX_BATCH_SIZE + 1)),
+                       delete_transactions(self.user.id, list(range(MAX_BATCH_SIZE + 1)))):
+            self.assertEqual(output, f'Too many transactions in one call: {MAX_BATCH_SIZE + 1}, '
+                                     f'at most {MAX_BATCH_SIZE}.')
+        self.assertEqual(self.rows(), before)
+        self.assertIn('Recorded 100 transactions', create_transactions(self.user.id, items[:MAX_BATCH_SIZE]))
+
+    def test_empty_batch(self):
+        for output in (create_transactions(self.user.id, []), update_transactions(self.user.id, []),
+                       delete_transactions(self.user.id, [])):
+            self.assertEqual(output, 'Nothing to do: no transactions given.')
+
+
+class RollupTests(TestCase):
+    """
+    Daily rollups count transactions on their day in Asia/Dhaka, six hours ahead of UTC.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='rollups@example.com', name='Rollups')
+
+    def rollups(self):
+        return sorted(TransactionRollup.objects.filter(user=self.user).values_list('day', 'total', 'count'))
+
+    def test_days_in_dhaka(self):
+        times = [datetime(2026, 3, 1, 17, 30, tzinfo=dt_timezone.utc),  # 23:30 on 1 March in Dhaka
+                 datetime(2026, 3, 1, 18, 30, tzinfo=dt_timezone.utc),  # 00:30 on 2 March
+                 datetime(2026, 3, 2, 10, 0, tzinfo=dt_timezone.utc)]
+        for amount, created_at in zip((10, 20, 30), times):
+            instance = Transaction.objects.create(user=self.user, title='Tea', amount=amount,
+                                                  transaction_type='expense')
+            Transaction.objects.filter(id=instance.id).update(created_at=created_at)
+        ledger.rebuild(self.user.id)
+        expected = [(date(2026, 3, 1), 10, 1), (date(2026, 3, 2), 50, 2)]
+        self.assertEqual(self.rollups(), expected)
+
+        ledger.record(added=[ledger.Entry(self.user.id, 'expense', 5, times[1])],
+                      removed=[ledger.Entry(self.user.id, 'expense', 10, times[0])])
+        self.assertEqual(self.rollups(), [(date(2026, 3, 1), 0, 0), (date(2026, 3, 2), 55, 3)])
+
+        summary = get_spending_summary(self.user.id, bucket='day', start_date='2026-03-01', end_date='2026-03-02')
+        self.assertEqual(summary['buckets'], [{'start': '2026-03-02', 'total': 55, 'count': 3}])
+        summary = get_spending_summary(self.user.id, bucket='month', period='all')
+        self.assertEqual(summary['buckets'], [{'start': '2026-03-01', 'total': 55, 'count': 3}])
+
+
+OFX_STATEMENT = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260305120000[+6:BDT]<TRNAMT>-250.50<FITID>F1<NAME>Grocery<MEMO>Weekly shop
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260301<TRNAMT>30000<FITID>F2<NAME>Salary
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='importer@example.com', name='Importer')
+
+    def imported(self):
+        return list(Transaction.objects.filter(user=self.user).order_by('created_at', 'id')
+                    .values_list('title', 'transaction_type', 'amount'))
+
+    def test_date_orders(self):
+        self.assertEqual(parse_datetime('03/04/2026').date(), date(2026, 4, 3))
+        self.assertEqual(parse_datetime('03/04/2026', 'MDY').date(), date(2026, 3, 4))
+        self.assertEqual(parse_datetime('25/03/2026', 'auto').date(), date(2026, 3, 25))
+        self.assertEqual(parse_datetime('03/25/2026', 'auto').date(), date(2026, 3, 25))
+        self.assertEqual(parse_datetime('03/03/2026', 'auto').date(), date(2026, 3, 3))
+        self.assertEqual(parse_datetime('4 March 2026', 'MDY').date(), date(2026, 3, 4))
+        with self.assertRaisesRegex(ValueError, 'Ambiguous'):
+            parse_datetime('03/04/2026', 'auto')
+        with self.assertRaisesRegex(ValueError, 'Invalid date'):
+            parse_datetime('03/25/2026')
+
+    def test_csv(self):
+        statement = ('Posting Date,Payee,Memo,Withdrawal,Deposit\n'
+                     '03/25/2026,Rickshaw,To office,60,\n'
+                     '03/04/2026,Salary,,,"50,000"\n'
+                     'yesterday,Tea,,20,\n'
+                     '03/25/2026,Rickshaw,To office,60,\n')
+        result = import_transactions(self.user.id, io.StringIO(statement), 'csv', date_order='MDY')
+        self.assertEqual((result.read, result.inserted, result.invalid), (4, 3, 1))
+        self.assertEqual(result.errors, [{'line': 4, 'error': "Invalid date: 'yesterday'"}])
+        # Identical rows of a statement are distinct transactions, a ride there and back.
+        self.assertEqual(self.imported(), [('Salary', 'balance', 50000), ('Rickshaw', 'expense', 60),
+                                           ('Rickshaw', 'expense', 60)])
+        self.assertEqual(get_current_balance(self.user.id), 49880)
+
+        result = import_transactions(self.user.id, io.StringIO(statement), 'csv', date_order='MDY')
+        self.assertEqual((result.inserted, result.duplicates), (0, 3))
+        self.assertEqual(get_current_balance(self.user.id), 49880)
+
+    def test_ambiguous_dates_are_rejected(self):
+        statement = 'date,title,amount\n03/04/2026,Tea,-20\n13/04/2026,Bus,-30\n'
+        result = import_transactions(self.user.id, io.StringIO(statement), 'csv', date_order='auto')
+        self.assertEqual((result.inserted, result.invalid), (1, 1))
+        self.assertEqual(self.imported(), [('Bus', 'expense', 30)])
+
+    def test_ofx_imported_once(self):
+        result = import_transactions(self.user.id, io.StringIO(OFX_STATEMENT), 'ofx')
+        self.assertEqual((result.read, result.inserted), (2, 2))
+        self.assertEqual(self.imported(), [('Salary', 'balance', 30000), ('Grocery', 'expense', 251)])
+        grocery = Transaction.objects.get(user=self.user, external_id='F1')
+        self.assertEqual(grocery.created_at, datetime(2026, 3, 5, 6, tzinfo=dt_timezone.utc))
+        self.assertEqual(grocery.description, 'Weekly shop')
+
+        result = import_transactions(self.user.id, io.StringIO(OFX_STATEMENT), 'ofx')
+        self.assertEqual((result.inserted, result.duplicates), (0, 2))
+        self.assertEqual(get_current_balance(self.user.id), 30000 - 251)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='cursor@example.com', name='Cursor')
+        Transaction.objects.bulk_create(Transaction(user=self.user, title=f'Tea {i}', amount=10,
+                                                    transaction_type='expense') for i in range(7))
+        # Rows of the same instant are ordered by their id.
+        Transaction.objects.filter(user=self.user).update(created_at=timezone.now())
+        self.ids = sorted(Transaction.objects.filter(user=self.user).values_list('id', flat=True))
+
+    def walk(self, order_by):
+        ids, cursor = [], None
+        while True:
+            page = list_transactions(self.user.id, 'expense', order_by, limit=3, pagination='cursor', cursor=cursor)
+            ids += [row['id'] for row in page['transactions']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_pages_over_equal_created_at(self):
+        self.assertEqual(self.walk('-created_at'), self.ids[::-1])
+        self.assertEqual(self.walk('created_at'), self.ids)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            list_transactions(self.user.id, 'expense', pagination='cursor', cursor='not-a-cursor')
+        with self.assertRaises(ValueError):
+            list_transactions(self.user.id, 'expense', 'amount', pagination='cursor')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='search@example.com', name='Search')
+        other = get_user_model().objects.create_user(email='search-other@example.com', name='Other')
+        rows = [
+            (self.user, 'Rickshaw to office', ''),
+            (self.user, 'Rickshaw home', 'Back from the office'),
+            (self.user, 'Office lunch', ''),
+            (other, 'Rickshaw to office', ''),
+        ]
+        Transaction.objects.bulk_create(Transaction(user=user, title=title, description=description, amount=10,
+                                                    transaction_type='expense') for user, title, description in rows)
+
+    def titles(self, search_text):
+        return [row.title for row in search(Transaction.objects.filter(user=self.user), search_text)]
+
+    def test_every_word_as_prefix(self):
+        self.assertEqual(self.titles('rick offi'), ['Rickshaw to office', 'Rickshaw home'])
+        self.assertEqual(self.titles('rickshaw lunch'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    def test_scoped_to_the_user(self):
+        output = search_transactions(self.user.id, 'rickshaw office')
+        self.assertEqual(len(output.splitlines()), 3)
+
+
+class ViewQueryCountTests(SeededTestCase):
+    """
+    The transaction views run a fixed number of queries, two of which load the session and the user.
+    """
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_transaction_list(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('fintrack:transactions-list'), datatable_query())
+        self.assertEqual(response.json()['recordsTotal'], SEEDED_ROWS)
+
+    def test_transaction_list_page(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse('fintrack:transactions-list'), datatable_query(start=500))
+
+    def test_transaction_list_search(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('fintrack:transactions-list'), datatable_query('rickshaw office'))
+        self.assertEqual(response.json()['recordsFiltered'], SEEDED_ROWS // 5)
+        self.assertFalse(response.json()['recordsFilteredCapped'])
+
+    def test_transaction_list_column_search(self):
+        url = reverse('fintrack:transactions-list')
+        with self.assertNumQueries(5):
+            response = self.client.get(url, datatable_query(title='rick', transaction_type='expense'))
+        self.assertEqual(response.json()['recordsFiltered'], SEEDED_ROWS // 5)
+        # 'benchmark' is only in the descriptions.
+        self.assertEqual(self.client.get(url, datatable_query(title='benchmark')).json()['recordsFiltered'], 0)
+        self.assertEqual(self.client.get(url, datatable_query(transaction_type='balance')).json()['recordsFiltered'],
+                         SEEDED_ROWS // 5)
+        self.assertEqual(self.client.get(url, datatable_query(id=str(self.ids[0]))).json()['recordsFiltered'], 1)
+        self.assertEqual(self.client.get(url, datatable_query(amount='ten')).json()['recordsFiltered'], 0)
+
+    def test_transaction_list_capped_count(self):
+        with mock.patch.object(TransactionListJson, 'max_count', 50):
+            response = self.client.get(reverse('fintrack:transactions-list'), datatable_query('salary'))
+        self.assertEqual(response.json()['recordsFiltered'], 50)
+        self.assertTrue(response.json()['recordsFilteredCapped'])
+
+    def test_transaction_detail(self):
+        with self.assertNumQueries(3):
+            self.client.get(reverse('fintrack:transactions-detail', args=[self.ids[0]]))
+
+    def test_spending_summary(self):
+        with self.assertNumQueries(3):
+            self.client.get(reverse('fintrack:transactions-summary'))
+
+    def test_transaction_export(self):
+        start_date = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.async_client.force_login(self.user)
+
+        async def download():
+            response = await self.async_client.get(reverse('fintrack:transactions-export', args=['csv']),
+                                                   {'start_date': start_date})
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        with self.assertNumQueries(3):
+            content = async_to_sync(download)()
+        self.assertGreater(content.count(b'\n'), 1)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='export@example.com', name='Export')
+        seed_transactions(cls.user.id, 25)
+
+    async def export(self, file_format):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(TransactionExport, 'chunk_size', 10):
+            response = await self.async_client.get(reverse('fintrack:transactions-export', args=[file_format]))
+            self.assertTrue(response.is_async)
+            return [chunk async for chunk in response.streaming_content]
+
+    async def test_csv_in_chunks(self):
+        chunks = await self.export('csv')
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [11, 10, 5])
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual(rows[0], TransactionExport.fields)
+        ids = [int(row[0]) for row in rows[1:]]
+        self.assertEqual(ids, [pk async for pk in Transaction.objects.filter(user=self.user)
+                               .order_by('created_at', 'id').values_list('id', flat=True)])
+
+    async def test_ndjson_in_chunks(self):
+        chunks = await self.export('ndjson')
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [10, 10, 5])
+        rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual(rows[0].keys(), set(TransactionExport.fields))
+        self.assertEqual(len({row['id'] for row in rows}), 25)
+
+
+class PartitionTests(TestCase):
+    """
+    The agent tool services and imports work the same on the transactions table partitioned by month,
+    including over archived partitions. The conversions are rolled back with the test.
+    """
+
+    def setUp(self):
+        if partitions.is_partitioned():
+            self.convert(partitioned=False)
+        self.user = get_user_model().objects.create_user(email='partitions@example.com', name='Partitions')
+        # One a day for about seven months.
+        seed_transactions(self.user.id, 200, minutes_apart=24 * 60)
+        self.calls = [
+            lambda: get_transactions(self.user.id, 'expense', limit=20),
+            lambda: get_transactions(self.user.id, 'expense', start_date=self.days_ago(40), end_date=self.days_ago(10)),
+            lambda: search_transactions(self.user.id, 'rickshaw office'),
+            lambda: get_current_balance(self.user.id),
+        ]
+
+    @staticmethod
+    def days_ago(days):
+        return (timezone.now() - timedelta(days=days)).date().isoformat()
+
+    def convert(self, partitioned):
+        with connection.schema_editor() as schema_editor:
+            if partitioned:
+                partitions.partition_table(schema_editor, months_ahead=1)
+            else:
+                partitions.unpartition_table(schema_editor)
+        self.assertEqual(partitions.is_partitioned(), partitioned)
+
+    def test_services_over_partitions(self):
+        expected = [call() for call in self.calls]
+        last_id = Transaction.objects.latest('id').id
+        oldest = Transaction.objects.earliest('created_at').created_at.astimezone(dt_timezone.utc).date()
+        # One partition a month from the oldest row's month to the next month, then the default partition.
+        month = partitions.month_start(oldest)
+        last = partitions.add_months(partitions.month_start(timezone.now().date()), 1)
+        expected_months = []
+        while month <= last:
+            expected_months.append(month)
+            month = partitions.next_month(month)
+
+        self.convert(partitioned=True)
+        months = [partition.month for partition in partitions.list_partitions()]
+        self.assertEqual(months, [*expected_months, None])
+        self.assertEqual([call() for call in self.calls], expected)
+
+        archived = partitions.archive_partitions(partitions.add_months(months[0], 3), 'pg_default')
+        self.assertEqual(len(archived), 3)
+        self.assertEqual([call() for call in self.calls], expected)
+
+        create_transaction(self.user.id, 'Rickshaw home', '', 60, 'expense')
+        self.assertGreater(Transaction.objects.latest('id').id, last_id)
+        self.convert(partitioned=False)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 201)
+        create_transaction(self.user.id, 'Rickshaw again', '', 60, 'expense')
+
+    def test_new_partition_takes_rows_from_default(self):
+        self.convert(partitioned=True)
+        table, this_month = Transaction._meta.db_table, partitions.month_start(timezone.now().date())
+        later = partitions.add_months(this_month, 3)
+        Transaction.objects.filter(id=Transaction.objects.latest('id').id).update(
+            created_at=timezone.now().replace(year=later.year, month=later.month, day=2))
+
+        self.assertEqual(partitions.create_partitions(3), [
+            partitions.partition_name(table, partitions.add_months(this_month, 2)),
+            partitions.partition_name(table, later),
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partitions.partition_name(table, later)}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute(f'SELECT count(*) FROM {partitions.default_partition_name(table)}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(partitions.create_partitions(3), [])
+
+    def test_import_skips_imported_rows(self):
+        self.convert(partitioned=True)
+        statement = 'date,title,amount,id\n01/09/2026,Rickshaw,-60,T1\n02/09/2026,Salary,5000,T2\n'
+        self.assertEqual(import_transactions(self.user.id, io.StringIO(statement), 'csv').inserted, 2)
+        self.assertEqual(import_transactions(self.user.id, io.StringIO(statement), 'csv').inserted, 0)
+
+    def test_import_skips_imported_rows_with_corrected_dates(self):
+        # The same bank IDs months apart land in different partitions, out of reach of the unique index.
+        self.convert(partitioned=True)
+        statement = 'date,title,amount,id\n01/09/2026,Rickshaw,-60,T1\n02/09/2026,Salary,5000,T2\n'
+        corrected = 'date,title,amount,id\n01/03/2026,Rickshaw,-60,T1\n02/03/2026,Salary,5000,T2\n'
+        self.assertEqual(import_transactions(self.user.id, io.StringIO(statement), 'csv').inserted, 2)
+        balance = ledger.get_summary(self.user.id).current_balance
+
+        result = import_transactions(self.user.id, io.StringIO(corrected), 'csv')
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(result.duplicates, 2)
+        self.assertEqual(self.user.transactions.filter(external_id__in=['T1', 'T2']).count(), 2)
+        self.assertEqual(ledger.get_summary(self.user.id).current_balance, balance)
+
+    def test_import_skips_repeated_rows_of_a_statement(self):
+        self.convert(partitioned=True)
+        statement = 'date,title,amount,id\n01/09/2026,Rickshaw,-60,T1\n01/03/2026,Rickshaw,-60,T1\n'
+        self.assertEqual(import_transactions(self.user.id, io.StringIO(statement), 'csv').inserted, 1)
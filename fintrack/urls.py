@@ -1,10 +1,14 @@
 from django.urls import path, re_path
 
-from fintrack.views import HomePageView, TransactionListJson, TransactionPageView, TransactionDetail
+from fintrack.views import HomePageView, TransactionListJson, TransactionPageView, TransactionDetail, \
+    SpendingSummaryJson, TransactionImport, TransactionExport
 
 urlpatterns = [
     path('', HomePageView.as_view(), name='home'),
     path('transactions/', TransactionPageView.as_view(), name='transactions'),
     re_path(r'^datatable/data/$', TransactionListJson.as_view(), name='transactions-list'),
     path('transactions/<int:pk>/', TransactionDetail.as_view(), name='transactions-detail'),
+    path('transactions/summary/', SpendingSummaryJson.as_view(), name='transactions-summary'),
+    path('transactions/import/', TransactionImport.as_view(), name='transactions-import'),
+    re_path(r'^transactions/export\.(?P<format>csv|ndjson)$', TransactionExport.as_view(), name='transactions-export'),
 ]
@@ -1,17 +1,29 @@
+import csv
+import io
 import json
+from datetime import date
+from itertools import islice
+from pathlib import Path
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.core import serializers
-from django.http import JsonResponse
+from django.db import transaction as db_transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 from django_datatables_view.base_datatable_view import BaseDatatableView
 from django_datatables_view.mixins import JSONResponseView
 
+from . import ledger
 from .forms import TransactionForm
+from .importer import FORMATS, import_transactions
 from .models import Transaction
+from .search import COLUMN_WEIGHTS, search, search_columns
+from .services import get_spending_summary, filter_transactions
 
 
 class HomePageView(TemplateView):
@@ -27,15 +39,82 @@ class TransactionPageView(TemplateView):
 
 
 class TransactionListJson(BaseDatatableView):
+    """
+    DataTables feed of the user's transactions.
+
+    The total is read from the user's balance summary instead of counted, the global and the text column
+    searches use the indexed full text search, and the number of search results is only counted up to
+    `max_count`. `recordsFilteredCapped` is set when the filtered count stopped at that cap.
+    """
     model = Transaction
     columns = ['title', 'amount', 'transaction_type', 'created_at', 'description', 'id']
-    order_columns = ['title', 'amount', '', 'created_at']
+    order_columns = ['title', 'amount', 'transaction_type', 'created_at', 'id']
     max_display_length = 100
+    max_count = 10000
+    search_text = ''
+    filtered = False
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    def get_initial_queryset(self):
+        self.search_text = self._querydict.get('search[value]', '').strip()
+        rendered = [column['data'] for column in self.columns_data if column['data'] in self.columns]
+        return Transaction.objects.filter(user=self.request.user).only(*(rendered or self.columns))
+
+    def filter_queryset(self, qs):
+        column_texts = {}
+        for column in self.columns_data:
+            value = (column['search.value'] or '').strip()
+            if value and column['searchable'] and column['data'] in self.columns:
+                column_texts[column['data']] = value
+        self.filtered = bool(self.search_text or column_texts)
+        if self.search_text:
+            qs = search(qs, self.search_text)
+        text_columns = {column: value for column, value in column_texts.items() if column in COLUMN_WEIGHTS}
+        if text_columns:
+            qs = search_columns(qs, text_columns)
+        for column, value in column_texts.items():
+            if column not in COLUMN_WEIGHTS:
+                qs = self.filter_column(qs, column, value)
+        return qs
+
+    def filter_column(self, qs, column, value):
+        """
+        Filter on a column that is not in the search document: the amount or id by value, the date by day.
+        """
+        if column == 'created_at':
+            try:
+                return qs.filter(created_at__date=date.fromisoformat(value))
+            except ValueError:
+                return qs.none()
+        if value.isdigit():
+            return qs.filter(**{column: int(value)})
+        return qs.none()
+
+    def count_records(self, qs):
+        if self.filtered:
+            return qs.order_by()[:self.max_count].count()
+        return self.total_count
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        context['recordsFilteredCapped'] = self.filtered and context['recordsFiltered'] >= self.max_count
+        return context
+
+    @cached_property
+    def total_count(self):
+        return ledger.get_summary(self.request.user.id).transaction_count
+
+    def ordering(self, qs):
+        qs = super().ordering(qs)
+        order = qs.query.order_by
+        if order and 'id' not in order and '-id' not in order:
+            # A unique last key keeps the pages stable between draws.
+            qs = qs.order_by(*order, '-id' if order[-1].startswith('-') else 'id')
+        return qs
+
 
 class TransactionDetail(View):
     def get(self, request, *args, **kwargs):
@@ -48,13 +127,15 @@ class TransactionDetail(View):
     @method_decorator(csrf_exempt)
     def post(self, request, *args, **kwargs):
         pk = self.kwargs['pk']
-        transaction = Transaction.objects.filter(user=request.user).filter(pk=pk).first()
-        form = TransactionForm(data=request.POST, instance=transaction)
-        if form.is_valid():
-            form.save()
-            return JsonResponse(data={
-                'message': 'Transaction saved',
-            })
+        with db_transaction.atomic():
+            transaction = Transaction.objects.select_for_update().filter(user=request.user).filter(pk=pk).first()
+            before = [ledger.entry(transaction)] if transaction else []
+            form = TransactionForm(data=request.POST, instance=transaction)
+            if form.is_valid():
+                ledger.record(added=[ledger.entry(form.save())], removed=before)
+                return JsonResponse(data={
+                    'message': 'Transaction saved',
+                })
         return JsonResponse(data={
             'message': 'Transaction not saved',
             'errors': form.errors.as_json()
@@ -63,7 +144,7 @@ class TransactionDetail(View):
     def delete(self, request, *args, **kwargs):
         pk = self.kwargs['pk']
         try:
-            Transaction.objects.filter(user=request.user).filter(pk=pk).delete()
+            ledger.delete(Transaction.objects.filter(user=request.user).filter(pk=pk))
             return JsonResponse(data={
                 'message': 'Transaction deleted',
             })
@@ -71,3 +152,107 @@ class TransactionDetail(View):
             return JsonResponse(data={
                 'message': 'Transaction not found',
             })
+
+
+class SpendingSummaryJson(View):
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        params = ('bucket', 'period', 'transaction_type', 'start_date', 'end_date')
+        try:
+            summary = get_spending_summary(
+                request.user.id, **{name: request.GET[name] for name in params if name in request.GET}
+            )
+        except ValueError as e:
+            return JsonResponse(data={'error': str(e)}, status=400)
+        return JsonResponse(data=summary)
+
+
+class TransactionImport(View):
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse(data={'error': 'No statement file uploaded.'}, status=400)
+
+        file_format = request.POST.get('format') or Path(upload.name).suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            return JsonResponse(data={'error': f'Unsupported statement format: {file_format}'}, status=400)
+
+        # Large uploads are stored in a temporary file by Django, which is read incrementally.
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            result = import_transactions(request.user.id, stream, file_format,
+                                         date_order=request.POST.get('date_order') or None)
+        except ValueError as e:
+            return JsonResponse(data={'error': str(e)}, status=400)
+        return JsonResponse(data=result.as_dict())
+
+
+class TransactionExport(View):
+    """
+    Download the user's transactions as CSV or NDJSON, oldest first.
+
+    Accepts the transaction_type, start_date and end_date filters of get_transactions. Rows are read
+    with a server side cursor and streamed in chunks, so memory use does not grow with the history.
+    The response streams from an async iterator, which the ASGI server sends a chunk at a time; a
+    sync iterator would be read whole before the first byte is sent.
+    """
+    fields = ['id', 'title', 'description', 'transaction_type', 'amount', 'created_at']
+    chunk_size = 2000
+    content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        file_format = self.kwargs['format']
+        try:
+            transactions = filter_transactions(
+                request.user.id,
+                transaction_type=request.GET.get('transaction_type'),
+                start_date=request.GET.get('start_date'),
+                end_date=request.GET.get('end_date'),
+            )
+        except ValueError as e:
+            return JsonResponse(data={'error': str(e)}, status=400)
+
+        rows = transactions.order_by('created_at', 'id').values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+        render = self._csv_chunks if file_format == 'csv' else self._ndjson_chunks
+        response = StreamingHttpResponse(render(rows), content_type=self.content_types[file_format])
+        response['Content-Disposition'] = f'attachment; filename="transactions.{file_format}"'
+        return response
+
+    async def _chunks(self, rows):
+        # Fetched on the thread of the request, which holds the connection of the server side cursor.
+        next_chunk = sync_to_async(lambda: list(islice(rows, self.chunk_size)))
+        while chunk := await next_chunk():
+            yield chunk
+
+    async def _csv_chunks(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.fields)
+        async for chunk in self._chunks(rows):
+            writer.writerows((*row[:-1], row[-1].isoformat()) for row in chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    async def _ndjson_chunks(self, rows):
+        async for chunk in self._chunks(rows):
+            yield ''.join(
+                json.dumps({**dict(zip(self.fields, row)), 'created_at': row[-1].isoformat()}) + '\n'
+                for row in chunk
+            )